@@ -0,0 +1,421 @@
+"""
+End-to-end chat throughput and latency benchmark.
+
+Runs the project's ASGI ``application`` in-process against the fake agent
+backend (triage.fake_agents) and a throwaway database. N concurrent
+conversations POST to /api/chat/stream/ while M pollers GET /doctor/queue/,
+then reports time-to-first-chunk, inter-chunk gap and end-to-end latency
+percentiles, DB queries per request and memory per open stream.
+
+    python benchmarks/chat_load.py --conversations 50 --turns 3 --pollers 5 \\
+        --output results/chat_load.json
+    python benchmarks/chat_load.py --compare results/chat_load.json
+
+Fake backend behaviour comes from --fake-config (JSON, FakeAgentConfig
+fields) on top of AZURE_AI_FAKE_AGENT_CONFIG; --db-latency adds a per-query
+delay standing in for a remote database. --coalesce (JSON) is sent as
+each chat request's "coalesce" field to compare SSE frame batching
+policies by frames and bytes per response.
+"""
+import argparse
+import asyncio
+import contextvars
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'uzima_mesh.settings')
+os.environ['AZURE_AI_AGENT_BACKEND'] = 'fake'
+# DEBUG keeps every executed query in memory, which would skew the results.
+os.environ.setdefault('DJANGO_DEBUG', 'False')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.db import connections  # noqa: E402
+from django.db.backends.signals import connection_created  # noqa: E402
+
+# Label of the request the current task/thread is serving, for query attribution.
+_current_request: contextvars.ContextVar = contextvars.ContextVar('bench_request', default=None)
+
+
+def percentiles(values) -> dict:
+    ordered = sorted(values)
+    if not ordered:
+        return {"count": 0}
+
+    def pct(p):
+        return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 5)
+
+    return {
+        "count": len(ordered),
+        "mean": round(sum(ordered) / len(ordered), 5),
+        "p50": pct(0.50),
+        "p90": pct(0.90),
+        "p99": pct(0.99),
+        "max": round(ordered[-1], 5),
+    }
+
+
+# ---------------------------------------------------------------------------
+# Query counting
+# ---------------------------------------------------------------------------
+
+class QueryCounter:
+    """
+    Count queries per in-flight request via an execute wrapper on every connection.
+
+    ``latency`` adds a fixed delay per query, standing in for the network
+    round trip to a hosted database that the local SQLite file does not have.
+    """
+
+    def __init__(self, latency: float = 0.0) -> None:
+        self.latency = latency
+
+    def __call__(self, execute, sql, params, many, context):
+        record = _current_request.get()
+        if record is not None:
+            record["queries"] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return execute(sql, params, many, context)
+
+    def install(self) -> None:
+        def _attach(sender, connection, **kwargs):
+            if self not in connection.execute_wrappers:
+                connection.execute_wrappers.append(self)
+
+        connection_created.connect(_attach, weak=False)
+        for conn in connections.all():
+            _attach(None, conn)
+
+
+# ---------------------------------------------------------------------------
+# Minimal ASGI driver
+# ---------------------------------------------------------------------------
+
+async def asgi_request(app, method: str, path: str, body: bytes = b"", headers=()) -> dict:
+    """
+    Issue one HTTP request against *app* and time its response body.
+
+    Returns status, body, first-chunk/complete timestamps, the gaps between
+    body chunks and the number of DB queries it caused.
+    """
+    record = {"queries": 0}
+    token = _current_request.set(record)
+    disconnect = asyncio.Event()
+    request_sent = False
+    started = time.perf_counter()
+    first_chunk_at = None
+    last_chunk_at = None
+    gaps = []
+    chunks = []
+    status = None
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0", "spec_version": "2.3"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"127.0.0.1"), *headers],
+        "client": ("127.0.0.1", 50000),
+        "server": ("127.0.0.1", 8000),
+    }
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await disconnect.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status, first_chunk_at, last_chunk_at
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            payload = message.get("body", b"")
+            if payload:
+                now = time.perf_counter()
+                if first_chunk_at is None:
+                    first_chunk_at = now
+                else:
+                    gaps.append(now - last_chunk_at)
+                last_chunk_at = now
+                chunks.append(payload)
+            if not message.get("more_body", False):
+                disconnect.set()
+
+    try:
+        await app(scope, receive, send)
+    finally:
+        disconnect.set()
+        _current_request.reset(token)
+
+    finished = time.perf_counter()
+    return {
+        "status": status,
+        "body": b"".join(chunks),
+        "ttfc": (first_chunk_at - started) if first_chunk_at else None,
+        "total": finished - started,
+        "gaps": gaps,
+        "queries": record["queries"],
+    }
+
+
+# ---------------------------------------------------------------------------
+# Workload
+# ---------------------------------------------------------------------------
+
+def seed_conversations(count: int, prefix: str = "bench-patient") -> list:
+    """Create a patient, a triage session and a fake agent thread per conversation."""
+    from django.contrib.auth.models import User
+
+    from triage.fake_agents import get_fake_core
+    from triage.models import Patient, TriageSession
+
+    core = get_fake_core()
+    threads = []
+    for index in range(count):
+        user = User.objects.create_user(f"{prefix}-{index}")
+        patient = Patient.objects.create(user=user, first_name="Bench", last_name=f"Patient{index}")
+        thread_id = core.create_thread()
+        TriageSession.objects.create(patient=patient, thread_id=thread_id, symptoms="headache", urgency_score=index % 5 + 1)
+        threads.append(thread_id)
+    return threads
+
+
+async def run_conversation(app, thread_id: str, turns: int, results: list, coalesce=None) -> None:
+    for turn in range(turns):
+        payload = {"message": f"Turn {turn}: my head still hurts", "thread_id": thread_id}
+        if coalesce is not None:
+            payload["coalesce"] = coalesce
+        body = json.dumps(payload).encode()
+        response = await asgi_request(
+            app, "POST", "/api/chat/stream/", body,
+            headers=[(b"content-type", b"application/json")],
+        )
+        raw = response.pop("body")
+        frames = [f for f in raw.decode().split("\n\n") if f.strip()]
+        response["frames"] = len(frames)
+        response["bytes"] = len(raw)
+        response["errors"] = sum(1 for f in frames if json.loads(f).get("type") == "error")
+        results.append(response)
+
+
+async def run_poller(app, stop: asyncio.Event, interval: float, results: list) -> None:
+    while not stop.is_set():
+        response = await asgi_request(app, "GET", "/doctor/queue/")
+        response.pop("body")
+        results.append(response)
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run_phase(app, threads, args, track_memory: bool = False) -> dict:
+    chat_results, queue_results = [], []
+    memory = {}
+    stop = asyncio.Event()
+
+    if track_memory:
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+
+    started = time.perf_counter()
+    pollers = [
+        asyncio.create_task(run_poller(app, stop, args.poll_interval, queue_results))
+        for _ in range(args.pollers)
+    ]
+    conversations = [
+        asyncio.create_task(run_conversation(app, thread_id, args.turns, chat_results, args.coalesce))
+        for thread_id in threads
+    ]
+
+    peak = 0
+    if track_memory:
+        # Sample while the first wave of streams is open.
+        while not all(task.done() for task in conversations):
+            peak = max(peak, tracemalloc.get_traced_memory()[0])
+            await asyncio.sleep(0.02)
+
+    await asyncio.gather(*conversations)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await asyncio.gather(*pollers)
+
+    if track_memory:
+        tracemalloc.stop()
+        memory = {
+            "baseline_bytes": baseline,
+            "peak_bytes": peak,
+            "bytes_per_open_stream": int((peak - baseline) / max(1, len(threads))),
+        }
+
+    ok = [r for r in chat_results if r["status"] == 200 and not r["errors"]]
+    results = {
+        "elapsed_seconds": round(elapsed, 3),
+        "chat": {
+            "requests": len(chat_results),
+            "failed": len(chat_results) - len(ok),
+            "throughput_rps": round(len(chat_results) / elapsed, 3) if elapsed else None,
+            "ttfc_seconds": percentiles([r["ttfc"] for r in ok if r["ttfc"] is not None]),
+            "inter_chunk_gap_seconds": percentiles([g for r in ok for g in r["gaps"]]),
+            "end_to_end_seconds": percentiles([r["total"] for r in ok]),
+            "frames_per_response": percentiles([r["frames"] for r in ok]),
+            "bytes_per_response": percentiles([r["bytes"] for r in ok]),
+            "db_queries_per_request": percentiles([r["queries"] for r in chat_results]),
+        },
+        "queue": {
+            "requests": len(queue_results),
+            "failed": sum(1 for r in queue_results if r["status"] != 200),
+            "latency_seconds": percentiles([r["total"] for r in queue_results]),
+            "db_queries_per_request": percentiles([r["queries"] for r in queue_results]),
+        },
+    }
+    if track_memory:
+        results["memory"] = memory
+    return results
+
+
+# ---------------------------------------------------------------------------
+# Reporting
+# ---------------------------------------------------------------------------
+
+COMPARED_METRICS = (
+    ("latency", "chat", "ttfc_seconds", "p50"),
+    ("latency", "chat", "ttfc_seconds", "p99"),
+    ("latency", "chat", "inter_chunk_gap_seconds", "p99"),
+    ("latency", "chat", "end_to_end_seconds", "p50"),
+    ("latency", "chat", "end_to_end_seconds", "p99"),
+    ("latency", "chat", "frames_per_response", "mean"),
+    ("latency", "chat", "bytes_per_response", "mean"),
+    ("latency", "chat", "db_queries_per_request", "mean"),
+    ("latency", "queue", "latency_seconds", "p99"),
+    ("latency", "queue", "db_queries_per_request", "mean"),
+    ("memory", "bytes_per_open_stream"),
+)
+
+
+def _lookup(results: dict, path) -> float | None:
+    value = results
+    for key in path:
+        value = value.get(key) if isinstance(value, dict) else None
+    return value
+
+
+def compare(current: dict, baseline: dict) -> dict:
+    """Relative change of the headline metrics versus a previous results file."""
+    deltas = {}
+    for path in COMPARED_METRICS:
+        before, after = _lookup(baseline, path), _lookup(current, path)
+        name = ".".join(path)
+        if before in (None, 0) or after is None:
+            deltas[name] = {"baseline": before, "current": after}
+            continue
+        deltas[name] = {
+            "baseline": before,
+            "current": after,
+            "change_percent": round(100.0 * (after - before) / before, 2),
+        }
+    return deltas
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--conversations', type=int, default=50)
+    parser.add_argument('--turns', type=int, default=3)
+    parser.add_argument('--pollers', type=int, default=5)
+    parser.add_argument('--poll-interval', type=float, default=1.0)
+    parser.add_argument('--fake-config', default='{}', help='JSON FakeAgentConfig overrides')
+    parser.add_argument('--db-latency', type=float, default=0.0,
+                        help='Seconds added to every query (simulated database round trip)')
+    parser.add_argument('--coalesce', type=json.loads, default=None,
+                        help='JSON "coalesce" options sent with every chat request')
+    parser.add_argument('--skip-memory', action='store_true', help='Skip the tracemalloc phase')
+    parser.add_argument('--output', help='Path for JSON results')
+    parser.add_argument('--compare', help='Previous results file to diff against')
+    args = parser.parse_args()
+
+    from django.test.utils import setup_test_environment
+
+    from triage.fake_agents import FakeAgentConfig, get_fake_core
+
+    fake_config = FakeAgentConfig.from_settings(**json.loads(args.fake_config))
+    get_fake_core(fake_config)
+
+    setup_test_environment()
+    db_dir = tempfile.mkdtemp(prefix='uzima-bench-')
+    settings.DATABASES['default'].setdefault('TEST', {})['NAME'] = os.path.join(db_dir, 'bench.sqlite3')
+    connection = connections['default']
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        from uzima_mesh.asgi import application
+
+        counter = QueryCounter(latency=args.db_latency)
+        counter.install()
+
+        latency = asyncio.run(run_phase(application, seed_conversations(args.conversations), args))
+        memory = {}
+        if not args.skip_memory:
+            # One turn per conversation with tracemalloc on: every stream is
+            # open at once, and tracing overhead stays out of the latency phase.
+            memory = asyncio.run(run_phase(
+                application,
+                seed_conversations(args.conversations, prefix="bench-memory"),
+                argparse.Namespace(**{**vars(args), "turns": 1, "pollers": 0}),
+                track_memory=True,
+            ))
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    results = {
+        "meta": {
+            "revision": git_revision(),
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "args": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+            "fake_backend": fake_config.__dict__,
+        },
+        "latency": latency,
+        "memory": memory.get("memory", {}),
+    }
+    if args.compare:
+        with open(args.compare) as fh:
+            results["comparison"] = compare(results, json.load(fh))
+
+    print(json.dumps(results, indent=2, default=str))
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as fh:
+            json.dump(results, fh, indent=2, default=str)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+"""
+Per-event cost of the stream event loop in process_stream.
+
+Records a real SDK event stream from the fake agent backend (a run with
+tool calls, its resumed stream and a long answer), then replays it through
+the legacy classification chain (_event_is + class-name checks + hasattr
+probing per block) and through the dispatch table / delta fast path now used
+by triage.services. Only the classification and text extraction are timed;
+JSON framing is identical in both and left out.
+
+    python benchmarks/event_dispatch.py --tokens 2000 --repeat 20
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'uzima_mesh.settings')
+os.environ['AZURE_AI_AGENT_BACKEND'] = 'fake'
+
+import django  # noqa: E402
+
+django.setup()
+
+from azure.ai.projects.models import AgentEventHandler  # noqa: E402
+
+from triage.fake_agents import FakeAgentConfig, FakeAgentsOperations, get_fake_core  # noqa: E402
+from triage.services import (  # noqa: E402
+    EVENT_MESSAGE_DELTA,
+    EVENT_REQUIRES_ACTION,
+    EVENT_RUN_CREATED,
+    _delta_texts,
+    _event_is,
+    _event_kind,
+    _extract_delta_text,
+    _unpack_stream_event,
+)
+
+
+def record_events(tokens: int) -> list:
+    """Drive one tool-calling run through the fake backend and keep every event."""
+    core = get_fake_core(FakeAgentConfig(
+        tokens_per_second=0,
+        time_to_first_token=0,
+        operation_latency=0,
+        reply_tokens=tokens,
+        tool_call_rate=1.0,
+        tool_calls=[{"name": "check_doctor_availability", "arguments": {"specialty": "General"}}],
+        seed=7,
+    ))
+    ops = FakeAgentsOperations(core)
+    thread_id = core.create_thread()
+    core.create_message(thread_id, "user", "I have had a headache for three days")
+
+    events = []
+    run_id, tool_calls = None, []
+    with ops.create_stream(thread_id=thread_id, agent_id="asst_fake") as stream:
+        for item in stream:
+            events.append(item)
+            if _event_is(item[0], "thread.run.requires_action"):
+                run_id = item[1].id
+                tool_calls = item[1].required_action.submit_tool_outputs.tool_calls
+    if run_id:
+        handler = AgentEventHandler()
+        ops.submit_tool_outputs_to_stream(
+            thread_id=thread_id,
+            run_id=run_id,
+            tool_outputs=[{"tool_call_id": call.id, "output": "{}"} for call in tool_calls],
+            event_handler=handler,
+        )
+        events.extend(handler)
+    return events
+
+
+def legacy_loop(events) -> int:
+    """The pre-dispatch-table loop body, minus JSON framing."""
+    run_id = None
+    tool_calls_seen = []
+    parts = []
+    for event_item in events:
+        event_type, event_data = _unpack_stream_event(event_item)
+        if (
+            _event_is(event_type, "thread.run.created")
+            or "RunCreated" in type(event_data).__name__
+        ):
+            run_id = getattr(event_data, "id", None)
+        elif (
+            _event_is(event_type, "thread.message.delta")
+            or "MessageDelta" in type(event_data).__name__
+        ):
+            delta_obj = getattr(event_data, "delta", event_data)
+            for block in getattr(delta_obj, "content", []):
+                text_val = _extract_delta_text(block)
+                if text_val:
+                    parts.append(text_val)
+        elif (
+            _event_is(event_type, "thread.run.requires_action")
+            or "RequiresAction" in type(event_data).__name__
+        ):
+            if hasattr(event_data, "id"):
+                run_id = event_data.id
+            if (
+                hasattr(event_data, "required_action")
+                and hasattr(event_data.required_action, "submit_tool_outputs")
+            ):
+                tool_calls_seen = list(event_data.required_action.submit_tool_outputs.tool_calls)
+    return len(parts)
+
+
+def dispatch_loop(events) -> int:
+    """The current process_stream loop body, minus JSON framing."""
+    run_id = None
+    tool_calls_seen = []
+    parts = []
+    for event_item in events:
+        event_type, event_data = _unpack_stream_event(event_item)
+        kind = _event_kind(event_type, event_data)
+        if kind is EVENT_MESSAGE_DELTA:
+            for text_val in _delta_texts(event_data):
+                parts.append(text_val)
+        elif kind is EVENT_RUN_CREATED:
+            run_id = getattr(event_data, "id", None)
+        elif kind is EVENT_REQUIRES_ACTION:
+            if hasattr(event_data, "id"):
+                run_id = event_data.id
+            if (
+                hasattr(event_data, "required_action")
+                and hasattr(event_data.required_action, "submit_tool_outputs")
+            ):
+                tool_calls_seen = list(event_data.required_action.submit_tool_outputs.tool_calls)
+    return len(parts)
+
+
+def time_loop(loop, events, repeat: int) -> float:
+    """Best-of-``repeat`` nanoseconds per event."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter_ns()
+        loop(events)
+        best = min(best, time.perf_counter_ns() - started)
+    return best / len(events)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", type=int, default=2000, help="Delta events in the recorded answer")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    events = record_events(args.tokens)
+    legacy_chunks, dispatch_chunks = legacy_loop(events), dispatch_loop(events)
+    if legacy_chunks != dispatch_chunks:
+        raise SystemExit(f"Mismatch: legacy={legacy_chunks} dispatch={dispatch_chunks} chunks")
+
+    legacy_ns = time_loop(legacy_loop, events, args.repeat)
+    dispatch_ns = time_loop(dispatch_loop, events, args.repeat)
+    print(json.dumps({
+        "events": len(events),
+        "text_chunks": dispatch_chunks,
+        "legacy_ns_per_event": round(legacy_ns, 1),
+        "dispatch_ns_per_event": round(dispatch_ns, 1),
+        "speedup": round(legacy_ns / dispatch_ns, 2) if dispatch_ns else None,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Idle-CPU benchmark for the sync -> async stream bridge.
+
+Opens N concurrent streams whose producers are blocked "thinking" (no chunks
+yet) and measures process CPU time consumed over a fixed window, once with
+the legacy 10 ms get_nowait()/sleep polling loop and once with
+triage.streaming.iterate_in_thread.
+
+    python benchmarks/stream_bridge_idle.py --streams 500 --seconds 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import queue as queue_module
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'uzima_mesh.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from triage.streaming import iterate_in_thread  # noqa: E402
+
+
+def thinking_generator(release: threading.Event):
+    """Block like an agent run that has not produced its first token yet."""
+    release.wait()
+    yield '{"type": "done", "run_status": "completed"}\n\n'
+
+
+async def legacy_polling_consumer(sync_gen, executor):
+    chunk_queue = queue_module.Queue()
+    done_marker = object()
+
+    def _drain():
+        try:
+            for chunk in sync_gen:
+                chunk_queue.put(chunk)
+        finally:
+            chunk_queue.put(done_marker)
+
+    loop = asyncio.get_running_loop()
+    drain_future = loop.run_in_executor(executor, _drain)
+    while True:
+        try:
+            item = chunk_queue.get_nowait()
+        except queue_module.Empty:
+            await asyncio.sleep(0.01)
+            continue
+        if item is done_marker:
+            break
+    await drain_future
+
+
+async def bridge_consumer(sync_gen, executor):
+    async for _ in iterate_in_thread(sync_gen, executor=executor):
+        pass
+
+
+async def measure(consumer, streams: int, seconds: float) -> dict:
+    release = threading.Event()
+    with ThreadPoolExecutor(max_workers=streams) as executor:
+        tasks = [
+            asyncio.create_task(consumer(thinking_generator(release), executor))
+            for _ in range(streams)
+        ]
+        # Let every stream reach its idle state before sampling.
+        await asyncio.sleep(0.5)
+
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        await asyncio.sleep(seconds)
+        cpu_used = time.process_time() - cpu_start
+        wall = time.perf_counter() - wall_start
+
+        release.set()
+        await asyncio.gather(*tasks)
+
+    return {
+        "streams": streams,
+        "window_seconds": round(wall, 3),
+        "cpu_seconds": round(cpu_used, 4),
+        "cpu_percent": round(100.0 * cpu_used / wall, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--streams', type=int, default=500)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--output', help='Optional path for JSON results')
+    args = parser.parse_args()
+
+    results = {
+        "legacy_polling": asyncio.run(measure(legacy_polling_consumer, args.streams, args.seconds)),
+        "event_bridge": asyncio.run(measure(bridge_consumer, args.streams, args.seconds)),
+    }
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(results, fh, indent=2)
+
+
+if __name__ == '__main__':
+    main()
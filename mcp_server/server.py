@@ -11,25 +11,17 @@ if not apps.ready:
     django.setup()
 
 
-from triage.models import Doctor, Patient, TriageSession
+from triage.availability import get_availability_cache
+from triage.models import Patient, TriageSession
 from django_mcp import mcp_app
 
 
 @mcp_app.tool()
 async def get_doctor_availability(specialty: str = None):
     """Query available doctors, optionally filtering by specialty."""
-    doctors = []
-    query = Doctor.objects.filter(is_available=True)
-    if specialty:
-        query = query.filter(specialty__icontains=specialty)
-    async for doc in query.select_related('user'):
-        doctors.append({
-            "id": doc.id,
-            "name": f"Dr. {doc.user.last_name}",
-            "specialty": doc.specialty,
-            "bio": doc.bio,
-        })
-    return doctors
+    # Served from the in-process snapshot; it is rebuilt only after a Doctor
+    # or doctor's user changes (see triage.availability).
+    return await get_availability_cache().afind(specialty)
 
 
 @mcp_app.tool()
@@ -131,30 +123,71 @@ async def handoff_to_agent(session_id: int, target_role: str):
 
 
 @mcp_app.tool()
-async def consult_agent(thread_id: str, query: str, target_role: str):
+async def consult_agent(thread_id: str, query: str, target_role: str, use_cache: bool = True):
     """
     Consult another specialized agent without handing off.
     Use this to get an expert opinion (e.g., Intake asking Analysis for urgency).
+    Identical recent consultations are answered from cache; pass
+    use_cache=False when a fresh opinion is required.
     """
-    from triage.services import create_thread, send_message
+    from triage.consultations import consult
 
     if target_role == "intake":
         return {"status": "error", "message": "Cannot consult the intake agent."}
 
     try:
-        # Use a fresh thread for consultation to avoid locking the main triage thread
-        consult_thread_id = await sync_to_async(create_thread)()
-        response = await sync_to_async(send_message)(consult_thread_id, query, role=target_role)
+        # Runs on a fresh (pre-warmed) thread to avoid locking the main triage thread
+        response, source = await consult(target_role, query, use_cache=use_cache)
         return {
             "status": "success",
             "agent": target_role,
             "consultation_response": response.get("content", ""),
             "run_status": response.get("run_status"),
+            "cached": source in ("hit", "coalesced"),
         }
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
 
+@mcp_app.tool()
+async def consult_agents(
+    thread_id: str,
+    query: str,
+    target_roles: list[str],
+    deadline_seconds: float = None,
+    use_cache: bool = True,
+):
+    """
+    Consult several specialized agents at once (e.g., guardian for red flags
+    and analysis for urgency) without handing off.
+    The consultations run concurrently under one shared deadline; roles that
+    have not answered by then are reported as "timeout" instead of blocking
+    the turn. Each result includes its latency_seconds.
+    """
+    from triage.consultations import consult_many
+
+    if isinstance(target_roles, str):
+        target_roles = target_roles.split(",")
+    roles = [role.strip() for role in target_roles if role and role.strip()]
+    if not roles:
+        return {"status": "error", "message": "No target roles given."}
+    if "intake" in roles:
+        return {"status": "error", "message": "Cannot consult the intake agent."}
+
+    try:
+        outcome = await consult_many(roles, query, deadline_seconds=deadline_seconds, use_cache=use_cache)
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+    answered = [role for role, result in outcome["results"].items() if result["status"] == "success"]
+    return {
+        "status": "success" if len(answered) == len(roles) else ("partial" if answered else "error"),
+        "consultations": outcome["results"],
+        "deadline_seconds": outcome["deadline_seconds"],
+        "elapsed_seconds": outcome["elapsed_seconds"],
+    }
+
+
 # Standalone execution is no longer the primary way to run this,
 # but we keep it for local testing if needed.
 if __name__ == "__main__":
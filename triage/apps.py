@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class TriageConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'triage'
+
+    def ready(self):
+        from . import availability, queue_cache
+
+        availability.connect_signals()
+        queue_cache.connect_signals()
@@ -0,0 +1,243 @@
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+logger = logging.getLogger(__name__)
+
+# Shared across workers through the default cache (Redis when REDIS_URL is set).
+VERSION_CACHE_KEY = "triage:doctor_availability:version"
+
+# User fields that show up in an availability entry; saves touching only
+# other fields (e.g. last_login on every sign-in) do not invalidate.
+_USER_FIELDS = frozenset({"first_name", "last_name"})
+
+
+# ---------------------------------------------------------------------------
+# Snapshot
+# ---------------------------------------------------------------------------
+
+@dataclass
+class AvailabilitySnapshot:
+    """
+    Available doctors as of one availability version.
+
+    ``by_specialty`` maps each lower-cased specialty to its doctors, so a
+    filter only scans the handful of distinct specialties. Results per filter
+    term are memoised for the life of the snapshot.
+    """
+    version: int
+    doctors: tuple
+    by_specialty: dict
+    doctor_user_ids: frozenset
+    built_at: float = field(default_factory=time.monotonic)
+    _matches: dict = field(default_factory=dict, repr=False)
+
+    @classmethod
+    def build(cls, version: int) -> "AvailabilitySnapshot":
+        from .models import Doctor
+
+        doctors, by_specialty, user_ids = [], {}, set()
+        for doc in Doctor.objects.select_related('user').order_by('id'):
+            user_ids.add(doc.user_id)
+            if not doc.is_available:
+                continue
+            entry = {
+                "id": doc.id,
+                "name": f"Dr. {doc.user.last_name}",
+                "specialty": doc.specialty,
+                "bio": doc.bio,
+            }
+            doctors.append(entry)
+            by_specialty.setdefault(doc.specialty.lower(), []).append(entry)
+        return cls(
+            version=version,
+            doctors=tuple(doctors),
+            by_specialty=by_specialty,
+            doctor_user_ids=frozenset(user_ids),
+        )
+
+    def find(self, specialty: str | None = None) -> list:
+        """Same results as ``specialty__icontains`` on available doctors, in id order."""
+        if not specialty:
+            matches = self.doctors
+        else:
+            term = specialty.lower()
+            matches = self._matches.get(term)
+            if matches is None:
+                found = [
+                    doc
+                    for key, docs in self.by_specialty.items() if term in key
+                    for doc in docs
+                ]
+                found.sort(key=lambda doc: doc["id"])
+                matches = self._matches[term] = tuple(found)
+        # Copies, so callers cannot mutate the shared snapshot.
+        return [dict(doc) for doc in matches]
+
+
+# ---------------------------------------------------------------------------
+# Versioned cache
+# ---------------------------------------------------------------------------
+
+def _current_version() -> int:
+    version = cache.get(VERSION_CACHE_KEY)
+    if version is None:
+        # A fresh (or evicted) counter starts from the clock so it cannot
+        # collide with a version some worker already built a snapshot for.
+        cache.add(VERSION_CACHE_KEY, time.time_ns())
+        version = cache.get(VERSION_CACHE_KEY)
+    return version
+
+
+def _bump_version() -> None:
+    try:
+        cache.incr(VERSION_CACHE_KEY)
+    except ValueError:  # counter missing
+        cache.add(VERSION_CACHE_KEY, time.time_ns())
+
+
+class DoctorAvailabilityCache:
+    """
+    In-process availability snapshot, rebuilt only after doctors change.
+
+    Changes bump a version counter in the shared Django cache. Each worker
+    compares it with its snapshot's version at most every
+    DOCTOR_AVAILABILITY_VERSION_CHECK_SECONDS, so a change made by another
+    worker is picked up within that interval; the worker that made the
+    change drops its snapshot immediately.
+    """
+
+    def __init__(self, check_interval: float | None = None) -> None:
+        self.check_interval = (
+            check_interval if check_interval is not None
+            else getattr(settings, 'DOCTOR_AVAILABILITY_VERSION_CHECK_SECONDS', 1.0)
+        )
+        self._snapshot: AvailabilitySnapshot | None = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "rebuilds": 0, "invalidations": 0}
+
+    def _fresh_snapshot(self) -> AvailabilitySnapshot | None:
+        snapshot = self._snapshot
+        if snapshot is None:
+            return None
+        if time.monotonic() - self._checked_at < self.check_interval:
+            return snapshot
+        if _current_version() != snapshot.version:
+            return None
+        self._checked_at = time.monotonic()
+        return snapshot
+
+    def snapshot(self) -> AvailabilitySnapshot:
+        """Return a current snapshot, rebuilding it from the database if stale."""
+        snapshot = self._fresh_snapshot()
+        if snapshot is not None:
+            with self._lock:
+                self._stats["hits"] += 1
+            return snapshot
+
+        with self._lock:
+            snapshot = self._fresh_snapshot()
+            if snapshot is not None:
+                self._stats["hits"] += 1
+                return snapshot
+            # Read the version first: a change committed mid-build bumps it
+            # again and the next call rebuilds.
+            version = _current_version()
+            snapshot = AvailabilitySnapshot.build(version)
+            self._snapshot = snapshot
+            self._checked_at = time.monotonic()
+            self._stats["rebuilds"] += 1
+            return snapshot
+
+    def find(self, specialty: str | None = None) -> list:
+        return self.snapshot().find(specialty)
+
+    async def afind(self, specialty: str | None = None) -> list:
+        snapshot = self._fresh_snapshot()
+        if snapshot is None:
+            snapshot = await sync_to_async(self.snapshot)()
+        else:
+            with self._lock:
+                self._stats["hits"] += 1
+        return snapshot.find(specialty)
+
+    def is_doctor_user(self, user_id) -> bool:
+        snapshot = self._snapshot
+        if snapshot is not None and user_id in snapshot.doctor_user_ids:
+            return True
+        # Unknown here, or possibly a doctor created since the snapshot.
+        from .models import Doctor
+        return Doctor.objects.filter(user_id=user_id).exists()
+
+    def invalidate(self) -> None:
+        """Drop the local snapshot and bump the shared version once the transaction commits."""
+        with self._lock:
+            self._snapshot = None
+            self._stats["invalidations"] += 1
+        transaction.on_commit(self._after_commit)
+
+    def _after_commit(self) -> None:
+        # Drop again: a rebuild between invalidate() and commit saw old rows.
+        with self._lock:
+            self._snapshot = None
+        _bump_version()
+
+    def stats(self) -> dict:
+        with self._lock:
+            snapshot = self._snapshot
+            return {
+                **self._stats,
+                "version": snapshot.version if snapshot else None,
+                "available_doctors": len(snapshot.doctors) if snapshot else None,
+                "specialties": len(snapshot.by_specialty) if snapshot else None,
+            }
+
+
+# ---------------------------------------------------------------------------
+# Module-level API
+# ---------------------------------------------------------------------------
+
+_availability: DoctorAvailabilityCache | None = None
+_availability_lock = threading.Lock()
+
+
+def get_availability_cache() -> DoctorAvailabilityCache:
+    global _availability
+    if _availability is None:
+        with _availability_lock:
+            if _availability is None:
+                _availability = DoctorAvailabilityCache()
+    return _availability
+
+
+def invalidate_doctor_availability() -> None:
+    get_availability_cache().invalidate()
+
+
+def _on_doctor_changed(sender, **kwargs) -> None:
+    invalidate_doctor_availability()
+
+
+def _on_user_saved(sender, instance, update_fields=None, **kwargs) -> None:
+    if update_fields is not None and not _USER_FIELDS.intersection(update_fields):
+        return
+    if get_availability_cache().is_doctor_user(instance.pk):
+        invalidate_doctor_availability()
+
+
+def connect_signals() -> None:
+    """Hook cache invalidation to Doctor and User changes (called from TriageConfig.ready)."""
+    from .models import Doctor
+
+    post_save.connect(_on_doctor_changed, sender=Doctor, dispatch_uid="triage.availability.doctor_saved")
+    post_delete.connect(_on_doctor_changed, sender=Doctor, dispatch_uid="triage.availability.doctor_deleted")
+    post_save.connect(_on_user_saved, sender=get_user_model(), dispatch_uid="triage.availability.user_saved")
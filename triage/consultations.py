@@ -0,0 +1,285 @@
+import asyncio
+import concurrent.futures
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .db import run_db
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_EDGE_PUNCTUATION = " \t\n.?!,;:"
+
+
+def normalize_query(query: str) -> str:
+    """Case-fold and collapse whitespace so trivially different phrasings share a key."""
+    return _WHITESPACE_RE.sub(" ", (query or "").lower()).strip(_EDGE_PUNCTUATION)
+
+
+# ---------------------------------------------------------------------------
+# Consultation cache
+# ---------------------------------------------------------------------------
+
+class _ComputeAbandoned(Exception):
+    """Handed to coalesced waiters when the caller computing for them is cancelled."""
+
+
+class ConsultationCache:
+    """
+    TTL + LRU cache of specialist consultations keyed on (role, normalized query).
+
+    Identical consultations already in flight are de-duplicated: later callers
+    wait on the first caller's result instead of starting another agent run.
+    The in-flight table uses concurrent futures so callers on different event
+    loops (MCP server, tool runtime) can share a single run.
+    """
+
+    def __init__(self, max_entries: int | None = None, ttl_seconds: float | None = None) -> None:
+        self.max_entries = (
+            max_entries if max_entries is not None
+            else getattr(settings, 'CONSULT_CACHE_MAX_ENTRIES', 256)
+        )
+        self.ttl_seconds = (
+            ttl_seconds if ttl_seconds is not None
+            else getattr(settings, 'CONSULT_CACHE_TTL_SECONDS', 600)
+        )
+        self._entries: OrderedDict = OrderedDict()
+        self._inflight: dict = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "coalesced": 0, "bypassed": 0, "evictions": 0, "expired": 0}
+
+    @staticmethod
+    def make_key(role: str, query: str) -> tuple:
+        return (role, normalize_query(query))
+
+    def get(self, key: tuple):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self._stats["expired"] += 1
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: tuple, value) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    async def get_or_compute(
+        self,
+        key: tuple,
+        compute: Callable[[], Awaitable[dict]],
+        use_cache: bool = True,
+    ) -> tuple[dict, str]:
+        """
+        Return ``(response, source)`` where source is hit, coalesced, miss or bypass.
+
+        Only completed consultations are cached; failures are returned to
+        every waiting caller but never stored.
+        """
+        if not use_cache:
+            with self._lock:
+                self._stats["bypassed"] += 1
+            return await compute(), "bypass"
+
+        cached = self.get(key)
+        if cached is not None:
+            with self._lock:
+                self._stats["hits"] += 1
+            return cached, "hit"
+
+        with self._lock:
+            pending = self._inflight.get(key)
+            if pending is None:
+                pending = concurrent.futures.Future()
+                self._inflight[key] = pending
+                owner = True
+                self._stats["misses"] += 1
+            else:
+                owner = False
+                self._stats["coalesced"] += 1
+
+        if not owner:
+            try:
+                return await asyncio.wrap_future(pending), "coalesced"
+            except _ComputeAbandoned:
+                # The owner was cancelled, not us: run (or join) a fresh compute.
+                return await self.get_or_compute(key, compute, use_cache)
+
+        try:
+            response = await compute()
+        except Exception as exc:
+            self._forget(key, pending)
+            pending.set_exception(exc)
+            raise
+        except BaseException:
+            # Cancelled (e.g. the owner's tool call timed out). Waiters get a
+            # retry instead of a cancellation that was not theirs.
+            self._forget(key, pending)
+            pending.set_exception(_ComputeAbandoned())
+            raise
+        else:
+            if response.get("run_status") == "completed":
+                self.put(key, response)
+            self._forget(key, pending)
+            pending.set_result(response)
+            return response, "miss"
+
+    def _forget(self, key: tuple, pending: concurrent.futures.Future) -> None:
+        with self._lock:
+            if self._inflight.get(key) is pending:
+                del self._inflight[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["inflight"] = len(self._inflight)
+        lookups = stats["hits"] + stats["coalesced"] + stats["misses"]
+        stats["llm_runs_saved"] = stats["hits"] + stats["coalesced"]
+        stats["hit_rate"] = round(stats["llm_runs_saved"] / lookups, 4) if lookups else None
+        return stats
+
+
+_cache: ConsultationCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_consultation_cache() -> ConsultationCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ConsultationCache()
+    return _cache
+
+
+# ---------------------------------------------------------------------------
+# Consultation API
+# ---------------------------------------------------------------------------
+
+async def _run_consultation(target_role: str, query: str) -> dict:
+    from .services import send_message
+    from .thread_pool import checkout_thread
+
+    # Neither call needs the thread-sensitive executor that serialises
+    # Django DB work. send_message does read ChatMessage (context planning),
+    # so its worker thread releases that connection afterwards.
+    consult_thread_id = await sync_to_async(checkout_thread, thread_sensitive=False)()
+    return await run_db(send_message, consult_thread_id, query, role=target_role)
+
+
+async def consult(target_role: str, query: str, use_cache: bool = True) -> tuple[dict, str]:
+    """
+    Ask *target_role* a one-off question on a fresh side thread.
+
+    Returns the send_message response and how it was served (see
+    ConsultationCache.get_or_compute).
+    """
+    use_cache = use_cache and getattr(settings, 'CONSULT_CACHE_ENABLED', True)
+    cache = get_consultation_cache()
+    return await cache.get_or_compute(
+        cache.make_key(target_role, query),
+        lambda: _run_consultation(target_role, query),
+        use_cache=use_cache,
+    )
+
+
+# Consultations dropped at a consult_many deadline, kept referenced while
+# they finish in the background (their results still fill the cache).
+_late_consultations: set = set()
+
+
+async def _timed_consult(target_role: str, query: str, use_cache: bool) -> dict:
+    started = time.monotonic()
+    try:
+        response, source = await consult(target_role, query, use_cache=use_cache)
+    except Exception as exc:
+        logger.warning("Consultation with %s failed: %s", target_role, exc)
+        return {
+            "status": "error",
+            "message": str(exc),
+            "latency_seconds": round(time.monotonic() - started, 3),
+        }
+    return {
+        "status": "success",
+        "consultation_response": response.get("content", ""),
+        "run_status": response.get("run_status"),
+        "cached": source in ("hit", "coalesced"),
+        "latency_seconds": round(time.monotonic() - started, 3),
+    }
+
+
+async def consult_many(
+    target_roles: list,
+    query: str,
+    deadline_seconds: float | None = None,
+    use_cache: bool = True,
+) -> dict:
+    """
+    Ask several roles the same question concurrently, under one shared deadline.
+
+    Each consultation runs on its own side thread (see consult). Roles that
+    have not answered when the deadline passes are reported as ``timeout``
+    and left out of the turn; their runs finish in the background and warm
+    the consultation cache. Returns per-role results in the order given.
+    """
+    max_deadline = getattr(settings, 'CONSULT_MANY_MAX_DEADLINE_SECONDS', 90)
+    if deadline_seconds is None:
+        deadline_seconds = getattr(settings, 'CONSULT_MANY_DEADLINE_SECONDS', 45)
+    deadline_seconds = min(max(float(deadline_seconds), 0.0), max_deadline)
+
+    started = time.monotonic()
+    roles = list(dict.fromkeys(target_roles))
+    tasks = {
+        role: asyncio.ensure_future(_timed_consult(role, query, use_cache))
+        for role in roles
+    }
+    try:
+        if tasks:
+            await asyncio.wait(tasks.values(), timeout=deadline_seconds)
+    finally:
+        # Runs still going (past the deadline, or we were cancelled) keep
+        # running in the background rather than being orphaned.
+        for task in tasks.values():
+            if not task.done():
+                _late_consultations.add(task)
+                task.add_done_callback(_late_consultations.discard)
+
+    results = {}
+    for role, task in tasks.items():
+        if not task.done():
+            results[role] = {"status": "timeout", "latency_seconds": round(deadline_seconds, 3)}
+        elif task.cancelled():
+            results[role] = {
+                "status": "error",
+                "message": "Consultation was cancelled",
+                "latency_seconds": round(time.monotonic() - started, 3),
+            }
+        else:
+            results[role] = task.result()
+
+    return {
+        "results": results,
+        "deadline_seconds": deadline_seconds,
+        "elapsed_seconds": round(time.monotonic() - started, 3),
+    }
@@ -0,0 +1,269 @@
+import logging
+import re
+import threading
+from dataclasses import dataclass, fields, replace
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# What every run used before budgets existed; also used when they are disabled.
+LEGACY_LAST_MESSAGES = 10
+LEGACY_MAX_COMPLETION_TOKENS = 10000
+
+# Rough framing cost of one thread message (role, separators, context prefixes).
+MESSAGE_OVERHEAD_TOKENS = 8
+_CHARS_PER_TOKEN = 4
+
+_BLANK_RUNS = re.compile(r"[ \t]+")
+_SENTENCE_BREAK = re.compile(r"[.!?\n]")
+
+
+def tokens_for_length(length: int) -> int:
+    """Estimate tokens for *length* characters (~4 chars per token for chat prose)."""
+    return (length + _CHARS_PER_TOKEN - 1) // _CHARS_PER_TOKEN if length > 0 else 0
+
+
+def estimate_tokens(text: str | None) -> int:
+    return tokens_for_length(len(text)) if text else 0
+
+
+def trim_summary(summary: str, max_tokens: int) -> str:
+    """
+    Compress a rolling summary and cut it to about *max_tokens*.
+
+    Whitespace runs and blank lines are dropped first; if that is not enough
+    the summary is cut at the last sentence or line break inside the budget.
+    """
+    lines = (_BLANK_RUNS.sub(" ", line).strip() for line in summary.splitlines())
+    compressed = "\n".join(line for line in lines if line)
+    if estimate_tokens(compressed) <= max_tokens:
+        return compressed
+
+    limit = max(max_tokens, 1) * _CHARS_PER_TOKEN
+    head = compressed[:limit]
+    breaks = [match.end() for match in _SENTENCE_BREAK.finditer(head)]
+    if breaks and breaks[-1] > limit // 2:
+        head = head[:breaks[-1]]
+    return head.rstrip() + " …"
+
+
+# ---------------------------------------------------------------------------
+# Role budgets
+# ---------------------------------------------------------------------------
+
+@dataclass(frozen=True)
+class RoleBudget:
+    """
+    Context limits for one agent role.
+
+    ``prompt_tokens`` covers instructions, summary, history and the new
+    message. The truncation window keeps between ``min_messages`` and
+    ``max_messages`` thread messages (the new one included).
+    ``first_turn_completion_tokens`` caps replies on a thread with no history.
+    """
+    prompt_tokens: int = 6000
+    completion_tokens: int = 2000
+    summary_tokens: int = 800
+    min_messages: int = 2
+    max_messages: int = LEGACY_LAST_MESSAGES
+    first_turn_completion_tokens: int | None = None
+
+
+DEFAULT_BUDGETS = {
+    # Short question-and-answer turns; the opening greeting is a sentence or two.
+    "intake": RoleBudget(
+        prompt_tokens=4000, completion_tokens=1200, summary_tokens=600,
+        first_turn_completion_tokens=400,
+    ),
+    # Assessments, consultations and summary passes need room to write.
+    "analysis": RoleBudget(prompt_tokens=8000, completion_tokens=2500, summary_tokens=1000, min_messages=1),
+    "default": RoleBudget(),
+}
+
+
+def get_role_budget(role: str) -> RoleBudget:
+    """Built-in budget for *role* (or 'default') with AGENT_CONTEXT_BUDGETS overrides applied."""
+    overrides = getattr(settings, 'AGENT_CONTEXT_BUDGETS', {}) or {}
+    budget = DEFAULT_BUDGETS.get(role) or DEFAULT_BUDGETS["default"]
+    known = {f.name for f in fields(RoleBudget)}
+    for key in ("default", role):
+        values = overrides.get(key)
+        if isinstance(values, dict):
+            budget = replace(budget, **{k: v for k, v in values.items() if k in known})
+    return budget
+
+
+# ---------------------------------------------------------------------------
+# Run planning
+# ---------------------------------------------------------------------------
+
+@dataclass
+class ContextPlan:
+    """Truncation window, completion cap and summary chosen for one run."""
+    role: str
+    last_messages: int
+    max_completion_tokens: int
+    summary: str | None
+    estimated_prompt_tokens: int
+    baseline_prompt_tokens: int
+    summary_trimmed: bool = False
+
+    @property
+    def truncation_strategy(self) -> dict:
+        return {"type": "last_messages", "last_messages": self.last_messages}
+
+    @property
+    def saved_prompt_tokens(self) -> int:
+        return max(0, self.baseline_prompt_tokens - self.estimated_prompt_tokens)
+
+
+def plan_run(
+    role: str,
+    *,
+    message: str,
+    instructions: str | None = None,
+    summary: str | None = None,
+    history_lengths: list | None = None,
+    budget: RoleBudget | None = None,
+) -> ContextPlan:
+    """
+    Fit a run for *role* into its budget.
+
+    ``history_lengths`` are the character lengths of the thread's earlier
+    messages, newest first; None means unknown, in which case the full
+    ``max_messages`` window is kept rather than guessing context away.
+    ``baseline_prompt_tokens`` estimates the same run under the legacy
+    10-message window with the untrimmed summary.
+    """
+    budget = budget or get_role_budget(role)
+    history = [tokens_for_length(n) + MESSAGE_OVERHEAD_TOKENS for n in (history_lengths or ())]
+    fixed = estimate_tokens(instructions) + estimate_tokens(message) + MESSAGE_OVERHEAD_TOKENS
+    baseline = fixed + estimate_tokens(summary) + sum(history[:LEGACY_LAST_MESSAGES - 1])
+
+    if not getattr(settings, 'AGENT_CONTEXT_BUDGET_ENABLED', True):
+        return ContextPlan(
+            role=role,
+            last_messages=LEGACY_LAST_MESSAGES,
+            max_completion_tokens=LEGACY_MAX_COMPLETION_TOKENS,
+            summary=summary,
+            estimated_prompt_tokens=baseline,
+            baseline_prompt_tokens=baseline,
+        )
+
+    trimmed = trim_summary(summary, budget.summary_tokens) if summary else summary
+    estimated = fixed + estimate_tokens(trimmed)
+
+    if history_lengths is None:
+        last_messages = budget.max_messages
+    else:
+        remaining = budget.prompt_tokens - estimated
+        kept = 0
+        for tokens in history[:budget.max_messages - 1]:
+            if kept + 1 >= budget.min_messages and tokens > remaining:
+                break
+            kept += 1
+            remaining -= tokens
+            estimated += tokens
+        last_messages = kept + 1
+
+    completion = budget.completion_tokens
+    if history_lengths == [] and budget.first_turn_completion_tokens:
+        completion = budget.first_turn_completion_tokens
+
+    return ContextPlan(
+        role=role,
+        last_messages=last_messages,
+        max_completion_tokens=completion,
+        summary=trimmed,
+        estimated_prompt_tokens=estimated,
+        baseline_prompt_tokens=baseline,
+        summary_trimmed=bool(summary) and trimmed != summary,
+    )
+
+
+def recent_history_lengths(thread_id: str, limit: int) -> list | None:
+    """
+    Character lengths of the thread's earlier ChatMessages, newest first.
+
+    Leading patient rows are skipped: the view persists the message being
+    sent (or a coalesced batch of them) before the run starts, and the plan
+    counts that text separately. Returns None if the history can't be read;
+    budgeting is advisory and must never fail a run.
+    """
+    from django.db.models.functions import Length
+
+    from .models import ChatMessage
+
+    try:
+        rows = list(
+            ChatMessage.objects
+            .filter(session__thread_id=thread_id)
+            .order_by('-id')
+            .annotate(length=Length('content'))
+            .values_list('role', 'length')[:limit + 4]
+        )
+    except Exception:
+        logger.debug("Could not read history for thread %s", thread_id, exc_info=True)
+        return None
+
+    index = 0
+    while index < len(rows) and rows[index][0] == 'patient':
+        index += 1
+    return [length for _, length in rows[index:index + limit]]
+
+
+# ---------------------------------------------------------------------------
+# Savings accounting
+# ---------------------------------------------------------------------------
+
+class ContextBudgetStats:
+    """Process-wide totals of estimated prompt size and savings per role."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._roles: dict = {}
+
+    def record(self, plan: ContextPlan) -> None:
+        with self._lock:
+            totals = self._roles.setdefault(plan.role, {
+                "runs": 0,
+                "estimated_prompt_tokens": 0,
+                "baseline_prompt_tokens": 0,
+                "saved_prompt_tokens": 0,
+                "summaries_trimmed": 0,
+                "completion_cap_tokens": 0,
+            })
+            totals["runs"] += 1
+            totals["estimated_prompt_tokens"] += plan.estimated_prompt_tokens
+            totals["baseline_prompt_tokens"] += plan.baseline_prompt_tokens
+            totals["saved_prompt_tokens"] += plan.saved_prompt_tokens
+            totals["summaries_trimmed"] += plan.summary_trimmed
+            totals["completion_cap_tokens"] += plan.max_completion_tokens
+
+    def stats(self) -> dict:
+        with self._lock:
+            roles = {role: dict(totals) for role, totals in self._roles.items()}
+        baseline = sum(t["baseline_prompt_tokens"] for t in roles.values())
+        saved = sum(t["saved_prompt_tokens"] for t in roles.values())
+        return {
+            "roles": roles,
+            "saved_prompt_tokens": saved,
+            "saved_ratio": round(saved / baseline, 3) if baseline else None,
+        }
+
+
+_stats = ContextBudgetStats()
+
+
+def get_context_budget_stats() -> ContextBudgetStats:
+    return _stats
+
+
+def record_plan(plan: ContextPlan) -> None:
+    _stats.record(plan)
+    logger.debug(
+        "Context plan role=%s window=%d completion_cap=%d prompt~%d (baseline~%d)",
+        plan.role, plan.last_messages, plan.max_completion_tokens,
+        plan.estimated_prompt_tokens, plan.baseline_prompt_tokens,
+    )
@@ -0,0 +1,32 @@
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+
+
+# ---------------------------------------------------------------------------
+# ORM work outside the request cycle
+# ---------------------------------------------------------------------------
+
+def call_and_release(func, *args, **kwargs):
+    """
+    Call *func*, then release this thread's connection per CONN_MAX_AGE.
+
+    Django only does that at the end of a request, so worker threads (thread
+    pools, thread_sensitive=False executors) that touch the ORM must do it
+    themselves, or each keeps a connection open and never replaces one that
+    died with the database or PgBouncer.
+    """
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run_db(func, *args, **kwargs):
+    """
+    Run one self-contained ORM call on a worker thread of its own.
+
+    The default thread-sensitive sync_to_async queues every call (from every
+    request) on a single sync thread, so independent lookups could never
+    overlap. Calls here must not share objects with other in-flight ORM work.
+    """
+    return await sync_to_async(call_and_release, thread_sensitive=False)(func, *args, **kwargs)
@@ -0,0 +1,305 @@
+import asyncio
+import contextlib
+import json
+import logging
+import threading
+import time
+import weakref
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# Redis pub/sub channel shared by every worker.
+DEFAULT_CHANNEL = "triage:queue_events"
+
+# Changes a stalled subscriber may have pending before it is told to resync.
+SUBSCRIBER_CAPACITY = 64
+
+# How long the Redis listener waits for a message before checking its
+# connection; idle connections are PINGed every REDIS_HEALTH_CHECK_SECONDS.
+REDIS_POLL_SECONDS = 1.0
+REDIS_HEALTH_CHECK_SECONDS = 15
+
+
+# ---------------------------------------------------------------------------
+# Changes and subscriptions
+# ---------------------------------------------------------------------------
+
+@dataclass(eq=False)
+class QueueChange:
+    """
+    Doctor queue changes collected over one debounce window.
+
+    The same object goes to every subscriber on an event loop, so the update
+    sent to clients is built once (``render``) however many are connected.
+    ``resync`` means changes may have been missed and the whole queue
+    should be reloaded.
+    """
+    session_ids: frozenset = frozenset()
+    patient_ids: frozenset = frozenset()
+    resync: bool = False
+    _rendered: asyncio.Future | None = field(default=None, repr=False)
+
+    async def render(self, build: Callable[["QueueChange"], Awaitable]) -> object:
+        """Return ``build(self)``, running it only for the first caller."""
+        if self._rendered is None:
+            self._rendered = asyncio.ensure_future(build(self))
+        # Shielded: one client disconnecting must not cancel the others' update.
+        return await asyncio.shield(self._rendered)
+
+
+class QueueSubscription:
+    """One connected client's feed of QueueChanges."""
+
+    def __init__(self, hub: "_LoopHub", capacity: int = SUBSCRIBER_CAPACITY) -> None:
+        self._hub = hub
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=capacity)
+        self._resync_pending = False
+
+    def deliver(self, change: QueueChange) -> None:
+        if self._resync_pending:
+            return  # the pending full reload will include this change
+        try:
+            self._queue.put_nowait(change)
+        except asyncio.QueueFull:
+            # Too far behind to patch row by row: replace the backlog.
+            while not self._queue.empty():
+                self._queue.get_nowait()
+            self._queue.put_nowait(QueueChange(resync=True))
+            self._resync_pending = True
+
+    async def get(self, timeout: float | None = None) -> QueueChange | None:
+        """Next change, or None if nothing arrived within *timeout* seconds."""
+        try:
+            change = await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        if change.resync:
+            self._resync_pending = False
+        return change
+
+    def close(self) -> None:
+        self._hub.subscribers.discard(self)
+
+
+class _LoopHub:
+    """Debounces published events into QueueChanges for one event loop's subscribers."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, debounce: float) -> None:
+        self.loop = loop
+        self.debounce = debounce
+        self.subscribers: set = set()
+        self._session_ids: set = set()
+        self._patient_ids: set = set()
+        self._resync = False
+        self._flush_handle: asyncio.TimerHandle | None = None
+
+    def add(self, event: dict) -> None:
+        if not self.subscribers:
+            return
+        if event.get("session_id") is not None:
+            self._session_ids.add(event["session_id"])
+        if event.get("patient_id") is not None:
+            self._patient_ids.add(event["patient_id"])
+        self._resync = self._resync or bool(event.get("resync"))
+        if self._flush_handle is None:
+            self._flush_handle = self.loop.call_later(self.debounce, self._flush)
+
+    def _flush(self) -> None:
+        change = QueueChange(frozenset(self._session_ids), frozenset(self._patient_ids), self._resync)
+        self._session_ids, self._patient_ids = set(), set()
+        self._resync = False
+        self._flush_handle = None
+        for subscription in list(self.subscribers):
+            subscription.deliver(change)
+
+
+# ---------------------------------------------------------------------------
+# Backends
+# ---------------------------------------------------------------------------
+
+class LocalQueueBackend:
+    """Delivers events to subscribers in this process only."""
+
+    def bind(self, dispatch: Callable[[dict], None]) -> None:
+        self._dispatch = dispatch
+
+    def start(self) -> None:
+        pass
+
+    def publish(self, event: dict) -> None:
+        self._dispatch(event)
+
+
+class RedisQueueBackend:
+    """
+    Shares events between workers over Redis pub/sub.
+
+    Every worker, the publishing one included, receives events from its
+    listener thread, which is started when the first client subscribes.
+    After a lost connection subscribers are told to resync, since anything
+    published meanwhile is gone.
+    """
+
+    def __init__(self, url: str | None = None, channel: str | None = None) -> None:
+        try:
+            import redis
+        except ImportError as exc:
+            raise ImproperlyConfigured("QUEUE_EVENT_BACKEND='redis' requires the redis package") from exc
+        url = url or getattr(settings, 'QUEUE_EVENT_REDIS_URL', None)
+        if not url:
+            raise ImproperlyConfigured("QUEUE_EVENT_BACKEND='redis' requires REDIS_URL")
+        self.channel = channel or getattr(settings, 'QUEUE_EVENT_CHANNEL', DEFAULT_CHANNEL)
+        # Short timeouts: publish runs in on_commit callbacks on the request
+        # path, and an unreachable server must not hang it or the listener.
+        timeout = getattr(settings, 'QUEUE_EVENT_REDIS_TIMEOUT_SECONDS', 2.0)
+        self._client = redis.Redis.from_url(
+            url,
+            socket_connect_timeout=timeout,
+            socket_timeout=timeout,
+            socket_keepalive=True,
+            health_check_interval=REDIS_HEALTH_CHECK_SECONDS,
+        )
+        self._listener: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def bind(self, dispatch: Callable[[dict], None]) -> None:
+        self._dispatch = dispatch
+
+    def start(self) -> None:
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name="queue-events", daemon=True)
+                self._listener.start()
+
+    def publish(self, event: dict) -> None:
+        try:
+            self._client.publish(self.channel, json.dumps(event))
+        except Exception as exc:
+            # Other workers miss this one; at least tell our own clients.
+            logger.warning("Could not publish queue event to Redis: %s", exc)
+            self._dispatch(event)
+
+    def _listen(self) -> None:
+        delay, reconnecting = 1.0, False
+        while True:
+            pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(self.channel)
+                if reconnecting:
+                    self._dispatch({"resync": True})
+                delay, reconnecting = 1.0, False
+                # Polled rather than listen(): a blocking read would trip the
+                # socket timeout on every quiet spell.
+                while True:
+                    message = pubsub.get_message(timeout=REDIS_POLL_SECONDS)
+                    if message is not None:
+                        self._dispatch(json.loads(message["data"]))
+            except Exception as exc:
+                logger.warning("Queue event listener lost Redis (%s); retrying in %.0fs", exc, delay)
+            finally:
+                # Release the dead connection before opening another.
+                with contextlib.suppress(Exception):
+                    pubsub.close()
+            reconnecting = True
+            time.sleep(delay)
+            delay = min(delay * 2, 30.0)
+
+
+_BACKENDS = {
+    "local": LocalQueueBackend,
+    "redis": RedisQueueBackend,
+}
+
+
+# ---------------------------------------------------------------------------
+# Bus
+# ---------------------------------------------------------------------------
+
+class QueueEventBus:
+    """
+    Pub/sub for doctor queue changes.
+
+    ``publish`` may be called from any thread (it runs from on_commit
+    callbacks); the backend hands each event to ``_dispatch``, which passes
+    it to a hub on every event loop with subscribers. Hubs batch events for
+    QUEUE_EVENTS_DEBOUNCE_SECONDS so a burst of saves becomes one update.
+    """
+
+    def __init__(self, backend=None, debounce: float | None = None) -> None:
+        self.backend = backend or LocalQueueBackend()
+        self.backend.bind(self._dispatch)
+        self.debounce = (
+            debounce if debounce is not None
+            else getattr(settings, 'QUEUE_EVENTS_DEBOUNCE_SECONDS', 0.25)
+        )
+        self._hubs: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopHub]" = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self._stats = {"published": 0, "dispatched": 0}
+
+    def publish(self, event: dict) -> None:
+        with self._lock:
+            self._stats["published"] += 1
+        self.backend.publish(event)
+
+    def subscribe(self) -> QueueSubscription:
+        """Subscribe on the running event loop; close() the subscription when done."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            hub = self._hubs.get(loop)
+            if hub is None:
+                hub = self._hubs[loop] = _LoopHub(loop, self.debounce)
+        self.backend.start()
+        subscription = QueueSubscription(hub)
+        hub.subscribers.add(subscription)
+        return subscription
+
+    def _dispatch(self, event: dict) -> None:
+        with self._lock:
+            self._stats["dispatched"] += 1
+            hubs = list(self._hubs.values())
+        for hub in hubs:
+            try:
+                hub.loop.call_soon_threadsafe(hub.add, event)
+            except RuntimeError:  # loop closed
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._stats,
+                "backend": type(self.backend).__name__,
+                "subscribers": sum(len(hub.subscribers) for hub in self._hubs.values()),
+            }
+
+
+_bus: QueueEventBus | None = None
+_bus_lock = threading.Lock()
+
+
+def get_queue_event_bus() -> QueueEventBus:
+    global _bus
+    if _bus is None:
+        with _bus_lock:
+            if _bus is None:
+                name = getattr(settings, 'QUEUE_EVENT_BACKEND', 'local')
+                backend_class = _BACKENDS.get(name) or import_string(name)
+                _bus = QueueEventBus(backend_class())
+    return _bus
+
+
+def publish_queue_change(session_id: int | None = None, patient_id: int | None = None) -> None:
+    """Announce that a session (or a patient's sessions) changed; never raises."""
+    try:
+        get_queue_event_bus().publish({"session_id": session_id, "patient_id": patient_id})
+    except Exception:
+        logger.exception("Failed to publish queue change")
+
+
+def format_sse(event: str, payload: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
@@ -0,0 +1,608 @@
+"""
+In-process stand-in for ``AIProjectClient.agents`` (AZURE_AI_AGENT_BACKEND=fake).
+
+Streams are produced as the same ``event: ...`` / ``data: ...`` byte frames
+the service sends and handed to the SDK's own AgentRunStream and event
+handlers, so parsing, event dispatch, tool execution and handoffs run
+through exactly the code paths used against Foundry.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass, field, fields
+
+from azure.ai.projects import models as _models
+from azure.core.exceptions import HttpResponseError, ResourceNotFoundError, ServiceResponseTimeoutError
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_SESSION_ID_RE = re.compile(r"session_id=(\d+)")
+
+_REPLY_WORDS = (
+    "Thank you for sharing that. Could you tell me when the symptoms started, "
+    "how severe they feel on a scale of one to ten, and whether anything makes "
+    "them better or worse? Any fever, dizziness or shortness of breath?"
+).split()
+
+_ACTIVE_STATUSES = ("queued", "in_progress", "requires_action")
+
+
+@dataclass
+class FakeAgentConfig:
+    """Behaviour knobs for the fake backend; see AZURE_AI_FAKE_AGENT_CONFIG."""
+
+    tokens_per_second: float = 40.0
+    time_to_first_token: float = 0.4
+    reply_tokens: int = 60
+    # Latency of every non-streaming operation (create_thread, get_run, ...).
+    operation_latency: float = 0.02
+    # Probability that a run stops at requires_action with ``tool_calls``.
+    tool_call_rate: float = 0.0
+    # Each entry: {"name": ..., "arguments": {...}}; "{session_id}" and
+    # "{thread_id}" placeholders in string arguments are filled per run.
+    tool_calls: list = field(default_factory=list)
+    # Probability that a run asks for handoff_to_agent(target=handoff_target).
+    handoff_rate: float = 0.0
+    handoff_target: str = "analysis"
+    # Fault injection, applied per operation call.
+    error_rate: float = 0.0
+    timeout_rate: float = 0.0
+    timeout_seconds: float = 1.0
+    fault_operations: list = field(default_factory=list)  # empty: all operations
+    seed: int | None = None
+
+    @classmethod
+    def from_settings(cls, **overrides) -> "FakeAgentConfig":
+        values = dict(getattr(settings, 'AZURE_AI_FAKE_AGENT_CONFIG', {}) or {})
+        values.update(overrides)
+        known = {f.name for f in fields(cls)}
+        unknown = set(values) - known
+        if unknown:
+            raise ValueError(f"Unknown fake agent settings: {', '.join(sorted(unknown))}")
+        return cls(**values)
+
+
+def _sse(event: str, data) -> bytes:
+    payload = data if isinstance(data, str) else json.dumps(data)
+    return f"event: {event}\ndata: {payload}\n\n".encode("utf-8")
+
+
+def _noop_submit_tool_outputs(run, event_handler, submit_with_error):
+    # The app executes its own tools after the stream ends, exactly as it
+    # does against Foundry, where the SDK has no local function tools.
+    return []
+
+
+async def _async_noop_submit_tool_outputs(run, event_handler, submit_with_error):
+    return []
+
+
+# ---------------------------------------------------------------------------
+# Shared state and scripting
+# ---------------------------------------------------------------------------
+
+class _FakeAgentsCore:
+    """Thread/run bookkeeping shared by the sync and async façades."""
+
+    def __init__(self, config: FakeAgentConfig) -> None:
+        self.config = config
+        self._rng = random.Random(config.seed)
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._threads: dict[str, list] = {}
+        self._runs: dict[str, dict] = {}
+        self.calls: dict[str, int] = {}
+
+    # ------------------------------------------------------------------
+    # Helpers
+    # ------------------------------------------------------------------
+
+    def _new_id(self, prefix: str) -> str:
+        return f"{prefix}_fake{next(self._ids):06d}"
+
+    def _chance(self, rate: float) -> bool:
+        if rate <= 0:
+            return False
+        with self._lock:
+            return self._rng.random() < rate
+
+    def fault(self, operation: str):
+        """Return ``("error", exc)``, ``("timeout", seconds)`` or None for this call."""
+        with self._lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+        cfg = self.config
+        if cfg.fault_operations and operation not in cfg.fault_operations:
+            return None
+        if self._chance(cfg.timeout_rate):
+            return ("timeout", cfg.timeout_seconds)
+        if self._chance(cfg.error_rate):
+            exc = HttpResponseError(message=f"(ServerError) Injected fake failure in {operation}")
+            exc.status_code = 503
+            return ("error", exc)
+        return None
+
+    def _thread_messages(self, thread_id: str) -> list:
+        messages = self._threads.get(thread_id)
+        if messages is None:
+            raise ResourceNotFoundError(f"No thread found with id '{thread_id}'.")
+        return messages
+
+    def _active_run(self, thread_id: str) -> dict | None:
+        for run in self._runs.values():
+            if run["thread_id"] == thread_id and run["status"] in _ACTIVE_STATUSES:
+                return run
+        return None
+
+    def _reply_tokens(self) -> list:
+        count = max(1, self.config.reply_tokens)
+        words = itertools.islice(itertools.cycle(_REPLY_WORDS), count)
+        return [f"{word} " for word in words]
+
+    def _plan_tool_calls(self, thread_id: str) -> list:
+        cfg = self.config
+        messages = self._threads.get(thread_id, [])
+        last_user = next((m for m in reversed(messages) if m["role"] == "user"), None)
+        text = last_user["content"][0]["text"]["value"] if last_user else ""
+        if "transferred to" in text:
+            # Handoff introductions never hand off again.
+            return []
+        match = _SESSION_ID_RE.search(text)
+        session_id = int(match.group(1)) if match else 0
+
+        def fill(value):
+            if value == "{session_id}":
+                return session_id
+            if isinstance(value, str):
+                return value.replace("{thread_id}", thread_id)
+            return value
+
+        planned = []
+        if cfg.tool_calls and self._chance(cfg.tool_call_rate):
+            for spec in cfg.tool_calls:
+                args = {k: fill(v) for k, v in (spec.get("arguments") or {}).items()}
+                planned.append((spec["name"], args))
+        if self._chance(cfg.handoff_rate):
+            planned.append(("handoff_to_agent", {"session_id": session_id, "target_role": cfg.handoff_target}))
+        return [
+            {
+                "id": self._new_id("call"),
+                "type": "function",
+                "function": {"name": name, "arguments": json.dumps(args)},
+            }
+            for name, args in planned
+        ]
+
+    def _reply_duration(self) -> float:
+        cfg = self.config
+        rate = cfg.tokens_per_second
+        return cfg.time_to_first_token + (cfg.reply_tokens / rate if rate > 0 else 0)
+
+    # ------------------------------------------------------------------
+    # Wire-format payloads
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _run_json(run: dict) -> dict:
+        payload = {
+            "id": run["id"],
+            "object": "thread.run",
+            "thread_id": run["thread_id"],
+            "assistant_id": run["agent_id"],
+            "status": run["status"],
+            "created_at": run["created_at"],
+            "model": "fake-model",
+            "instructions": "",
+            "tools": [],
+            "metadata": {},
+            "last_error": None,
+            "required_action": None,
+        }
+        if run["status"] == "requires_action":
+            payload["required_action"] = {
+                "type": "submit_tool_outputs",
+                "submit_tool_outputs": {"tool_calls": run["tool_calls"]},
+            }
+        return payload
+
+    def thread_model(self, thread_id: str):
+        return _models.AgentThread({
+            "id": thread_id, "object": "thread", "created_at": int(time.time()),
+            "tool_resources": {}, "metadata": {},
+        })
+
+    def run_model(self, run: dict):
+        payload = self._run_json(run)
+        payload["agent_id"] = payload.pop("assistant_id")
+        return _models.ThreadRun(payload)
+
+    # ------------------------------------------------------------------
+    # Operations (state changes only; the façades add latency)
+    # ------------------------------------------------------------------
+
+    def create_thread(self) -> str:
+        thread_id = self._new_id("thread")
+        with self._lock:
+            self._threads[thread_id] = []
+        return thread_id
+
+    def delete_thread(self, thread_id: str) -> dict:
+        with self._lock:
+            self._thread_messages(thread_id)
+            del self._threads[thread_id]
+        return {"id": thread_id, "object": "thread.deleted", "deleted": True}
+
+    def create_message(self, thread_id: str, role: str, content: str) -> dict:
+        with self._lock:
+            messages = self._thread_messages(thread_id)
+            active = self._active_run(thread_id)
+            if active is not None:
+                exc = HttpResponseError(
+                    message=f"(BadRequest) Can't add messages to {thread_id} while a run {active['id']} is active."
+                )
+                exc.status_code = 400
+                raise exc
+            message = self._append_message(thread_id, "user", content, run_id=None, agent_id=None)
+        return message
+
+    def _append_message(self, thread_id, role, text, run_id, agent_id) -> dict:
+        message = {
+            "id": self._new_id("msg"),
+            "object": "thread.message",
+            "created_at": int(time.time()),
+            "thread_id": thread_id,
+            "status": "completed",
+            "role": role,
+            "content": [{"type": "text", "text": {"value": text, "annotations": []}}],
+            "assistant_id": agent_id,
+            "run_id": run_id,
+            "attachments": [],
+            "metadata": {},
+        }
+        self._threads[thread_id].append(message)
+        return message
+
+    def start_run(self, thread_id: str, agent_id: str | None) -> dict:
+        with self._lock:
+            self._thread_messages(thread_id)
+            active = self._active_run(thread_id)
+            if active is not None:
+                exc = HttpResponseError(
+                    message=f"(BadRequest) Thread {thread_id} already has an active run {active['id']}."
+                )
+                exc.status_code = 400
+                raise exc
+            run = {
+                "id": self._new_id("run"),
+                "thread_id": thread_id,
+                "agent_id": agent_id or "asst_fake",
+                "status": "queued",
+                "created_at": int(time.time()),
+                "tool_calls": [],
+                "ready_at": 0.0,
+            }
+            self._runs[run["id"]] = run
+        run["tool_calls"] = self._plan_tool_calls(thread_id)
+        run["ready_at"] = time.monotonic() + (
+            self.config.time_to_first_token if run["tool_calls"] else self._reply_duration()
+        )
+        return run
+
+    def get_run(self, thread_id: str, run_id: str) -> dict:
+        with self._lock:
+            run = self._runs.get(run_id)
+            if run is None or run["thread_id"] != thread_id:
+                raise ResourceNotFoundError(f"No run found with id '{run_id}'.")
+            if run["status"] in ("queued", "in_progress"):
+                if time.monotonic() >= run["ready_at"]:
+                    if run["tool_calls"]:
+                        run["status"] = "requires_action"
+                    else:
+                        self._complete_locked(run)
+                else:
+                    run["status"] = "in_progress"
+            return run
+
+    def _complete_locked(self, run: dict) -> None:
+        if run["status"] in _ACTIVE_STATUSES:
+            run["status"] = "completed"
+            self._append_message(run["thread_id"], "assistant", "".join(self._reply_tokens()).strip(),
+                                 run_id=run["id"], agent_id=run["agent_id"])
+
+    def accept_tool_outputs(self, thread_id: str, run_id: str, tool_outputs) -> dict:
+        with self._lock:
+            run = self._runs.get(run_id)
+            if run is None or run["thread_id"] != thread_id:
+                raise ResourceNotFoundError(f"No run found with id '{run_id}'.")
+            if run["status"] != "requires_action":
+                exc = HttpResponseError(message=f"(BadRequest) Run {run_id} is not waiting for tool outputs.")
+                exc.status_code = 400
+                raise exc
+            expected = {call["id"] for call in run["tool_calls"]}
+            received = {output["tool_call_id"] for output in tool_outputs}
+            if expected != received:
+                exc = HttpResponseError(message=f"(BadRequest) Tool outputs do not match {sorted(expected)}.")
+                exc.status_code = 400
+                raise exc
+            run["tool_calls"] = []
+            run["status"] = "in_progress"
+            run["ready_at"] = time.monotonic() + self._reply_duration()
+            return run
+
+    def cancel_run(self, thread_id: str, run_id: str) -> dict:
+        with self._lock:
+            run = self._runs.get(run_id)
+            if run is None or run["thread_id"] != thread_id:
+                raise ResourceNotFoundError(f"No run found with id '{run_id}'.")
+            if run["status"] in _ACTIVE_STATUSES:
+                run["status"] = "cancelled"
+            return run
+
+    def list_messages(self, thread_id: str, run_id=None, limit=20, order="desc"):
+        with self._lock:
+            messages = list(self._thread_messages(thread_id))
+        if run_id:
+            messages = [m for m in messages if m["run_id"] == run_id]
+        if str(getattr(order, "value", order)) != "asc":
+            messages.reverse()
+        page = messages[: limit or 20]
+        return _models.OpenAIPageableListOfThreadMessage({
+            "object": "list",
+            "data": page,
+            "first_id": page[0]["id"] if page else None,
+            "last_id": page[-1]["id"] if page else None,
+            "has_more": len(messages) > len(page),
+        })
+
+    # ------------------------------------------------------------------
+    # Stream scripts: lists of ("sleep", seconds) / ("emit", bytes) steps
+    # ------------------------------------------------------------------
+
+    def stream_script(self, run: dict, resumed: bool = False) -> list:
+        cfg = self.config
+        steps = []
+        if not resumed:
+            steps.append(("emit", _sse("thread.run.created", self._run_json(run))))
+        with self._lock:
+            run["status"] = "in_progress"
+        steps.append(("emit", _sse("thread.run.in_progress", self._run_json(run))))
+        steps.append(("sleep", cfg.time_to_first_token))
+
+        if run["tool_calls"]:
+            steps.append(("finish", "requires_action"))
+            return steps
+
+        message_id = self._new_id("msg")
+        per_token = 1.0 / cfg.tokens_per_second if cfg.tokens_per_second > 0 else 0.0
+        for index, token in enumerate(self._reply_tokens()):
+            if index:
+                steps.append(("sleep", per_token))
+            steps.append(("emit", _sse("thread.message.delta", {
+                "id": message_id,
+                "object": "thread.message.delta",
+                "delta": {"content": [{"index": 0, "type": "text", "text": {"value": token}}]},
+            })))
+        steps.append(("finish", "completed"))
+        return steps
+
+    def finish(self, run: dict, outcome: str) -> bytes:
+        """Apply the terminal transition of a scripted stream and return its frames."""
+        with self._lock:
+            if outcome == "requires_action" and run["status"] in ("queued", "in_progress"):
+                run["status"] = "requires_action"
+                return _sse("thread.run.requires_action", self._run_json(run))
+            self._complete_locked(run)
+            return _sse("thread.run.completed", self._run_json(run)) + _sse("done", "[DONE]")
+
+    def abandon(self, run: dict) -> None:
+        """A client stopped reading: the service would still finish the run."""
+        with self._lock:
+            if run["status"] in ("queued", "in_progress"):
+                self._complete_locked(run)
+
+
+# ---------------------------------------------------------------------------
+# Sync façade
+# ---------------------------------------------------------------------------
+
+class FakeAgentsOperations:
+    """Blocking counterpart of ``AIProjectClient.agents``."""
+
+    def __init__(self, core: _FakeAgentsCore) -> None:
+        self._core = core
+
+    def _enter(self, operation: str) -> None:
+        fault = self._core.fault(operation)
+        if fault and fault[0] == "timeout":
+            time.sleep(fault[1])
+            raise ServiceResponseTimeoutError(f"Fake {operation} timed out")
+        time.sleep(self._core.config.operation_latency)
+        if fault:
+            raise fault[1]
+
+    def create_thread(self, **kwargs):
+        self._enter("create_thread")
+        return self._core.thread_model(self._core.create_thread())
+
+    def delete_thread(self, thread_id, **kwargs):
+        self._enter("delete_thread")
+        return _models.ThreadDeletionStatus(self._core.delete_thread(thread_id))
+
+    def create_message(self, thread_id, role="user", content="", **kwargs):
+        self._enter("create_message")
+        return _models.ThreadMessage(self._core.create_message(thread_id, role, content))
+
+    def create_run(self, thread_id, agent_id=None, **kwargs):
+        self._enter("create_run")
+        return self._core.run_model(self._core.start_run(thread_id, agent_id))
+
+    def get_run(self, thread_id, run_id, **kwargs):
+        self._enter("get_run")
+        return self._core.run_model(self._core.get_run(thread_id, run_id))
+
+    def cancel_run(self, thread_id, run_id, **kwargs):
+        self._enter("cancel_run")
+        return self._core.run_model(self._core.cancel_run(thread_id, run_id))
+
+    def submit_tool_outputs_to_run(self, thread_id, run_id, tool_outputs, **kwargs):
+        self._enter("submit_tool_outputs_to_run")
+        return self._core.run_model(self._core.accept_tool_outputs(thread_id, run_id, tool_outputs))
+
+    def list_messages(self, thread_id, run_id=None, limit=None, order=None, **kwargs):
+        self._enter("list_messages")
+        return self._core.list_messages(thread_id, run_id=run_id, limit=limit, order=order or "desc")
+
+    def _byte_stream(self, run: dict, resumed: bool = False):
+        core = self._core
+        finished = False
+        try:
+            for kind, value in core.stream_script(run, resumed=resumed):
+                if kind == "sleep":
+                    time.sleep(value)
+                elif kind == "emit":
+                    yield value
+                else:
+                    finished = True
+                    yield core.finish(run, value)
+        finally:
+            if not finished:
+                core.abandon(run)
+
+    def create_stream(self, thread_id, agent_id=None, event_handler=None, **kwargs):
+        self._enter("create_stream")
+        run = self._core.start_run(thread_id, agent_id)
+        return _models.AgentRunStream(
+            self._byte_stream(run), _noop_submit_tool_outputs, event_handler or _models.AgentEventHandler()
+        )
+
+    def submit_tool_outputs_to_stream(self, thread_id, run_id, tool_outputs, event_handler, **kwargs):
+        self._enter("submit_tool_outputs_to_stream")
+        run = self._core.accept_tool_outputs(thread_id, run_id, tool_outputs)
+        event_handler.initialize(self._byte_stream(run, resumed=True), _noop_submit_tool_outputs)
+
+
+class FakeProjectClient:
+    """Minimal ``AIProjectClient`` replacement exposing ``.agents``."""
+
+    def __init__(self, config: FakeAgentConfig | None = None, core: _FakeAgentsCore | None = None) -> None:
+        self.agents = FakeAgentsOperations(core or get_fake_core(config))
+
+    def close(self) -> None:
+        pass
+
+
+# ---------------------------------------------------------------------------
+# Async façade
+# ---------------------------------------------------------------------------
+
+class FakeAsyncAgentsOperations:
+    """Coroutine counterpart of ``azure.ai.projects.aio.AIProjectClient.agents``."""
+
+    def __init__(self, core: _FakeAgentsCore) -> None:
+        self._core = core
+
+    async def _enter(self, operation: str) -> None:
+        fault = self._core.fault(operation)
+        if fault and fault[0] == "timeout":
+            await asyncio.sleep(fault[1])
+            raise ServiceResponseTimeoutError(f"Fake {operation} timed out")
+        await asyncio.sleep(self._core.config.operation_latency)
+        if fault:
+            raise fault[1]
+
+    async def create_thread(self, **kwargs):
+        await self._enter("create_thread")
+        return self._core.thread_model(self._core.create_thread())
+
+    async def delete_thread(self, thread_id, **kwargs):
+        await self._enter("delete_thread")
+        return _models.ThreadDeletionStatus(self._core.delete_thread(thread_id))
+
+    async def create_message(self, thread_id, role="user", content="", **kwargs):
+        await self._enter("create_message")
+        return _models.ThreadMessage(self._core.create_message(thread_id, role, content))
+
+    async def create_run(self, thread_id, agent_id=None, **kwargs):
+        await self._enter("create_run")
+        return self._core.run_model(self._core.start_run(thread_id, agent_id))
+
+    async def get_run(self, thread_id, run_id, **kwargs):
+        await self._enter("get_run")
+        return self._core.run_model(self._core.get_run(thread_id, run_id))
+
+    async def cancel_run(self, thread_id, run_id, **kwargs):
+        await self._enter("cancel_run")
+        return self._core.run_model(self._core.cancel_run(thread_id, run_id))
+
+    async def submit_tool_outputs_to_run(self, thread_id, run_id, tool_outputs, **kwargs):
+        await self._enter("submit_tool_outputs_to_run")
+        return self._core.run_model(self._core.accept_tool_outputs(thread_id, run_id, tool_outputs))
+
+    async def list_messages(self, thread_id, run_id=None, limit=None, order=None, **kwargs):
+        await self._enter("list_messages")
+        return self._core.list_messages(thread_id, run_id=run_id, limit=limit, order=order or "desc")
+
+    async def _byte_stream(self, run: dict, resumed: bool = False):
+        core = self._core
+        finished = False
+        try:
+            for kind, value in core.stream_script(run, resumed=resumed):
+                if kind == "sleep":
+                    await asyncio.sleep(value)
+                elif kind == "emit":
+                    yield value
+                else:
+                    finished = True
+                    yield core.finish(run, value)
+        finally:
+            if not finished:
+                core.abandon(run)
+
+    async def create_stream(self, thread_id, agent_id=None, event_handler=None, **kwargs):
+        await self._enter("create_stream")
+        run = self._core.start_run(thread_id, agent_id)
+        return _models.AsyncAgentRunStream(
+            self._byte_stream(run), _async_noop_submit_tool_outputs,
+            event_handler or _models.AsyncAgentEventHandler(),
+        )
+
+    async def submit_tool_outputs_to_stream(self, thread_id, run_id, tool_outputs, event_handler, **kwargs):
+        await self._enter("submit_tool_outputs_to_stream")
+        run = self._core.accept_tool_outputs(thread_id, run_id, tool_outputs)
+        event_handler.initialize(self._byte_stream(run, resumed=True), _async_noop_submit_tool_outputs)
+
+
+class FakeAsyncProjectClient:
+    """Minimal aio ``AIProjectClient`` replacement exposing ``.agents``."""
+
+    def __init__(self, config: FakeAgentConfig | None = None, core: _FakeAgentsCore | None = None) -> None:
+        self.agents = FakeAsyncAgentsOperations(core or get_fake_core(config))
+
+    async def close(self) -> None:
+        pass
+
+
+# ---------------------------------------------------------------------------
+# Process-wide state
+# ---------------------------------------------------------------------------
+
+_core: _FakeAgentsCore | None = None
+_core_lock = threading.Lock()
+
+
+def get_fake_core(config: FakeAgentConfig | None = None) -> _FakeAgentsCore:
+    """
+    Return the shared fake backend state so threads created through the
+    sync client (e.g. the thread pool) are visible to the async client.
+    Passing a config replaces the shared state.
+    """
+    global _core
+    with _core_lock:
+        if _core is None or config is not None:
+            _core = _FakeAgentsCore(config or FakeAgentConfig.from_settings())
+        return _core
@@ -0,0 +1,172 @@
+import re
+import statistics
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from triage.models import ChatMessage, Patient, TriageSession
+
+
+# Full table scans of the triage tables (SQLite "SCAN t" without an index, PostgreSQL "Seq Scan").
+_FULL_SCAN = re.compile(r'\bSCAN triage_\w+(?! USING)(?:\s|$)|Seq Scan on triage_')
+
+
+class _Rollback(Exception):
+    """Raised to discard the seeded rows at the end of the run."""
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a large throwaway dataset, then check with EXPLAIN that the per-turn '
+        'thread and chat-history lookups use their indexes (SQLite and PostgreSQL).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sessions', type=int, default=20000, help='Triage sessions to seed')
+        parser.add_argument('--messages', type=int, default=8, help='Chat messages per session')
+        parser.add_argument('--sessions-per-patient', type=int, default=4)
+        parser.add_argument('--repeat', type=int, default=50, help='Timed executions per query')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument(
+            '--keep', action='store_true',
+            help='Commit the seeded rows instead of rolling them back',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            raise CommandError(f"Unsupported database backend: {connection.vendor}")
+
+        failures = []
+        try:
+            with transaction.atomic():
+                probe = self._seed(options)
+                self._analyze()
+                for label, queryset, index_name in self._checks(probe):
+                    plan = queryset.explain()
+                    used = index_name in plan and not _FULL_SCAN.search(plan)
+                    millis = self._time(queryset, options['repeat'])
+                    status = self.style.SUCCESS('index') if used else self.style.ERROR('NO INDEX')
+                    self.stdout.write(f"{label:<22} {status:<8} median {millis:.3f} ms")
+                    self.stdout.write(f"    expected {index_name}")
+                    for line in plan.splitlines():
+                        self.stdout.write(f"    | {line}")
+                    if not used:
+                        failures.append(label)
+                if not options['keep']:
+                    raise _Rollback
+        except _Rollback:
+            self.stdout.write("Seeded rows rolled back.")
+
+        if failures:
+            raise CommandError(f"Index not used by: {', '.join(failures)}")
+        self.stdout.write(self.style.SUCCESS("All lookups use their indexes."))
+
+    # ------------------------------------------------------------------
+    # Dataset
+    # ------------------------------------------------------------------
+
+    def _seed(self, options) -> dict:
+        """Bulk-insert patients, sessions and messages; return ids to probe with."""
+        sessions_total = max(options['sessions'], 1)
+        per_patient = max(options['sessions_per_patient'], 1)
+        batch = options['batch_size']
+        run_tag = uuid.uuid4().hex[:8]
+        statuses = [choice for choice, _ in TriageSession.STATUS_CHOICES]
+
+        started = time.perf_counter()
+        patients = Patient.objects.bulk_create(
+            [
+                Patient(first_name='Bench', last_name=f'{run_tag}-{i}')
+                for i in range(-(-sessions_total // per_patient))
+            ],
+            batch_size=batch,
+        )
+        sessions = TriageSession.objects.bulk_create(
+            [
+                TriageSession(
+                    patient=patients[i // per_patient],
+                    status=statuses[i % len(statuses)],
+                    # Several sessions share a thread, as when a patient returns.
+                    thread_id=f'thread_bench_{run_tag}_{i // 2}',
+                    urgency_score=i % 5 + 1,
+                )
+                for i in range(sessions_total)
+            ],
+            batch_size=batch,
+        )
+        for start in range(0, len(sessions), batch):
+            ChatMessage.objects.bulk_create(
+                [
+                    ChatMessage(
+                        session=session,
+                        role='patient' if n % 2 == 0 else 'agent',
+                        content=f'benchmark message {n}',
+                    )
+                    for session in sessions[start:start + batch]
+                    for n in range(options['messages'])
+                ],
+                batch_size=batch,
+            )
+        self.stdout.write(
+            f"Seeded {len(patients)} patients, {len(sessions)} sessions and "
+            f"{len(sessions) * options['messages']} messages in "
+            f"{time.perf_counter() - started:.1f}s ({connection.vendor})."
+        )
+
+        middle = sessions[len(sessions) // 2]
+        return {'thread_id': middle.thread_id, 'patient_id': middle.patient_id, 'status': middle.status}
+
+    def _analyze(self) -> None:
+        """Refresh planner statistics so the plans reflect the seeded volume."""
+        tables = [TriageSession._meta.db_table, ChatMessage._meta.db_table, Patient._meta.db_table]
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                for table in tables:
+                    cursor.execute(f'ANALYZE "{table}"')
+            else:
+                cursor.execute('ANALYZE ' + ', '.join(f'"{table}"' for table in tables))
+
+    # ------------------------------------------------------------------
+    # Checks
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _checks(probe: dict) -> list:
+        """
+        (label, queryset, index expected in its plan) for each hot lookup.
+
+        The history join reaches messages through either the composite or the
+        plain session foreign-key index depending on the planner, so only its
+        thread lookup is pinned.
+        """
+        return [
+            (
+                'session by thread',  # api_chat, api_chat_stream, create_triage_record
+                TriageSession.objects.filter(thread_id=probe['thread_id']).order_by('-created_at')[:1],
+                'triage_session_thread_idx',
+            ),
+            (
+                'chat history',  # api_chat_history
+                ChatMessage.objects.filter(session__thread_id=probe['thread_id'])
+                .select_related('session').order_by('timestamp'),
+                'triage_session_thread_idx',
+            ),
+            (
+                'patient sessions',
+                TriageSession.objects.filter(patient_id=probe['patient_id'], status=probe['status'])
+                .order_by('-created_at'),
+                'triage_session_patient_idx',
+            ),
+        ]
+
+    @staticmethod
+    def _time(queryset, repeat: int) -> float:
+        """Median wall time of evaluating *queryset*, in milliseconds."""
+        samples = []
+        for _ in range(max(repeat, 1)):
+            started = time.perf_counter()
+            list(queryset.all())
+            samples.append((time.perf_counter() - started) * 1000)
+        return statistics.median(samples)
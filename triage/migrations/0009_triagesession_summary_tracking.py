@@ -0,0 +1,28 @@
+# Generated by Django 5.0.14 on 2026-10-16 22:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('triage', '0008_add_patient_name_fields'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='triagesession',
+            name='summary_updated_at',
+            field=models.DateTimeField(blank=True, help_text='When ai_summary was last regenerated', null=True),
+        ),
+        migrations.AddField(
+            model_name='triagesession',
+            name='summary_version',
+            field=models.PositiveIntegerField(default=0, help_text='Incremented each time ai_summary is regenerated'),
+        ),
+        migrations.AddField(
+            model_name='triagesession',
+            name='summary_watermark',
+            field=models.BigIntegerField(default=0, help_text='ID of the last ChatMessage folded into ai_summary'),
+        ),
+    ]
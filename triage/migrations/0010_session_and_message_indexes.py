@@ -0,0 +1,25 @@
+# Generated by Django 5.0.14 on 2026-10-16 23:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('triage', '0009_triagesession_summary_tracking'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['session', 'timestamp'], name='triage_chatmsg_session_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='triagesession',
+            index=models.Index(fields=['thread_id', 'created_at'], name='triage_session_thread_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='triagesession',
+            index=models.Index(fields=['patient', 'status', 'created_at'], name='triage_session_patient_idx'),
+        ),
+    ]
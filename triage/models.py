@@ -104,11 +104,29 @@ class TriageSession(models.Model):
         default='intake',
         help_text="The role of the agent currently handling this session (e.g., intake, analysis, guardian)"
     )
+    summary_watermark = models.BigIntegerField(
+        default=0,
+        help_text="ID of the last ChatMessage folded into ai_summary",
+    )
+    summary_version = models.PositiveIntegerField(
+        default=0,
+        help_text="Incremented each time ai_summary is regenerated",
+    )
+    summary_updated_at = models.DateTimeField(
+        blank=True,
+        null=True,
+        help_text="When ai_summary was last regenerated",
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-urgency_score', 'created_at']
+        indexes = [
+            # Latest session for a thread, looked up on every chat turn.
+            models.Index(fields=['thread_id', 'created_at'], name='triage_session_thread_idx'),
+            models.Index(fields=['patient', 'status', 'created_at'], name='triage_session_patient_idx'),
+        ]
 
     def __str__(self):
         return f"Session: {self.patient} - {self.status}"
@@ -131,6 +149,9 @@ class ChatMessage(models.Model):
 
     class Meta:
         ordering = ['timestamp']
+        indexes = [
+            models.Index(fields=['session', 'timestamp'], name='triage_chatmsg_session_idx'),
+        ]
 
     def __str__(self):
         return f"[{self.role}] {self.content[:50]}"
@@ -0,0 +1,163 @@
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from .events import publish_queue_change
+
+# Shared across workers through the default cache (Redis when REDIS_URL is set).
+VERSION_CACHE_KEY = "triage:doctor_queue:version"
+FRAGMENT_CACHE_KEY = "triage:doctor_queue:fragment:{version}:{bucket}"
+
+# Fields rendered in the queue rows or counted in its stats; saves touching
+# only other fields (thread_id, agent_logs, ...) leave the fragment valid.
+_SESSION_FIELDS = frozenset({
+    "patient", "status", "urgency_score", "ai_summary",
+    "recommended_action", "symptoms", "created_at",
+})
+_PATIENT_FIELDS = frozenset({"first_name", "last_name"})
+
+
+# ---------------------------------------------------------------------------
+# Queue version
+# ---------------------------------------------------------------------------
+
+def _current_version() -> int:
+    version = cache.get(VERSION_CACHE_KEY)
+    if version is None:
+        # Start a fresh (or evicted) counter from the clock so it cannot
+        # repeat a version whose fragment or ETag is still around.
+        cache.add(VERSION_CACHE_KEY, time.time_ns())
+        version = cache.get(VERSION_CACHE_KEY)
+    return version
+
+
+def _bump_version() -> None:
+    try:
+        cache.incr(VERSION_CACHE_KEY)
+    except ValueError:  # counter missing
+        cache.add(VERSION_CACHE_KEY, time.time_ns())
+
+
+@dataclass(frozen=True)
+class QueueState:
+    """
+    What a rendered queue fragment depends on.
+
+    ``version`` moves on every relevant TriageSession change. ``bucket`` is
+    the current DOCTOR_QUEUE_MAX_AGE_SECONDS window: the rows show relative
+    times ("5 minutes ago") and the average wait, which age even when no
+    session changes.
+    """
+    version: int
+    bucket: int
+
+    @property
+    def etag(self) -> str:
+        return f'"queue-{self.version}-{self.bucket}"'
+
+    @property
+    def cache_key(self) -> str:
+        return FRAGMENT_CACHE_KEY.format(version=self.version, bucket=self.bucket)
+
+
+def current_queue_state() -> QueueState:
+    max_age = getattr(settings, 'DOCTOR_QUEUE_MAX_AGE_SECONDS', 60)
+    bucket = int(time.time() // max_age) if max_age > 0 else 0
+    return QueueState(version=_current_version(), bucket=bucket)
+
+
+# ---------------------------------------------------------------------------
+# Fragment cache
+# ---------------------------------------------------------------------------
+
+class QueueFragmentCache:
+    """
+    Rendered doctor queue partial, shared by every doctor and worker.
+
+    A fragment is stored once per QueueState in the default cache, so the
+    queue query and template render run once per change (or max-age window)
+    instead of once per poll per open dashboard. The counters are per process.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "renders": 0, "not_modified": 0, "invalidations": 0}
+
+    def get(self, state: QueueState, render: Callable[[], str]) -> str:
+        html = cache.get(state.cache_key)
+        if html is not None:
+            self._count("hits")
+            return html
+        html = render()
+        self._count("renders")
+        # Outlive one window so pollers that straddle its end still share it.
+        max_age = getattr(settings, 'DOCTOR_QUEUE_MAX_AGE_SECONDS', 60)
+        cache.set(state.cache_key, html, timeout=max(max_age, 1) * 2)
+        return html
+
+    def record_not_modified(self) -> None:
+        self._count("not_modified")
+
+    def invalidate(self, **change) -> None:
+        """
+        Once the current transaction commits, bump the shared queue version
+        and announce *change* (session_id / patient_id) on the queue event bus.
+        """
+        self._count("invalidations")
+        transaction.on_commit(lambda: self._after_commit(change))
+
+    @staticmethod
+    def _after_commit(change: dict) -> None:
+        # Bump first: pushed updates and the next poll must see the new version.
+        _bump_version()
+        publish_queue_change(**change)
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._stats[key] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats)
+
+
+_fragments = QueueFragmentCache()
+
+
+def get_queue_fragment_cache() -> QueueFragmentCache:
+    return _fragments
+
+
+def invalidate_doctor_queue(session_id: int | None = None, patient_id: int | None = None) -> None:
+    _fragments.invalidate(session_id=session_id, patient_id=patient_id)
+
+
+# ---------------------------------------------------------------------------
+# Signals
+# ---------------------------------------------------------------------------
+
+def _on_session_changed(sender, instance, update_fields=None, **kwargs) -> None:
+    if update_fields is not None and not _SESSION_FIELDS.intersection(update_fields):
+        return
+    invalidate_doctor_queue(session_id=instance.pk)
+
+
+def _on_patient_saved(sender, instance, update_fields=None, **kwargs) -> None:
+    if update_fields is not None and not _PATIENT_FIELDS.intersection(update_fields):
+        return
+    invalidate_doctor_queue(patient_id=instance.pk)
+
+
+def connect_signals() -> None:
+    """Hook queue invalidation to TriageSession and Patient changes (called from TriageConfig.ready)."""
+    from .models import Patient, TriageSession
+
+    post_save.connect(_on_session_changed, sender=TriageSession, dispatch_uid="triage.queue_cache.session_saved")
+    post_delete.connect(_on_session_changed, sender=TriageSession, dispatch_uid="triage.queue_cache.session_deleted")
+    post_save.connect(_on_patient_saved, sender=Patient, dispatch_uid="triage.queue_cache.patient_saved")
@@ -0,0 +1,452 @@
+import asyncio
+import functools
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from azure.core.exceptions import HttpResponseError
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Agent operations the breakers guard by default.
+GUARDED_OPERATIONS = ("create_thread", "create_message", "create_run", "create_stream", "get_run")
+
+# HTTP statuses that mean "the service is struggling" rather than "bad request".
+_RETRIABLE_STATUS = {408, 429}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling Azure while an operation's circuit is open."""
+
+    def __init__(self, operation: str, retry_after: float) -> None:
+        self.operation = operation
+        self.retry_after = retry_after
+        super().__init__(
+            f"Azure AI service is temporarily unavailable ({operation} circuit open); "
+            f"retry in {retry_after:.0f}s"
+        )
+
+
+def is_service_failure(exc: BaseException) -> bool:
+    """
+    Client errors (4xx other than 408/429) say nothing about service health,
+    and neither do cancellations or interrupts (non-Exception BaseExceptions).
+    """
+    if not isinstance(exc, Exception) or isinstance(exc, CircuitOpenError):
+        return False
+    status = getattr(exc, "status_code", None)
+    if isinstance(exc, HttpResponseError) and status is not None:
+        return status >= 500 or status in _RETRIABLE_STATUS
+    return True
+
+
+# ---------------------------------------------------------------------------
+# Circuit breaker
+# ---------------------------------------------------------------------------
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Rolling-window breaker for one agent operation.
+
+    Calls are recorded with their outcome and latency; calls slower than
+    ``slow_call_seconds`` count as failures so a hanging backend trips the
+    breaker long before the SDK's read timeout. Once the failure rate over
+    the window reaches ``failure_rate`` (with at least ``min_calls`` samples)
+    the circuit opens and calls fail fast for ``open_seconds``. After that a
+    limited number of half-open trial calls decide whether to close again.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate: float | None = None,
+        min_calls: int | None = None,
+        window_seconds: float | None = None,
+        open_seconds: float | None = None,
+        slow_call_seconds: float | None = None,
+        half_open_max_calls: int = 1,
+    ) -> None:
+        self.name = name
+        self.failure_rate = (
+            failure_rate if failure_rate is not None
+            else getattr(settings, 'AZURE_AGENT_CIRCUIT_FAILURE_RATE', 0.5)
+        )
+        self.min_calls = (
+            min_calls if min_calls is not None
+            else getattr(settings, 'AZURE_AGENT_CIRCUIT_MIN_CALLS', 5)
+        )
+        self.window_seconds = (
+            window_seconds if window_seconds is not None
+            else getattr(settings, 'AZURE_AGENT_CIRCUIT_WINDOW_SECONDS', 60)
+        )
+        self.open_seconds = (
+            open_seconds if open_seconds is not None
+            else getattr(settings, 'AZURE_AGENT_CIRCUIT_OPEN_SECONDS', 30)
+        )
+        self.slow_call_seconds = (
+            slow_call_seconds if slow_call_seconds is not None
+            else getattr(settings, 'AZURE_AGENT_CIRCUIT_SLOW_CALL_SECONDS', 30)
+        )
+        self.half_open_max_calls = half_open_max_calls
+
+        self._lock = threading.Lock()
+        self._calls: deque = deque()  # (finished_at, failed, latency)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._trials = 0
+        self._stats = {"calls": 0, "failures": 0, "rejected": 0, "opened": 0, "abandoned": 0}
+
+    # ------------------------------------------------------------------
+    # State
+    # ------------------------------------------------------------------
+
+    def _trim_locked(self, now: float) -> None:
+        cutoff = now - self.window_seconds
+        while self._calls and self._calls[0][0] < cutoff:
+            self._calls.popleft()
+
+    def _open_locked(self, now: float) -> None:
+        if self._state != OPEN:
+            self._stats["opened"] += 1
+            logger.warning("Circuit for %s opened", self.name)
+        self._state = OPEN
+        self._opened_at = now
+        self._trials = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+                return HALF_OPEN
+            return self._state
+
+    def before_call(self) -> None:
+        """Admit the call or raise CircuitOpenError."""
+        with self._lock:
+            if self._state == CLOSED:
+                return
+            now = time.monotonic()
+            if self._state == OPEN:
+                remaining = self.open_seconds - (now - self._opened_at)
+                if remaining > 0:
+                    self._stats["rejected"] += 1
+                    raise CircuitOpenError(self.name, remaining)
+                self._state = HALF_OPEN
+                self._trials = 0
+            if self._trials >= self.half_open_max_calls:
+                self._stats["rejected"] += 1
+                raise CircuitOpenError(self.name, self.open_seconds)
+            self._trials += 1
+
+    def release(self) -> None:
+        """
+        Forget an admitted call that was cancelled before it finished.
+
+        Nothing is recorded: a cancellation says nothing about the service.
+        A half-open trial slot it held is given back for the next caller.
+        """
+        with self._lock:
+            self._stats["abandoned"] += 1
+            if self._state == HALF_OPEN and self._trials > 0:
+                self._trials -= 1
+
+    def record(self, latency: float, error: BaseException | None = None) -> None:
+        failed = (error is not None and is_service_failure(error)) or latency > self.slow_call_seconds
+        now = time.monotonic()
+        with self._lock:
+            self._stats["calls"] += 1
+            self._stats["failures"] += int(failed)
+
+            if self._state == HALF_OPEN:
+                if failed:
+                    self._open_locked(now)
+                else:
+                    logger.info("Circuit for %s closed after successful trial", self.name)
+                    self._state = CLOSED
+                    self._calls.clear()
+                    self._calls.append((now, False, latency))
+                return
+
+            self._calls.append((now, failed, latency))
+            self._trim_locked(now)
+            if self._state == CLOSED and len(self._calls) >= self.min_calls:
+                failures = sum(1 for _, f, _ in self._calls if f)
+                if failures / len(self._calls) >= self.failure_rate:
+                    self._open_locked(now)
+
+    def sample_count(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+    def latency_percentile(self, p: float) -> float | None:
+        with self._lock:
+            self._trim_locked(time.monotonic())
+            ordered = sorted(latency for _, failed, latency in self._calls if not failed)
+        if not ordered:
+            return None
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+    def snapshot(self) -> dict:
+        p50 = self.latency_percentile(0.50)
+        p95 = self.latency_percentile(0.95)
+        state = self.state
+        with self._lock:
+            window = len(self._calls)
+            failures = sum(1 for _, f, _ in self._calls if f)
+            return {
+                **self._stats,
+                "state": state,
+                "window_calls": window,
+                "error_rate": round(failures / window, 4) if window else None,
+                "latency_p50": round(p50, 4) if p50 is not None else None,
+                "latency_p95": round(p95, 4) if p95 is not None else None,
+            }
+
+
+# ---------------------------------------------------------------------------
+# Breaker registry and hedging policy
+# ---------------------------------------------------------------------------
+
+class BreakerRegistry:
+    """One breaker per operation name, shared by the sync and async clients."""
+
+    def __init__(self, **breaker_kwargs) -> None:
+        self._breaker_kwargs = breaker_kwargs
+        self._breakers: dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def get(self, operation: str) -> CircuitBreaker:
+        breaker = self._breakers.get(operation)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.setdefault(
+                    operation, CircuitBreaker(operation, **self._breaker_kwargs)
+                )
+        return breaker
+
+    def record_hedge(self, won: bool) -> None:
+        with self._lock:
+            self.hedges += 1
+            self.hedge_wins += int(won)
+
+    def snapshot(self) -> dict:
+        return {
+            "operations": {name: b.snapshot() for name, b in list(self._breakers.items())},
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+        }
+
+
+class HedgePolicy:
+    """
+    When to fire a duplicate of an idempotent call.
+
+    The losing duplicate is abandoned, not undone, so only calls without side
+    effects belong in ``operations``.
+    """
+
+    def __init__(
+        self,
+        operations=None,
+        percentile: float | None = None,
+        min_delay: float | None = None,
+        min_samples: int = 5,
+    ) -> None:
+        if operations is None:
+            operations = (
+                getattr(settings, 'AZURE_AGENT_HEDGED_OPERATIONS', ("get_run",))
+                if getattr(settings, 'AZURE_AGENT_HEDGING_ENABLED', False) else ()
+            )
+        self.operations = frozenset(operations)
+        self.percentile = (
+            percentile if percentile is not None
+            else getattr(settings, 'AZURE_AGENT_HEDGE_PERCENTILE', 0.95)
+        )
+        self.min_delay = (
+            min_delay if min_delay is not None
+            else getattr(settings, 'AZURE_AGENT_HEDGE_MIN_DELAY_SECONDS', 0.5)
+        )
+        self.min_samples = min_samples
+
+    def delay_for(self, breaker: CircuitBreaker) -> float | None:
+        """Seconds to wait before hedging, or None to not hedge this call."""
+        if breaker.name not in self.operations:
+            return None
+        if breaker.sample_count() < self.min_samples:
+            return None
+        observed = breaker.latency_percentile(self.percentile)
+        return max(self.min_delay, observed) if observed is not None else None
+
+
+# ---------------------------------------------------------------------------
+# Guarded agent operations
+# ---------------------------------------------------------------------------
+
+# Hedged duplicates of blocking calls run here so the caller's thread can
+# wait on whichever finishes first.
+_hedge_executor: ThreadPoolExecutor | None = None
+_hedge_executor_lock = threading.Lock()
+
+
+def _get_hedge_executor() -> ThreadPoolExecutor:
+    global _hedge_executor
+    if _hedge_executor is None:
+        with _hedge_executor_lock:
+            if _hedge_executor is None:
+                _hedge_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="agent-hedge")
+    return _hedge_executor
+
+
+class ResilientAgentOperations:
+    """
+    Proxy for ``client.agents`` that routes guarded operations through
+    their circuit breaker and, for hedged operations, races a duplicate
+    request once the primary exceeds the configured latency percentile.
+
+    Anything not in ``operations`` is passed through untouched. Set
+    ``is_async`` for the aio client, whose operations are coroutines.
+    """
+
+    def __init__(
+        self,
+        agents,
+        registry: BreakerRegistry,
+        hedging: HedgePolicy,
+        is_async: bool = False,
+        operations=GUARDED_OPERATIONS,
+    ) -> None:
+        self.wrapped = agents
+        self._registry = registry
+        self._hedging = hedging
+        self._is_async = is_async
+        self._operations = frozenset(operations)
+
+    def __getattr__(self, name):
+        target = getattr(self.wrapped, name)
+        if name not in self._operations or not callable(target):
+            return target
+        breaker = self._registry.get(name)
+        wrapper = self._async_call if self._is_async else self._sync_call
+        return functools.partial(wrapper, breaker, target)
+
+    # ------------------------------------------------------------------
+    # Sync path
+    # ------------------------------------------------------------------
+
+    def _sync_call(self, breaker: CircuitBreaker, target, *args, **kwargs):
+        breaker.before_call()
+        hedge_delay = self._hedging.delay_for(breaker)
+        started = time.monotonic()
+        try:
+            if hedge_delay is None:
+                result = target(*args, **kwargs)
+            else:
+                result = self._sync_hedged(target, hedge_delay, args, kwargs)
+        except Exception as exc:
+            breaker.record(time.monotonic() - started, exc)
+            raise
+        except BaseException:
+            breaker.release()
+            raise
+        breaker.record(time.monotonic() - started)
+        return result
+
+    def _sync_hedged(self, target, delay: float, args, kwargs):
+        executor = _get_hedge_executor()
+        primary = executor.submit(target, *args, **kwargs)
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+
+        hedge = executor.submit(target, *args, **kwargs)
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    self._registry.record_hedge(won=future is hedge)
+                    return future.result()
+                error = future.exception()
+        self._registry.record_hedge(won=False)
+        raise error
+
+    # ------------------------------------------------------------------
+    # Async path
+    # ------------------------------------------------------------------
+
+    async def _async_call(self, breaker: CircuitBreaker, target, *args, **kwargs):
+        breaker.before_call()
+        hedge_delay = self._hedging.delay_for(breaker)
+        started = time.monotonic()
+        try:
+            if hedge_delay is None:
+                result = await target(*args, **kwargs)
+            else:
+                result = await self._async_hedged(target, hedge_delay, args, kwargs)
+        except Exception as exc:
+            breaker.record(time.monotonic() - started, exc)
+            raise
+        except BaseException:
+            # Cancelled (abandoned stream, tool timeout) or interrupted.
+            breaker.release()
+            raise
+        breaker.record(time.monotonic() - started)
+        return result
+
+    async def _async_hedged(self, target, delay: float, args, kwargs):
+        primary = asyncio.ensure_future(target(*args, **kwargs))
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+
+        hedge = asyncio.ensure_future(target(*args, **kwargs))
+        pending = {primary, hedge}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        self._registry.record_hedge(won=task is hedge)
+                        return task.result()
+                    error = task.exception()
+        finally:
+            for task in pending:
+                task.cancel()
+        self._registry.record_hedge(won=False)
+        raise error
+
+
+# ---------------------------------------------------------------------------
+# Module-level API
+# ---------------------------------------------------------------------------
+
+_registry: BreakerRegistry | None = None
+_registry_lock = threading.Lock()
+
+
+def get_breaker_registry() -> BreakerRegistry:
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = BreakerRegistry()
+    return _registry
+
+
+def wrap_agent_operations(agents, is_async: bool = False):
+    """Wrap a ``client.agents`` object unless breakers are disabled."""
+    if not getattr(settings, 'AZURE_AGENT_CIRCUIT_BREAKER_ENABLED', True):
+        return agents
+    return ResilientAgentOperations(agents, get_breaker_registry(), HedgePolicy(), is_async=is_async)
@@ -0,0 +1,386 @@
+import asyncio
+import logging
+import time
+import uuid
+import weakref
+from collections import deque
+from dataclasses import dataclass, field
+from typing import AsyncGenerator, Awaitable, Callable
+
+from django.conf import settings
+
+from .streaming import StreamEvent
+
+logger = logging.getLogger(__name__)
+
+StartRun = Callable[..., Awaitable[AsyncGenerator]]
+
+# Separator used when several queued patient messages become one follow-up run.
+COALESCED_MESSAGE_SEPARATOR = "\n\n"
+
+# Sent to a subscriber that fell further behind than the ring buffer holds.
+STREAM_GAP_MESSAGE = "Part of this reply is no longer available. Reload the conversation to see it."
+
+
+# ---------------------------------------------------------------------------
+# Run output fan-out
+# ---------------------------------------------------------------------------
+
+class RunBroadcast:
+    """
+    Fan one run's StreamEvents out to any number of subscribers.
+
+    Each published event is numbered (``StreamEvent.id``, from 1) and kept
+    in a ring buffer of the last ``capacity`` events, so a subscriber that
+    attaches late, or reconnects after a dropped connection, replays what
+    it missed from there and then follows the live tail. ``stream_id``
+    names the broadcast for resume requests.
+
+    ``listeners`` counts attached client subscriptions; when it drops to
+    zero before the run ends, ``on_idle`` is called so the coordinator can
+    decide whether the run has been abandoned.
+    """
+
+    def __init__(self, thread_id: str | None = None, capacity: int | None = None) -> None:
+        if capacity is None:
+            capacity = getattr(settings, 'STREAM_BUFFER_EVENTS', 2048)
+        self.stream_id = uuid.uuid4().hex
+        self.thread_id = thread_id
+        self._events: deque = deque(maxlen=max(capacity, 1))
+        self._next_id = 1
+        self._closed = False
+        self._waiter: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.listeners = 0
+        self.idle_since: float | None = time.monotonic()
+        self.on_idle: Callable[["RunBroadcast"], None] | None = None
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    @property
+    def last_event_id(self) -> int:
+        return self._next_id - 1
+
+    def can_resume_after(self, last_event_id: int) -> bool:
+        """True if every event after *last_event_id* is still buffered."""
+        first_buffered = self._next_id - len(self._events)
+        return 0 <= last_event_id <= self.last_event_id and last_event_id + 1 >= first_buffered
+
+    def publish(self, chunk) -> None:
+        chunk.id = self._next_id
+        self._next_id += 1
+        self._events.append(chunk)
+        self._wake()
+
+    def close(self) -> None:
+        self._closed = True
+        self._wake()
+
+    def _wake(self) -> None:
+        waiter = self._waiter
+        self._waiter = asyncio.get_running_loop().create_future()
+        if not waiter.done():
+            waiter.set_result(None)
+
+    async def subscribe(self, after: int = 0, listener: bool = True) -> AsyncGenerator:
+        """
+        Yield the events numbered after *after*, then the live tail until the run ends.
+
+        Pass ``listener=False`` for server-side readers (e.g. reply
+        persistence) that should not keep an unwatched run alive.
+        """
+        next_id = after + 1
+        if listener:
+            self.listeners += 1
+            self.idle_since = None
+        try:
+            while True:
+                if next_id < self._next_id:
+                    first_buffered = self._next_id - len(self._events)
+                    if next_id < first_buffered:
+                        yield StreamEvent.error(STREAM_GAP_MESSAGE)
+                        return
+                    chunk = self._events[next_id - first_buffered]
+                    next_id += 1
+                    yield chunk
+                elif self._closed:
+                    return
+                else:
+                    await asyncio.shield(self._waiter)
+        finally:
+            if listener:
+                self.listeners -= 1
+                if not self.listeners:
+                    self.idle_since = time.monotonic()
+                    if not self._closed and self.on_idle is not None:
+                        self.on_idle(self)
+
+
+@dataclass
+class Subscription:
+    """A request's view of the run that will answer its message."""
+    chunks: AsyncGenerator
+    is_owner: bool
+    coalesced: bool = False
+    stream: RunBroadcast | None = None
+
+    @property
+    def stream_id(self) -> str | None:
+        return self.stream.stream_id if self.stream is not None else None
+
+
+@dataclass
+class _PendingBatch:
+    start_run: StartRun
+    role: str
+    user_data: dict | None
+    broadcast: RunBroadcast
+    messages: list = field(default_factory=list)
+
+
+class _ThreadState:
+    __slots__ = ("lock", "active", "pending")
+
+    def __init__(self) -> None:
+        self.lock = asyncio.Lock()
+        self.active: RunBroadcast | None = None
+        self.pending: _PendingBatch | None = None
+
+
+# ---------------------------------------------------------------------------
+# Per-thread run coordinator
+# ---------------------------------------------------------------------------
+
+class ThreadRunCoordinator:
+    """
+    Serialise agent runs per thread_id.
+
+    The first message on an idle thread starts a run immediately. Messages
+    that arrive while that run is active are buffered and, once it finishes,
+    sent together as a single follow-up run whose output is broadcast to all
+    of their requests. Only the first request of each run is its owner and
+    responsible for persisting the reply.
+
+    Runs are pumped by a background task, so a run (and any follow-up)
+    carries on if the requests waiting on it disconnect. Every broadcast is
+    registered by stream id until ``resume_grace`` seconds after its run
+    ends, which is how a reconnecting client finds it again. A run nobody
+    has listened to for ``abandon_grace`` seconds is cancelled (the agent
+    stream generator then cancels the Azure run) instead of being paid for
+    to the end.
+    """
+
+    def __init__(self, resume_grace: float | None = None, abandon_grace: float | None = None) -> None:
+        self.resume_grace = (
+            resume_grace if resume_grace is not None
+            else getattr(settings, 'STREAM_RESUME_GRACE_SECONDS', 60)
+        )
+        self.abandon_grace = (
+            abandon_grace if abandon_grace is not None
+            else getattr(settings, 'STREAM_ABANDON_GRACE_SECONDS', 20)
+        )
+        self._threads: dict[str, _ThreadState] = {}
+        self._streams: dict[str, RunBroadcast] = {}
+        self._tasks: set = set()
+        self._stats = {
+            "runs": 0, "follow_up_runs": 0, "coalesced_messages": 0, "resumes": 0,
+            "abandoned_runs": 0, "abandoned_seconds_saved": 0.0,
+        }
+        # Moving average of how long finished runs took, for estimating
+        # how much run time cancelling an abandoned one saved.
+        self._avg_run_seconds: float | None = None
+
+    def _new_broadcast(self, thread_id: str) -> RunBroadcast:
+        broadcast = RunBroadcast(thread_id)
+        self._streams[broadcast.stream_id] = broadcast
+        return broadcast
+
+    def _retire_broadcast(self, broadcast: RunBroadcast) -> None:
+        broadcast.close()
+        asyncio.get_running_loop().call_later(
+            self.resume_grace, self._streams.pop, broadcast.stream_id, None
+        )
+
+    def _watch_for_abandonment(self, broadcast: RunBroadcast, run: asyncio.Task, started: float) -> None:
+        """Cancel *run* once *broadcast* has had no listener for ``abandon_grace`` seconds."""
+        if self.abandon_grace <= 0:
+            return
+        loop = asyncio.get_running_loop()
+
+        def check() -> None:
+            if run.done() or broadcast.listeners or broadcast.idle_since is None:
+                return
+            idle_for = time.monotonic() - broadcast.idle_since
+            if idle_for < self.abandon_grace:
+                loop.call_later(self.abandon_grace - idle_for, check)
+                return
+            elapsed = time.monotonic() - started
+            saved = max(0.0, (self._avg_run_seconds or elapsed) - elapsed)
+            self._stats["abandoned_runs"] += 1
+            self._stats["abandoned_seconds_saved"] = round(self._stats["abandoned_seconds_saved"] + saved, 3)
+            logger.info(
+                "Run on thread %s has had no client for %.0fs; cancelling it",
+                broadcast.thread_id, idle_for,
+            )
+            run.cancel()
+
+        broadcast.on_idle = lambda _: loop.call_later(self.abandon_grace, check)
+        if not broadcast.listeners:
+            loop.call_later(self.abandon_grace, check)
+
+    def _record_run_time(self, seconds: float) -> None:
+        avg = self._avg_run_seconds
+        self._avg_run_seconds = seconds if avg is None else avg + 0.2 * (seconds - avg)
+
+    def resume(self, stream_id: str, thread_id: str) -> RunBroadcast | None:
+        """Return the live or recently finished broadcast *stream_id* of *thread_id*, if still held."""
+        broadcast = self._streams.get(stream_id)
+        if broadcast is None or broadcast.thread_id != thread_id:
+            return None
+        self._stats["resumes"] += 1
+        return broadcast
+
+    async def submit(
+        self,
+        thread_id: str,
+        message: str,
+        *,
+        start_run: StartRun,
+        role: str = "intake",
+        user_data: dict | None = None,
+    ) -> Subscription:
+        """
+        Start or queue a run for *message* and return a subscription to it.
+
+        ``start_run`` has the signature of ``async_send_message_stream``.
+        Errors from starting an immediate run (stale thread, timeouts) are
+        raised to the caller unchanged.
+        """
+        while True:
+            state = self._threads.setdefault(thread_id, _ThreadState())
+            async with state.lock:
+                if self._threads.get(thread_id) is not state:
+                    # Retired while we waited for the lock; start over on a fresh state.
+                    continue
+
+                if state.active is not None or state.pending is not None:
+                    is_owner = state.pending is None
+                    if is_owner:
+                        state.pending = _PendingBatch(
+                            start_run=start_run, role=role, user_data=user_data,
+                            broadcast=self._new_broadcast(thread_id),
+                        )
+                    # Later messages may carry fresher context (e.g. a new summary).
+                    state.pending.role, state.pending.user_data = role, user_data
+                    state.pending.messages.append(message)
+                    self._stats["coalesced_messages"] += 1
+                    broadcast = state.pending.broadcast
+                    return Subscription(broadcast.subscribe(), is_owner, coalesced=True, stream=broadcast)
+
+                try:
+                    generator = await start_run(thread_id, message, role=role, user_data=user_data)
+                except BaseException:
+                    self._threads.pop(thread_id, None)
+                    raise
+                broadcast = self._new_broadcast(thread_id)
+                state.active = broadcast
+                self._stats["runs"] += 1
+                break
+
+        task = asyncio.ensure_future(self._pump(thread_id, state, broadcast, generator))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return Subscription(broadcast.subscribe(), is_owner=True, stream=broadcast)
+
+    @staticmethod
+    async def _drain(thread_id: str, broadcast: RunBroadcast, generator) -> None:
+        try:
+            async for chunk in generator:
+                broadcast.publish(chunk)
+        except Exception as exc:
+            logger.exception("Agent run on thread %s failed", thread_id)
+            broadcast.publish(StreamEvent.error(exc))
+
+    async def _pump(self, thread_id: str, state: _ThreadState, broadcast: RunBroadcast, generator) -> None:
+        while True:
+            # Each run is drained in its own task so an abandoned one can be
+            # cancelled without stopping the follow-up runs queued behind it.
+            started = time.monotonic()
+            run = asyncio.ensure_future(self._drain(thread_id, broadcast, generator))
+            self._watch_for_abandonment(broadcast, run, started)
+            try:
+                await asyncio.shield(run)
+                self._record_run_time(time.monotonic() - started)
+            except asyncio.CancelledError:
+                if not run.cancelled():
+                    run.cancel()
+                    raise
+                # Abandoned: the generator has cancelled the agent run.
+                broadcast.publish(StreamEvent.done("cancelled"))
+            finally:
+                self._retire_broadcast(broadcast)
+
+            async with state.lock:
+                batch, state.pending = state.pending, None
+                state.active = batch.broadcast if batch is not None else None
+                if batch is None:
+                    self._threads.pop(thread_id, None)
+                    return
+                broadcast = batch.broadcast
+                self._stats["runs"] += 1
+                self._stats["follow_up_runs"] += 1
+                try:
+                    generator = await batch.start_run(
+                        thread_id,
+                        COALESCED_MESSAGE_SEPARATOR.join(batch.messages),
+                        role=batch.role,
+                        user_data=batch.user_data,
+                    )
+                except Exception as exc:
+                    logger.exception("Failed to start follow-up run on thread %s", thread_id)
+                    generator = _error_stream(str(exc))
+
+    def is_active(self, thread_id: str) -> bool:
+        return thread_id in self._threads
+
+    def stats(self) -> dict:
+        return {
+            **self._stats,
+            "active_threads": len(self._threads),
+            "resumable_streams": len(self._streams),
+            "avg_run_seconds": round(self._avg_run_seconds, 3) if self._avg_run_seconds is not None else None,
+        }
+
+
+async def _error_stream(message: str) -> AsyncGenerator:
+    yield StreamEvent.error(message)
+
+
+# ---------------------------------------------------------------------------
+# Module-level API
+# ---------------------------------------------------------------------------
+
+# Locks and futures belong to one event loop, so keep a coordinator per loop.
+_coordinators: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, ThreadRunCoordinator]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_run_coordinator() -> ThreadRunCoordinator:
+    """Return the coordinator bound to the running event loop."""
+    loop = asyncio.get_running_loop()
+    coordinator = _coordinators.get(loop)
+    if coordinator is None:
+        coordinator = ThreadRunCoordinator()
+        _coordinators[loop] = coordinator
+    return coordinator
+
+
+def coordinator_stats() -> dict:
+    """Aggregate counters across every live coordinator."""
+    totals: dict = {}
+    for coordinator in list(_coordinators.values()):
+        for key, value in coordinator.stats().items():
+            totals[key] = totals.get(key, 0) + value
+    return totals
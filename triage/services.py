@@ -4,18 +4,46 @@ import time
 import os
 import threading
 import asyncio
-import concurrent.futures
 import inspect
 from urllib.parse import urlparse
-from typing import Dict, Any, Generator
+import weakref
+from typing import Dict, Any, AsyncGenerator, Generator
 
 from django.conf import settings
 from django.core.exceptions import SuspiciousOperation
 
 from azure.ai.projects import AIProjectClient
-from azure.ai.projects.models import MessageRole
+from azure.ai.projects.aio import AIProjectClient as AsyncAIProjectClient
+from azure.ai.projects.models import (
+    AgentEventHandler,
+    AsyncAgentEventHandler,
+    ListSortOrder,
+    MessageDeltaChunk,
+    MessageDeltaTextContent,
+    MessageRole,
+)
+from azure.core.credentials import AccessToken
 from azure.core.exceptions import ResourceNotFoundError, ServiceResponseTimeoutError
-from azure.identity import DefaultAzureCredential
+from azure.identity import (
+    AzureCliCredential,
+    ChainedTokenCredential,
+    DefaultAzureCredential,
+    EnvironmentCredential,
+    ManagedIdentityCredential,
+    WorkloadIdentityCredential,
+)
+
+from .db import run_db
+from .context_budget import (
+    ContextPlan,
+    get_role_budget,
+    plan_run,
+    recent_history_lengths,
+    record_plan,
+)
+from .resilience import wrap_agent_operations
+from .streaming import StreamEvent
+from .tool_runtime import get_tool_runtime
 
 logger = logging.getLogger(__name__)
 
@@ -24,6 +52,14 @@ logger = logging.getLogger(__name__)
 # ---------------------------------------------------------------------------
 _client: "AzureAgentClient | None" = None
 _client_lock = threading.Lock()
+_credential: "CachedCredential | None" = None
+_credential_lock = threading.Lock()
+
+# The aio client owns an aiohttp session bound to the loop it was created on,
+# so we keep one instance per running event loop.
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncAzureAgentClient]" = (
+    weakref.WeakKeyDictionary()
+)
 
 
 # ---------------------------------------------------------------------------
@@ -40,18 +76,409 @@ def _event_is(event_type, name: str) -> bool:
     return str(event_type) == name or getattr(event_type, 'value', None) == name
 
 
+def _unpack_stream_event(event_item):
+    """
+    Return (event_type, event_data) for a single stream item.
+
+    SDK event handlers yield (event_type, event_data, func_return) tuples,
+    while older builds exposed objects with .event/.data attributes.
+    """
+    if isinstance(event_item, tuple) and len(event_item) >= 2:
+        return event_item[0], event_item[1]
+    event_type = getattr(
+        event_item, "event",
+        getattr(event_item, "type", type(event_item).__name__)
+    )
+    return event_type, getattr(event_item, "data", event_item)
+
+
+def _extract_delta_text(block) -> str | None:
+    """Pull the text value out of a single message-delta content block."""
+    if hasattr(block, 'text') and hasattr(block.text, 'value'):
+        return block.text.value
+    if (
+        hasattr(block, 'type')
+        and getattr(block, 'type') == 'text'
+        and hasattr(block, 'text')
+    ):
+        return getattr(block.text, 'value', str(block.text))
+    if isinstance(block, dict):
+        text_obj = block.get('text', {})
+        return (
+            text_obj.get('value', '')
+            if isinstance(text_obj, dict)
+            else text_obj
+        ) or ''
+    logger.debug("Unknown block type in delta: %s", type(block))
+    return None
+
+
+# ---------------------------------------------------------------------------
+# Stream event dispatch
+# ---------------------------------------------------------------------------
+
+# The only event kinds process_stream acts on; everything else is skipped.
+EVENT_RUN_CREATED = "run_created"
+EVENT_MESSAGE_DELTA = "message_delta"
+EVENT_REQUIRES_ACTION = "requires_action"
+
+# Keyed on the wire event name. The SDK's StreamEventType members are str
+# enums that hash and compare like their value, so one lookup covers both.
+_EVENT_KINDS = {
+    "thread.run.created": EVENT_RUN_CREATED,
+    "thread.message.delta": EVENT_MESSAGE_DELTA,
+    "thread.run.requires_action": EVENT_REQUIRES_ACTION,
+}
+
+# Payload class-name fragments for builds that report unrecognised event types.
+_EVENT_KINDS_BY_CLASS_NAME = (
+    ("RunCreated", EVENT_RUN_CREATED),
+    ("MessageDelta", EVENT_MESSAGE_DELTA),
+    ("RequiresAction", EVENT_REQUIRES_ACTION),
+)
+
+# (event_type, payload class) -> kind for events missing from _EVENT_KINDS.
+_event_kind_cache: dict = {}
+
+
+def _event_kind(event_type, event_data) -> str | None:
+    """
+    Classify a stream event with a single dict lookup in the common case.
+
+    Anything else is resolved once with the legacy rules (enum ``.value``,
+    then payload class name) and memoised per (event_type, payload class).
+    """
+    try:
+        kind = _EVENT_KINDS.get(event_type)
+    except TypeError:  # unhashable event type
+        return _classify_event(event_type, event_data)
+    if kind is not None:
+        return kind
+
+    key = (event_type, type(event_data))
+    try:
+        return _event_kind_cache[key]
+    except KeyError:
+        kind = _event_kind_cache[key] = _classify_event(event_type, event_data)
+        return kind
+
+
+def _classify_event(event_type, event_data) -> str | None:
+    for name, kind in _EVENT_KINDS.items():
+        if _event_is(event_type, name):
+            return kind
+    class_name = type(event_data).__name__
+    for fragment, kind in _EVENT_KINDS_BY_CLASS_NAME:
+        if fragment in class_name:
+            return kind
+    return None
+
+
+def _delta_texts(event_data) -> list:
+    """
+    Return the non-empty text values carried by a message-delta event.
+
+    SDK models are mappings over their already-deserialised payload, and item
+    access skips the property descriptors that make attribute access slow, so
+    the usual MessageDeltaChunk / MessageDeltaTextContent shape is read that
+    way. Other payloads fall back to _extract_delta_text per block.
+    """
+    texts = []
+    if type(event_data) is MessageDeltaChunk:
+        blocks = event_data["delta"].get("content") or ()
+    else:
+        delta_obj = getattr(event_data, "delta", event_data)
+        blocks = getattr(delta_obj, "content", None) or ()
+
+    for block in blocks:
+        if type(block) is MessageDeltaTextContent:
+            text_obj = block.get("text")
+            text_val = text_obj.get("value") if text_obj is not None else None
+        else:
+            text_val = _extract_delta_text(block)
+        if text_val:
+            texts.append(text_val)
+    return texts
+
+
+# ---------------------------------------------------------------------------
+# Run polling / message retrieval helpers
+# ---------------------------------------------------------------------------
+
+# Short runs finish in well under a second, so polling starts fast and backs
+# off geometrically; long runs settle at one status check per second.
+RUN_POLL_INITIAL_DELAY = 0.1
+RUN_POLL_MAX_DELAY = 1.0
+RUN_POLL_BACKOFF = 1.5
+
+# How many recent messages to inspect when the run-scoped lookup is empty.
+LATEST_MESSAGE_FALLBACK_WINDOW = 5
+
+# Upper bound on the cancel_run call made for an abandoned stream.
+ABANDONED_RUN_CANCEL_TIMEOUT = 10
+
+# Instructions for the specialist picked up by a streamed handoff.
+STREAM_HANDOFF_INSTRUCTIONS = (
+    "You ARE talking to the user. "
+    "THEY ARE ALREADY LOGGED IN. "
+    "Do NOT greet the user, they have been "
+    "transferred to you. Continue smoothly."
+)
+
+
+def _poll_delays():
+    """Yield an exponentially growing, capped sequence of poll intervals."""
+    delay = RUN_POLL_INITIAL_DELAY
+    while True:
+        yield delay
+        delay = min(delay * RUN_POLL_BACKOFF, RUN_POLL_MAX_DELAY)
+
+
+def _consume_outcome(task: asyncio.Future) -> None:
+    """Done callback for abandoned tasks: mark any exception as retrieved."""
+    if not task.cancelled():
+        task.exception()
+
+
+def _newest_agent_text(page) -> str | None:
+    """Return the text of the first agent message in a newest-first message page."""
+    for msg in getattr(page, "data", None) or []:
+        if getattr(msg, "role", None) != MessageRole.AGENT:
+            continue
+        for block in getattr(msg, "content", None) or []:
+            text = getattr(getattr(block, "text", None), "value", None)
+            if text:
+                return text
+    return None
+
+
+# ---------------------------------------------------------------------------
+# Credentials
+# ---------------------------------------------------------------------------
+
+class CachedCredential:
+    """
+    TokenCredential wrapper that caches access tokens per scope.
+
+    Tokens are refreshed on a background timer ``refresh_margin`` seconds
+    before they expire, so requests only ever block on Entra ID when no
+    usable token exists yet. The underlying credential chain is configurable
+    (AZURE_CREDENTIAL_CHAIN) to skip DefaultAzureCredential's probe walk —
+    e.g. ``managed_identity`` alone on App Service. With AZURE_TOKEN_CACHE_PATH
+    set, tokens are persisted (mode 0600) and reloaded by the next worker.
+    """
+
+    # A cached token with less than this left is treated as missing.
+    MIN_VALIDITY_SECONDS = 60
+
+    def __init__(
+        self,
+        credential=None,
+        *,
+        chain: list[str] | None = None,
+        refresh_margin: float | None = None,
+        cache_path: str | None = None,
+    ) -> None:
+        self._credential = credential or self._build_credential(
+            chain if chain is not None else getattr(settings, 'AZURE_CREDENTIAL_CHAIN', ['default'])
+        )
+        self.refresh_margin = (
+            refresh_margin if refresh_margin is not None
+            else getattr(settings, 'AZURE_TOKEN_REFRESH_MARGIN_SECONDS', 300)
+        )
+        self.cache_path = cache_path if cache_path is not None else getattr(settings, 'AZURE_TOKEN_CACHE_PATH', '')
+
+        self._tokens: Dict[tuple, AccessToken] = {}
+        self._lock = threading.Lock()
+        self._fetch_locks: Dict[tuple, threading.Lock] = {}
+        self._timers: Dict[tuple, threading.Timer] = {}
+        self._load()
+
+    @staticmethod
+    def _build_credential(chain: list[str]):
+        managed_identity_client_id = getattr(settings, 'AZURE_AI_MANAGED_IDENTITY_CLIENT_ID', '') or None
+        factories = {
+            "managed_identity": lambda: ManagedIdentityCredential(client_id=managed_identity_client_id),
+            "workload_identity": WorkloadIdentityCredential,
+            "environment": EnvironmentCredential,
+            "cli": AzureCliCredential,
+            "default": lambda: DefaultAzureCredential(
+                exclude_environment_credential=True,
+                managed_identity_client_id=None,
+            ),
+        }
+        unknown = [name for name in chain if name not in factories]
+        if unknown or not chain:
+            raise ValueError(
+                f"Invalid AZURE_CREDENTIAL_CHAIN {chain!r}; choose from {', '.join(factories)}."
+            )
+        credentials = [factories[name]() for name in chain]
+        return credentials[0] if len(credentials) == 1 else ChainedTokenCredential(*credentials)
+
+    # ------------------------------------------------------------------
+    # Token access
+    # ------------------------------------------------------------------
+
+    def peek(self, *scopes: str) -> AccessToken | None:
+        """Return a cached token for *scopes* if it is still usable, without I/O."""
+        token = self._tokens.get(scopes)
+        if token and token.expires_on - time.time() > self.MIN_VALIDITY_SECONDS:
+            return token
+        return None
+
+    def get_token(self, *scopes: str, claims: str | None = None, tenant_id: str | None = None, **kwargs) -> AccessToken:
+        if claims or tenant_id:
+            # Claims challenges / cross-tenant requests must never be served from cache.
+            return self._credential.get_token(*scopes, claims=claims, tenant_id=tenant_id, **kwargs)
+
+        token = self.peek(*scopes)
+        if token is not None:
+            return token
+        return self._fetch(scopes, **kwargs)
+
+    def _fetch(self, scopes: tuple, force: bool = False, **kwargs) -> AccessToken:
+        with self._lock:
+            fetch_lock = self._fetch_locks.setdefault(scopes, threading.Lock())
+
+        with fetch_lock:
+            if not force:
+                token = self.peek(*scopes)
+                if token is not None:
+                    return token
+            token = self._credential.get_token(*scopes, **kwargs)
+            with self._lock:
+                self._tokens[scopes] = token
+            self._schedule_refresh(scopes, token)
+            self._persist()
+            return token
+
+    def _schedule_refresh(self, scopes: tuple, token: AccessToken) -> None:
+        delay = max(token.expires_on - time.time() - self.refresh_margin, 1)
+        timer = threading.Timer(delay, self._refresh_in_background, args=(scopes,))
+        timer.daemon = True
+        with self._lock:
+            previous = self._timers.pop(scopes, None)
+            self._timers[scopes] = timer
+        if previous is not None:
+            previous.cancel()
+        timer.start()
+
+    def _refresh_in_background(self, scopes: tuple) -> None:
+        try:
+            self._fetch(scopes, force=True)
+            logger.debug("Proactively refreshed Azure token for %s", scopes)
+        except Exception:
+            # The current token is still valid; the next get_token retries inline.
+            logger.exception("Background Azure token refresh failed for %s", scopes)
+
+    def prefetch(self, *scopes: str) -> None:
+        """Warm the cache for *scopes* on a background thread."""
+        threading.Thread(
+            target=self._refresh_in_background, args=(scopes,), name="token-prefetch", daemon=True
+        ).start()
+
+    def close(self) -> None:
+        with self._lock:
+            timers = list(self._timers.values())
+            self._timers.clear()
+        for timer in timers:
+            timer.cancel()
+        close = getattr(self._credential, "close", None)
+        if close is not None:
+            close()
+
+    # ------------------------------------------------------------------
+    # Disk persistence
+    # ------------------------------------------------------------------
+
+    def _load(self) -> None:
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path) as fh:
+                stored = json.load(fh)
+        except (OSError, ValueError):
+            logger.warning("Ignoring unreadable token cache at %s", self.cache_path)
+            return
+        for key, entry in stored.items():
+            scopes = tuple(key.split(" "))
+            token = AccessToken(entry["token"], int(entry["expires_on"]))
+            if token.expires_on - time.time() > self.MIN_VALIDITY_SECONDS:
+                self._tokens[scopes] = token
+                self._schedule_refresh(scopes, token)
+
+    def _persist(self) -> None:
+        if not self.cache_path:
+            return
+        with self._lock:
+            payload = {
+                " ".join(scopes): {"token": token.token, "expires_on": token.expires_on}
+                for scopes, token in self._tokens.items()
+            }
+        tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+        try:
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w") as fh:
+                json.dump(payload, fh)
+            os.replace(tmp_path, self.cache_path)
+        except OSError:
+            logger.exception("Failed to persist token cache to %s", self.cache_path)
+
+
+class AsyncCachedCredential:
+    """
+    AsyncTokenCredential view over a shared CachedCredential.
+
+    Cache hits are served on the event loop without I/O; only a cold or
+    expired scope is fetched on a worker thread.
+    """
+
+    def __init__(self, cached: CachedCredential) -> None:
+        self._cached = cached
+
+    async def get_token(self, *scopes: str, **kwargs) -> AccessToken:
+        if not kwargs.get("claims") and not kwargs.get("tenant_id"):
+            token = self._cached.peek(*scopes)
+            if token is not None:
+                return token
+        return await asyncio.to_thread(self._cached.get_token, *scopes, **kwargs)
+
+    async def close(self) -> None:
+        # The shared sync credential outlives any single aio client.
+        return None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+
+def get_credential() -> CachedCredential:
+    """Return the process-wide cached Azure credential."""
+    global _credential
+    if _credential is None:
+        with _credential_lock:
+            if _credential is None:
+                _credential = CachedCredential()
+    return _credential
+
+
 # ---------------------------------------------------------------------------
 # Azure Agent Client
 # ---------------------------------------------------------------------------
 
-class AzureAgentClient:
-    """Call Azure AI agents using the official SDK, supporting multiple roles."""
+class _AgentClientBase:
+    """Configuration and prompt helpers shared by the sync and async clients."""
 
     def __init__(self) -> None:
         endpoint = settings.AZURE_AI_ENDPOINT
+        self.use_fake_backend = getattr(settings, 'AZURE_AI_AGENT_BACKEND', 'azure') == 'fake'
 
         # Agent ID mapping (using a single agent for all roles for now)
         single_agent_id = os.getenv("AZURE_AI_INTAKE_AGENT_ID") or os.getenv("AZURE_AI_AGENT_ID")
+        if self.use_fake_backend:
+            single_agent_id = single_agent_id or "asst_fake"
         self.agents: Dict[str, str | None] = {
             "intake":       single_agent_id,
             "guardian":     single_agent_id,
@@ -61,30 +488,35 @@ class AzureAgentClient:
             "default":      single_agent_id,
         }
 
+        if self.use_fake_backend:
+            # Offline stand-in (triage.fake_agents): no endpoint or credentials needed.
+            self.conn_str = ""
+            return
+
         if not all([(endpoint or settings.AZURE_AI_PROJECT_CONNECTION_STRING), self.agents["intake"]]):
             raise ValueError(
                 "Missing Azure AI configuration. "
                 "Check AZURE_AI_ENDPOINT (or AZURE_AI_PROJECT_CONNECTION_STRING) and Agent IDs in .env"
             )
 
-        conn_str = self._build_connection_string(endpoint)
-
-        self.client = AIProjectClient.from_connection_string(
-            credential=DefaultAzureCredential(
-                exclude_environment_credential=True,
-                managed_identity_client_id=None,
-            ),
-            conn_str=conn_str,
-            connection_timeout=30,
-            # Increased from 90s — Azure AI Foundry in SA North needs more time
-            # on cold starts and long-running agent runs.
-            read_timeout=300,
-        )
+        self.conn_str = self._build_connection_string(endpoint)
 
     # ------------------------------------------------------------------
     # Helpers
     # ------------------------------------------------------------------
 
+    _is_async_client = False
+
+    @property
+    def agent_ops(self):
+        """``client.agents`` behind the per-operation circuit breakers."""
+        raw = self.client.agents
+        proxy = getattr(self, "_agent_ops", None)
+        if proxy is None or getattr(proxy, "wrapped", proxy) is not raw:
+            proxy = wrap_agent_operations(raw, is_async=self._is_async_client)
+            self._agent_ops = proxy
+        return proxy
+
     @staticmethod
     def _build_connection_string(endpoint: str) -> str:
         explicit_conn_str = settings.AZURE_AI_PROJECT_CONNECTION_STRING.strip()
@@ -116,36 +548,6 @@ class AzureAgentClient:
             host = host.split("/", 1)[0]
         return f"{host};{sub_id};{rg_name};{project_name}"
 
-    def create_thread(self) -> str:
-        """Create a new agent thread and return its ID."""
-        import random
-        for attempt in range(3):
-            try:
-                thread = self.client.agents.create_thread()
-                return thread.id
-            except ResourceNotFoundError as exc:
-                logger.error(
-                    "Azure AI project resource not found while creating thread. "
-                    "Check endpoint/connection string and project identifiers.",
-                    exc_info=exc,
-                )
-                raise RuntimeError(
-                    "Azure AI project not found. Verify AZURE_AI_PROJECT_CONNECTION_STRING "
-                    "or AZURE_AI_ENDPOINT + AZURE_SUBSCRIPTION_ID + "
-                    "AZURE_RESOURCE_GROUP + AZURE_AI_PROJECT_NAME."
-                ) from exc
-            except ServiceResponseTimeoutError as exc:
-                if attempt == 2:
-                    raise
-                base_sleep = 2 ** (attempt + 1)
-                jitter = random.uniform(-0.5, 0.5)
-                wait_time = base_sleep + jitter
-                logger.warning(
-                    "Timeout creating thread, retrying in %.1fs... (attempt %d/3)",
-                    wait_time, attempt + 1, exc_info=exc
-                )
-                time.sleep(wait_time)
-
     def get_agent_id(self, role: str = "intake") -> str | None:
         """Return the agent ID for *role*, falling back to 'default'."""
         return self.agents.get(role) or self.agents.get("default")
@@ -155,7 +557,9 @@ class AzureAgentClient:
     # ------------------------------------------------------------------
 
     @staticmethod
-    def _build_additional_instructions(role: str, user_data: dict | None) -> str | None:
+    def _build_additional_instructions(
+        role: str, user_data: dict | None, summary: str | None = None
+    ) -> str | None:
         if not user_data:
             return None
 
@@ -184,10 +588,9 @@ class AzureAgentClient:
                 "do not ask further questions and proceed with the assessment."
             )
 
-        rolling_summary = user_data.get("rolling_summary")
-        if rolling_summary:
+        if summary:
             instructions += (
-                f"\n\nCRITICAL CONTEXT (PREVIOUS SUMMARY):\n{rolling_summary}\n"
+                f"\n\nCRITICAL CONTEXT (PREVIOUS SUMMARY):\n{summary}\n"
                 "Use this summary to understand the patient's history so far, "
                 "as recent raw messages may be truncated."
             )
@@ -207,6 +610,35 @@ class AzureAgentClient:
 
         return f"[System Context: thread_id={thread_id}]\n{message}"
 
+    def _plan_context(
+        self, thread_id: str, role: str, context_message: str, user_data: dict | None
+    ) -> tuple[ContextPlan, str | None]:
+        """
+        Budget a run (truncation window, completion cap, summary length) and
+        build its additional instructions around the fitted summary.
+
+        Reads recent ChatMessage lengths, so async callers go through
+        db.run_db and other worker threads must release their connection.
+        """
+        budget = get_role_budget(role)
+        plan = plan_run(
+            role,
+            message=context_message,
+            instructions=self._build_additional_instructions(role, user_data),
+            summary=(user_data or {}).get("rolling_summary"),
+            history_lengths=recent_history_lengths(thread_id, budget.max_messages),
+            budget=budget,
+        )
+        record_plan(plan)
+        return plan, self._build_additional_instructions(role, user_data, summary=plan.summary)
+
+    @staticmethod
+    def _plan_handoff(role: str, instructions: str, message: str) -> ContextPlan:
+        """Budget the target agent's first run after a handoff."""
+        plan = plan_run(role, message=message, instructions=instructions)
+        record_plan(plan)
+        return plan
+
     # ------------------------------------------------------------------
     # Tool execution — async-safe
     # ------------------------------------------------------------------
@@ -220,12 +652,14 @@ class AzureAgentClient:
         async_to_sync() from within a running event loop (Uvicorn/ASGI)
         causes a deadlock because async_to_sync tries to reuse the same
         event loop that's already busy. Instead we await async tools
-        directly, and run any sync tools in a thread executor.
+        directly, and run any sync tools in a thread executor. Failures
+        raise; the tool runtime turns them into error outputs.
         """
         from mcp_server.server import (
             create_triage_record,
             handoff_to_agent,
             consult_agent,
+            consult_agents,
             get_doctor_availability,
         )
 
@@ -239,61 +673,113 @@ class AzureAgentClient:
             "create_triage_record": create_triage_record,
             "handoff_to_agent": handoff_to_agent,
             "consult_agent": consult_agent,
+            "consult_agents": consult_agents,
             "get_doctor_availability": get_doctor_availability,
         }
 
         tool_func = tool_map.get(func_name)
         if tool_func is None:
-            output = {"error": f"Unknown tool: {func_name}"}
+            raise ValueError(f"Unknown tool: {func_name}")
+        if inspect.iscoroutinefunction(tool_func):
+            # Async tool — await directly, no event loop conflict
+            output = await tool_func(**args)
         else:
-            try:
-                if inspect.iscoroutinefunction(tool_func):
-                    # Async tool — await directly, no event loop conflict
-                    output = await tool_func(**args)
-                else:
-                    # Sync tool — run in thread executor to avoid blocking
-                    loop = asyncio.get_running_loop()
-                    output = await loop.run_in_executor(None, lambda: tool_func(**args))
-            except Exception as exc:
-                logger.exception("Tool %s raised an exception", func_name)
-                output = {"error": str(exc)}
+            # Sync tool — run in thread executor to avoid blocking
+            loop = asyncio.get_running_loop()
+            output = await loop.run_in_executor(None, lambda: tool_func(**args))
 
         try:
             output_str = json.dumps(output)
         except Exception as exc:
-            output_str = json.dumps({"error": f"Unserializable output: {str(exc)}"})
+            raise ValueError(f"Unserializable output: {str(exc)}") from exc
 
         return {"tool_call_id": tool_call.id, "output": output_str}
 
-    @classmethod
-    async def _run_tools_async(cls, tool_calls) -> list:
-        """Run all tool calls concurrently via asyncio.gather."""
-        results = await asyncio.gather(
-            *[cls._execute_tool_async(tc) for tc in tool_calls],
-            return_exceptions=False,
+class AzureAgentClient(_AgentClientBase):
+    """Call Azure AI agents using the official SDK, supporting multiple roles."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        if self.use_fake_backend:
+            from .fake_agents import FakeProjectClient
+            self.client = FakeProjectClient()
+            return
+        self.client = AIProjectClient.from_connection_string(
+            credential=get_credential(),
+            conn_str=self.conn_str,
+            connection_timeout=30,
+            # Increased from 90s — Azure AI Foundry in SA North needs more time
+            # on cold starts and long-running agent runs.
+            read_timeout=300,
         )
-        return list(results)
+
+    def create_thread(self) -> str:
+        """Create a new agent thread and return its ID."""
+        import random
+        for attempt in range(3):
+            try:
+                thread = self.agent_ops.create_thread()
+                return thread.id
+            except ResourceNotFoundError as exc:
+                logger.error(
+                    "Azure AI project resource not found while creating thread. "
+                    "Check endpoint/connection string and project identifiers.",
+                    exc_info=exc,
+                )
+                raise RuntimeError(
+                    "Azure AI project not found. Verify AZURE_AI_PROJECT_CONNECTION_STRING "
+                    "or AZURE_AI_ENDPOINT + AZURE_SUBSCRIPTION_ID + "
+                    "AZURE_RESOURCE_GROUP + AZURE_AI_PROJECT_NAME."
+                ) from exc
+            except ServiceResponseTimeoutError as exc:
+                if attempt == 2:
+                    raise
+                base_sleep = 2 ** (attempt + 1)
+                jitter = random.uniform(-0.5, 0.5)
+                wait_time = base_sleep + jitter
+                logger.warning(
+                    "Timeout creating thread, retrying in %.1fs... (attempt %d/3)",
+                    wait_time, attempt + 1, exc_info=exc
+                )
+                time.sleep(wait_time)
+
+    def delete_thread(self, thread_id: str) -> None:
+        """Delete an agent thread (and its messages) on the service."""
+        self.agent_ops.delete_thread(thread_id=thread_id)
 
     def _run_tools_sync_from_generator(self, tool_calls) -> list:
         """
-        Called from the sync stream_generator. Runs async tools safely by
-        submitting them to a brand-new event loop in a dedicated thread.
+        Called from the sync stream_generator. Hands the batch to the
+        process-wide tool runtime loop and blocks until every tool has
+        finished or hit its own timeout.
 
-        This avoids the deadlock that occurs when async_to_sync() is called
-        from within a running Uvicorn event loop — it gets its own isolated
-        loop that has no conflict with the parent async context.
+        Running on that dedicated loop (rather than async_to_sync) avoids the
+        deadlock of re-entering an already-running Uvicorn event loop.
         """
-        def run_in_new_loop():
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            try:
-                return loop.run_until_complete(self._run_tools_async(tool_calls))
-            finally:
-                loop.close()
+        return get_tool_runtime().run_tool_calls(tool_calls, self._execute_tool_async)
+
+    def _fetch_latest_agent_text(self, thread_id: str, run_id: str | None = None) -> str | None:
+        """
+        Fetch only the newest agent message instead of listing the thread.
 
-        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
-            future = executor.submit(run_in_new_loop)
-            return future.result(timeout=60)
+        The run-scoped lookup asks for a single message (limit 1, newest
+        first); if the run produced none we peek at a small window of the
+        most recent thread messages.
+        """
+        if run_id:
+            page = self.agent_ops.list_messages(
+                thread_id=thread_id, run_id=run_id, limit=1, order=ListSortOrder.DESCENDING,
+            )
+            text = _newest_agent_text(page)
+            if text is not None:
+                return text
+
+        page = self.agent_ops.list_messages(
+            thread_id=thread_id,
+            limit=LATEST_MESSAGE_FALLBACK_WINDOW,
+            order=ListSortOrder.DESCENDING,
+        )
+        return _newest_agent_text(page)
 
     # ------------------------------------------------------------------
     # Non-streaming send
@@ -308,29 +794,30 @@ class AzureAgentClient:
     ) -> Dict[str, Any]:
         """Send a message to a specific agent and return its response."""
         agent_id = self.get_agent_id(role)
-        additional_instructions = self._build_additional_instructions(role, user_data)
         context_message = self._build_context_message(thread_id, message, user_data)
+        plan, additional_instructions = self._plan_context(thread_id, role, context_message, user_data)
 
         logger.info("send_message: thread_id=%s, role=%s, agent_id=%s", thread_id, role, agent_id)
 
-        self.client.agents.create_message(
+        self.agent_ops.create_message(
             thread_id=thread_id,
             role="user",
             content=context_message,
         )
 
-        run = self.client.agents.create_run(
+        run = self.agent_ops.create_run(
             thread_id=thread_id,
             agent_id=agent_id,
             additional_instructions=additional_instructions,
-            max_completion_tokens=10000,
-            truncation_strategy={"type": "last_messages", "last_messages": 10},
+            max_completion_tokens=plan.max_completion_tokens,
+            truncation_strategy=plan.truncation_strategy,
         )
         logger.info("send_message: Run created: run_id=%s, status=%s", run.id, run.status)
 
         start_time = time.time()
         POLL_TIMEOUT = 120
         poll_count = 0
+        poll_delays = _poll_delays()
 
         while True:
             poll_count += 1
@@ -340,7 +827,7 @@ class AzureAgentClient:
                         "Cancelling stalled run after %ds. run_id=%s status=%s",
                         POLL_TIMEOUT, run.id, run.status,
                     )
-                    self.client.agents.cancel_run(thread_id=thread_id, run_id=run.id)
+                    self.agent_ops.cancel_run(thread_id=thread_id, run_id=run.id)
                     return {
                         "content": (
                             "I am experiencing delays connecting to the triage systems. "
@@ -349,12 +836,13 @@ class AzureAgentClient:
                         "run_status": "error",
                         "agent_role": role,
                     }
-                time.sleep(0.5)
-                run = self.client.agents.get_run(thread_id=thread_id, run_id=run.id)
+                time.sleep(next(poll_delays))
+                run = self.agent_ops.get_run(thread_id=thread_id, run_id=run.id)
                 logger.debug("send_message: Poll #%d - status=%s", poll_count, run.status)
 
             elif run.status == "requires_action":
                 start_time = time.time()
+                poll_delays = _poll_delays()
                 logger.info("send_message: Run requires_action - processing tools")
 
                 if not (
@@ -374,7 +862,7 @@ class AzureAgentClient:
                     logger.warning("send_message: No tool outputs generated")
                     break
 
-                run = self.client.agents.submit_tool_outputs_to_run(
+                run = self.agent_ops.submit_tool_outputs_to_run(
                     thread_id=thread_id,
                     run_id=run.id,
                     tool_outputs=tool_outputs,
@@ -393,75 +881,53 @@ class AzureAgentClient:
 
                 if handoff_target:
                     handoff_start = time.time()
+                    handoff_delays = _poll_delays()
                     while run.status in ("queued", "in_progress"):
                         if time.time() - handoff_start > POLL_TIMEOUT:
                             break
-                        time.sleep(0.5)
-                        run = self.client.agents.get_run(thread_id=thread_id, run_id=run.id)
+                        time.sleep(next(handoff_delays))
+                        run = self.agent_ops.get_run(thread_id=thread_id, run_id=run.id)
 
                     new_agent_id = self.get_agent_id(handoff_target)
-                    self.client.agents.create_message(
+                    handoff_message = (
+                        f"[System Context: User was successfully transferred to "
+                        f"{handoff_target}. Please introduce yourself and continue.]"
+                    )
+                    handoff_instructions = (
+                        "You ARE talking to the user. THEY ARE ALREADY LOGGED IN. "
+                        "Do NOT greet the user, they have been transferred to you. "
+                        "Continue the triage process smoothly."
+                    )
+                    handoff_plan = self._plan_handoff(handoff_target, handoff_instructions, handoff_message)
+                    self.agent_ops.create_message(
                         thread_id=thread_id,
                         role="user",
-                        content=(
-                            f"[System Context: User was successfully transferred to "
-                            f"{handoff_target}. Please introduce yourself and continue.]"
-                        ),
+                        content=handoff_message,
                     )
-                    run = self.client.agents.create_run(
+                    run = self.agent_ops.create_run(
                         thread_id=thread_id,
                         agent_id=new_agent_id,
-                        additional_instructions=(
-                            "You ARE talking to the user. THEY ARE ALREADY LOGGED IN. "
-                            "Do NOT greet the user, they have been transferred to you. "
-                            "Continue the triage process smoothly."
-                        ),
-                        max_completion_tokens=10000,
-                        truncation_strategy={"type": "last_messages", "last_messages": 10},
+                        additional_instructions=handoff_instructions,
+                        max_completion_tokens=handoff_plan.max_completion_tokens,
+                        truncation_strategy=handoff_plan.truncation_strategy,
                     )
                     logger.info("send_message: Handoff run created: run_id=%s", run.id)
                     role = handoff_target
                     start_time = time.time()
+                    poll_delays = _poll_delays()
 
             else:
                 break
 
         # Retrieve the latest assistant message
         try:
-            messages = self.client.agents.list_messages(thread_id=thread_id)
-            text_content = messages.get_last_text_message_by_role(MessageRole.AGENT)
-
-            if text_content is None:
-                logger.warning(
-                    "No text message found for agent in thread %s. Attempting fallback...",
-                    thread_id
+            content = self._fetch_latest_agent_text(thread_id, run_id=run.id)
+            if not content:
+                logger.error(
+                    "Unable to extract any message content from thread %s. run_status=%s",
+                    thread_id, run.status
                 )
-                all_messages = list(messages)
-                content = ""
-                if all_messages:
-                    for msg in reversed(all_messages):
-                        if hasattr(msg, 'content') and msg.content:
-                            for block in msg.content:
-                                if hasattr(block, 'text') and hasattr(block.text, 'value'):
-                                    content = block.text.value
-                                    break
-                        if content:
-                            break
-                if not content:
-                    logger.error(
-                        "Unable to extract any message content from thread %s. run_status=%s",
-                        thread_id, run.status
-                    )
-                    content = "I apologize, but I was unable to generate a response."
-            else:
-                if hasattr(text_content, 'text') and hasattr(text_content.text, 'value'):
-                    content = text_content.text.value
-                else:
-                    logger.warning(
-                        "text_content found but structure unexpected for thread %s. type=%s",
-                        thread_id, type(text_content)
-                    )
-                    content = "I apologize, but I was unable to generate a response."
+                content = "I apologize, but I was unable to generate a response."
 
         except Exception as exc:
             logger.exception("Error retrieving agent message from thread %s", thread_id)
@@ -492,11 +958,11 @@ class AzureAgentClient:
     ) -> Generator:
         """Stream a message to a specific agent and yield SSE-style JSON chunks."""
         agent_id = self.get_agent_id(role)
-        additional_instructions = self._build_additional_instructions(role, user_data)
         context_message = self._build_context_message(thread_id, message, user_data)
+        plan, additional_instructions = self._plan_context(thread_id, role, context_message, user_data)
 
         try:
-            self.client.agents.create_message(
+            self.agent_ops.create_message(
                 thread_id=thread_id,
                 role="user",
                 content=context_message,
@@ -509,13 +975,10 @@ class AzureAgentClient:
                     "Timeout adding message to thread %s (cold-start?): %s", thread_id, exc
                 )
                 def _timeout_gen():
-                    yield json.dumps({
-                        "type": "error",
-                        "content": (
-                            "The AI service took too long to respond. "
-                            "Please wait a moment and try again."
-                        ),
-                    }) + "\n\n"
+                    yield StreamEvent.error(
+                        "The AI service took too long to respond. "
+                        "Please wait a moment and try again."
+                    )
                 return _timeout_gen()
 
             elif isinstance(exc, ResourceNotFoundError):
@@ -526,29 +989,24 @@ class AzureAgentClient:
                 )
 
                 def _resource_not_found_gen():
-                    yield json.dumps({
-                        "type": "error",
-                        "content": (
-                            "Azure AI project was not found. Please check service configuration "
-                            "(endpoint/connection string, subscription, resource group, and project name)."
-                        ),
-                    }) + "\n\n"
+                    yield StreamEvent.error(
+                        "Azure AI project was not found. Please check service configuration "
+                        "(endpoint/connection string, subscription, resource group, and project name)."
+                    )
 
                 return _resource_not_found_gen()
 
             elif isinstance(exc, SuspiciousOperation):
                 logger.error("Disallowed host blocked during stream setup: %s", exc)
                 def _host_error_gen():
-                    yield json.dumps({
-                        "type": "error",
-                        "content": "Request blocked: disallowed host.",
-                    }) + "\n\n"
+                    yield StreamEvent.error("Request blocked: disallowed host.")
                 return _host_error_gen()
 
             else:
                 raise
 
         def stream_generator():
+            active_run_id = None
             try:
                 streamed_text_parts = []
 
@@ -562,12 +1020,13 @@ class AzureAgentClient:
                       2 -> handoff agent stream
                       3 -> safety cap (return immediately)
 
-                    FIX: All event type comparisons now use _event_is() which handles
-                    both plain string event types AND SDK enum values (e.g.
-                    StreamEventType.THREAD_MESSAGE_DELTA). Previously, string equality
-                    checks silently failed against enum values, causing zero chunks to
-                    be yielded even though the stream was running correctly.
+                    Events are classified by _event_kind(), which accepts both plain
+                    string event types AND SDK enum values (e.g.
+                    StreamEventType.THREAD_MESSAGE_DELTA). Plain string equality
+                    checks used to fail silently against enum values, causing zero
+                    chunks to be yielded even though the stream was running correctly.
                     """
+                    nonlocal active_run_id
                     if depth > 3:
                         return
 
@@ -575,54 +1034,21 @@ class AzureAgentClient:
                     tool_calls_seen = []
 
                     for event_item in current_stream:
-                        event_type = getattr(
-                            event_item, "event",
-                            getattr(event_item, "type", type(event_item).__name__)
-                        )
-                        event_data = getattr(event_item, "data", event_item)
-
-                        if (
-                            _event_is(event_type, "thread.run.created")
-                            or "RunCreated" in type(event_data).__name__
-                        ):
-                            run_id = getattr(event_data, "id", None)
-
-                        elif (
-                            _event_is(event_type, "thread.message.delta")
-                            or "MessageDelta" in type(event_data).__name__
-                        ):
-                            delta_obj = getattr(event_data, "delta", event_data)
-                            for block in getattr(delta_obj, "content", []):
-                                text_val = None
-
-                                if hasattr(block, 'text') and hasattr(block.text, 'value'):
-                                    text_val = block.text.value
-                                elif (
-                                    hasattr(block, 'type')
-                                    and getattr(block, 'type') == 'text'
-                                    and hasattr(block, 'text')
-                                ):
-                                    text_val = getattr(block.text, 'value', str(block.text))
-                                elif isinstance(block, dict):
-                                    text_obj = block.get('text', {})
-                                    text_val = (
-                                        text_obj.get('value', '')
-                                        if isinstance(text_obj, dict)
-                                        else text_obj
-                                    ) or ''
-                                else:
-                                    logger.debug("Unknown block type in delta: %s", type(block))
-
-                                if text_val:
-                                    streamed_text_parts.append(text_val)
-                                    yield json.dumps({"type": "chunk", "content": text_val}) + "\n\n"
-
-                        elif (
-                            _event_is(event_type, "thread.run.requires_action")
-                            or "RequiresAction" in type(event_data).__name__
-                        ):
+                        event_type, event_data = _unpack_stream_event(event_item)
+                        kind = _event_kind(event_type, event_data)
+
+                        # Deltas dominate long answers, so they are tested first.
+                        if kind is EVENT_MESSAGE_DELTA:
+                            for text_val in _delta_texts(event_data):
+                                streamed_text_parts.append(text_val)
+                                yield StreamEvent.chunk(text_val)
+
+                        elif kind is EVENT_RUN_CREATED:
+                            run_id = active_run_id = getattr(event_data, "id", None)
+
+                        elif kind is EVENT_REQUIRES_ACTION:
                             if hasattr(event_data, "id"):
-                                run_id = event_data.id
+                                run_id = active_run_id = event_data.id
                             if (
                                 hasattr(event_data, "required_action")
                                 and hasattr(event_data.required_action, "submit_tool_outputs")
@@ -633,18 +1059,22 @@ class AzureAgentClient:
 
                     # ---- Post-stream: execute tools ----
                     if tool_calls_seen and run_id:
-                        # FIX: Use _run_tools_sync_from_generator which spins up a fresh
-                        # event loop in a dedicated thread. This avoids the deadlock caused
+                        # FIX: Use _run_tools_sync_from_generator which runs tools on the
+                        # dedicated tool-runtime loop. This avoids the deadlock caused
                         # by async_to_sync() trying to reuse the already-running Uvicorn loop.
                         tool_outputs = self._run_tools_sync_from_generator(tool_calls_seen)
 
                         if tool_outputs:
-                            with self.client.agents.submit_tool_outputs_to_stream(
+                            # The SDK feeds the resumed run into the handler it is given
+                            # and returns None, so iterate the handler itself.
+                            resubmit_handler = AgentEventHandler()
+                            self.agent_ops.submit_tool_outputs_to_stream(
                                 thread_id=thread_id,
                                 run_id=run_id,
                                 tool_outputs=tool_outputs,
-                            ) as resubmit_stream:
-                                yield from process_stream(resubmit_stream, depth=depth + 1)
+                                event_handler=resubmit_handler,
+                            )
+                            yield from process_stream(resubmit_handler, depth=depth + 1)
 
                         # ---- Handoff (only at depth 0 to avoid double-trigger) ----
                         if depth == 0:
@@ -656,36 +1086,29 @@ class AzureAgentClient:
                                         if target_role:
                                             new_agent_id = self.get_agent_id(target_role)
                                             if new_agent_id:
-                                                yield json.dumps({
-                                                    "type": "chunk",
-                                                    "content": (
-                                                        f"\n\n*[Transferring you to the "
-                                                        f"{target_role} specialist...]*\n\n"
-                                                    ),
-                                                }) + "\n\n"
-
-                                                self.client.agents.create_message(
+                                                yield StreamEvent.chunk(
+                                                    f"\n\n*[Transferring you to the "
+                                                    f"{target_role} specialist...]*\n\n"
+                                                )
+
+                                                handoff_message = (
+                                                    f"[System: User transferred to {target_role}. "
+                                                    "Introduce yourself and continue.]"
+                                                )
+                                                handoff_plan = self._plan_handoff(
+                                                    target_role, STREAM_HANDOFF_INSTRUCTIONS, handoff_message
+                                                )
+                                                self.agent_ops.create_message(
                                                     thread_id=thread_id,
                                                     role="user",
-                                                    content=(
-                                                        f"[System: User transferred to {target_role}. "
-                                                        "Introduce yourself and continue.]"
-                                                    ),
+                                                    content=handoff_message,
                                                 )
-                                                with self.client.agents.create_stream(
+                                                with self.agent_ops.create_stream(
                                                     thread_id=thread_id,
                                                     agent_id=new_agent_id,
-                                                    additional_instructions=(
-                                                        "You ARE talking to the user. "
-                                                        "THEY ARE ALREADY LOGGED IN. "
-                                                        "Do NOT greet the user, they have been "
-                                                        "transferred to you. Continue smoothly."
-                                                    ),
-                                                    max_completion_tokens=10000,
-                                                    truncation_strategy={
-                                                        "type": "last_messages",
-                                                        "last_messages": 10,
-                                                    },
+                                                    additional_instructions=STREAM_HANDOFF_INSTRUCTIONS,
+                                                    max_completion_tokens=handoff_plan.max_completion_tokens,
+                                                    truncation_strategy=handoff_plan.truncation_strategy,
                                                 ) as handoff_stream:
                                                     yield from process_stream(
                                                         handoff_stream, depth=depth + 1
@@ -694,14 +1117,20 @@ class AzureAgentClient:
                                         logger.warning("Handoff parse error: %s", exc)
                                     break  # Only handle the first handoff per run
 
-                with self.client.agents.create_stream(
+                with self.agent_ops.create_stream(
                     thread_id=thread_id,
                     agent_id=agent_id,
                     additional_instructions=additional_instructions,
-                    max_completion_tokens=10000,
-                    truncation_strategy={"type": "last_messages", "last_messages": 10},
+                    max_completion_tokens=plan.max_completion_tokens,
+                    truncation_strategy=plan.truncation_strategy,
                 ) as initial_stream:
-                    yield from process_stream(initial_stream, depth=0)
+                    try:
+                        yield from process_stream(initial_stream, depth=0)
+                    except GeneratorExit:
+                        # Closed early: the client went away (see
+                        # iterate_in_thread). Cancel before the stream closes.
+                        self._cancel_abandoned_run(thread_id, active_run_id)
+                        raise
 
                 if not ''.join(streamed_text_parts).strip():
                     logger.warning(
@@ -710,10 +1139,7 @@ class AzureAgentClient:
                     )
                     fallback_text = ""
                     try:
-                        messages = self.client.agents.list_messages(thread_id=thread_id)
-                        text_content = messages.get_last_text_message_by_role(MessageRole.AGENT)
-                        if text_content and hasattr(text_content, 'text') and hasattr(text_content.text, 'value'):
-                            fallback_text = text_content.text.value or ""
+                        fallback_text = self._fetch_latest_agent_text(thread_id) or ""
                     except Exception:
                         logger.exception("Failed to fetch fallback agent text for thread %s", thread_id)
 
@@ -721,22 +1147,330 @@ class AzureAgentClient:
                         "I apologize, but I was unable to generate a response. Please try again."
                     )
                     streamed_text_parts.append(final_fallback)
-                    yield json.dumps({"type": "chunk", "content": final_fallback}) + "\n\n"
+                    yield StreamEvent.chunk(final_fallback)
 
                 # Emit done exactly once after everything finishes
-                yield json.dumps({"type": "done", "run_status": "completed"}) + "\n\n"
+                active_run_id = None
+                yield StreamEvent.done("completed")
 
             except SuspiciousOperation as exc:
                 logger.error("Disallowed host in stream: %s", exc)
-                yield json.dumps({
-                    "type": "error", "content": "Request blocked: disallowed host."
-                }) + "\n\n"
+                yield StreamEvent.error("Request blocked: disallowed host.")
             except Exception as exc:
                 logger.exception("Failed to execute stream for thread %s", thread_id)
-                yield json.dumps({"type": "error", "content": str(exc)}) + "\n\n"
+                yield StreamEvent.error(exc)
 
         return stream_generator()
 
+    def _cancel_abandoned_run(self, thread_id: str, run_id: str | None) -> None:
+        """Best-effort cancel_run for a run nobody is reading any more."""
+        if not run_id:
+            return
+        try:
+            self.agent_ops.cancel_run(thread_id=thread_id, run_id=run_id)
+            logger.info("Cancelled abandoned run %s on thread %s", run_id, thread_id)
+        except Exception as exc:
+            # Usually the run already finished between the last event and now.
+            logger.debug("cancel_run(%s) on thread %s failed: %s", run_id, thread_id, exc)
+
+
+# ---------------------------------------------------------------------------
+# Async Azure Agent Client
+# ---------------------------------------------------------------------------
+
+class AsyncAzureAgentClient(_AgentClientBase):
+    """
+    Native asyncio counterpart of AzureAgentClient built on the SDK's aio client.
+
+    The ASGI streaming view iterates agent deltas with ``async for`` on the
+    event loop itself, so an open conversation no longer pins an executor
+    thread for the lifetime of the reply. Tool calls are awaited directly
+    on the running loop for the same reason.
+    """
+
+    _is_async_client = True
+
+    def __init__(self) -> None:
+        super().__init__()
+        if self.use_fake_backend:
+            from .fake_agents import FakeAsyncProjectClient
+            self.credential = None
+            self.client = FakeAsyncProjectClient()
+            return
+        self.credential = AsyncCachedCredential(get_credential())
+        self.client = AsyncAIProjectClient.from_connection_string(
+            credential=self.credential,
+            conn_str=self.conn_str,
+            connection_timeout=30,
+            read_timeout=300,
+        )
+
+    async def close(self) -> None:
+        await self.client.close()
+        if self.credential is not None:
+            await self.credential.close()
+
+    async def async_create_thread(self) -> str:
+        """Create a new agent thread and return its ID."""
+        import random
+        for attempt in range(3):
+            try:
+                thread = await self.agent_ops.create_thread()
+                return thread.id
+            except ResourceNotFoundError as exc:
+                logger.error(
+                    "Azure AI project resource not found while creating thread. "
+                    "Check endpoint/connection string and project identifiers.",
+                    exc_info=exc,
+                )
+                raise RuntimeError(
+                    "Azure AI project not found. Verify AZURE_AI_PROJECT_CONNECTION_STRING "
+                    "or AZURE_AI_ENDPOINT + AZURE_SUBSCRIPTION_ID + "
+                    "AZURE_RESOURCE_GROUP + AZURE_AI_PROJECT_NAME."
+                ) from exc
+            except ServiceResponseTimeoutError as exc:
+                if attempt == 2:
+                    raise
+                wait_time = 2 ** (attempt + 1) + random.uniform(-0.5, 0.5)
+                logger.warning(
+                    "Timeout creating thread, retrying in %.1fs... (attempt %d/3)",
+                    wait_time, attempt + 1, exc_info=exc
+                )
+                await asyncio.sleep(wait_time)
+
+    @staticmethod
+    async def _single_event(event: StreamEvent) -> AsyncGenerator:
+        yield event
+
+    async def async_send_message_stream(
+        self,
+        thread_id: str,
+        message: str,
+        role: str = "intake",
+        user_data: dict | None = None,
+    ) -> AsyncGenerator:
+        """
+        Post the user message, then return an async generator of SSE-style
+        JSON chunks for the agent run.
+
+        The message is created eagerly (before the generator is returned) so
+        that thread-lifecycle errors surface to the caller exactly as they do
+        for the sync ``send_message_stream``.
+        """
+        agent_id = self.get_agent_id(role)
+        context_message = self._build_context_message(thread_id, message, user_data)
+        # Budgeting only reads earlier history, so it runs alongside the
+        # create_message round trip instead of ahead of it.
+        planning = asyncio.ensure_future(run_db(
+            self._plan_context, thread_id, role, context_message, user_data
+        ))
+
+        try:
+            await self.agent_ops.create_message(
+                thread_id=thread_id,
+                role="user",
+                content=context_message,
+            )
+        except BaseException as exc:
+            # No run will use the plan: stop waiting on it, and retrieve any
+            # error it already hit so it is not reported as never retrieved.
+            planning.cancel()
+            planning.add_done_callback(_consume_outcome)
+            if not isinstance(exc, Exception):
+                raise
+            exc_str = str(exc).lower()
+            if "timeout" in exc_str or "timed out" in exc_str:
+                logger.warning(
+                    "Timeout adding message to thread %s (cold-start?): %s", thread_id, exc
+                )
+                return self._single_event(StreamEvent.error(
+                    "The AI service took too long to respond. "
+                    "Please wait a moment and try again."
+                ))
+            elif isinstance(exc, ResourceNotFoundError):
+                logger.error(
+                    "Azure AI resource not found during create_message on thread %s",
+                    thread_id,
+                    exc_info=exc,
+                )
+                return self._single_event(StreamEvent.error(
+                    "Azure AI project was not found. Please check service configuration "
+                    "(endpoint/connection string, subscription, resource group, and project name)."
+                ))
+            elif isinstance(exc, SuspiciousOperation):
+                logger.error("Disallowed host blocked during stream setup: %s", exc)
+                return self._single_event(StreamEvent.error("Request blocked: disallowed host."))
+            else:
+                raise
+
+        plan, additional_instructions = await planning
+        return self._stream_run(thread_id, agent_id, additional_instructions, plan)
+
+    async def _stream_run(
+        self, thread_id: str, agent_id: str, additional_instructions, plan: ContextPlan
+    ) -> AsyncGenerator:
+        streamed_text_parts = []
+        active_run_id = None
+
+        async def process_stream(current_stream, depth: int = 0):
+            """
+            Async mirror of the sync process_stream: same depth cap, tool
+            execution and first-handoff-only semantics.
+            """
+            nonlocal active_run_id
+            if depth > 3:
+                return
+
+            run_id = None
+            tool_calls_seen = []
+
+            async for event_item in current_stream:
+                event_type, event_data = _unpack_stream_event(event_item)
+                kind = _event_kind(event_type, event_data)
+
+                # Deltas dominate long answers, so they are tested first.
+                if kind is EVENT_MESSAGE_DELTA:
+                    for text_val in _delta_texts(event_data):
+                        streamed_text_parts.append(text_val)
+                        yield StreamEvent.chunk(text_val)
+
+                elif kind is EVENT_RUN_CREATED:
+                    run_id = active_run_id = getattr(event_data, "id", None)
+
+                elif kind is EVENT_REQUIRES_ACTION:
+                    if hasattr(event_data, "id"):
+                        run_id = active_run_id = event_data.id
+                    if (
+                        hasattr(event_data, "required_action")
+                        and hasattr(event_data.required_action, "submit_tool_outputs")
+                    ):
+                        tool_calls_seen = list(
+                            event_data.required_action.submit_tool_outputs.tool_calls
+                        )
+
+            if not (tool_calls_seen and run_id):
+                return
+
+            # Tools run on the shared runtime loop so per-tool timeouts,
+            # concurrency caps and metrics apply to both client flavours.
+            tool_outputs = await get_tool_runtime().arun_tool_calls(
+                tool_calls_seen, self._execute_tool_async
+            )
+
+            if tool_outputs:
+                resubmit_handler = AsyncAgentEventHandler()
+                await self.agent_ops.submit_tool_outputs_to_stream(
+                    thread_id=thread_id,
+                    run_id=run_id,
+                    tool_outputs=tool_outputs,
+                    event_handler=resubmit_handler,
+                )
+                async for chunk in process_stream(resubmit_handler, depth=depth + 1):
+                    yield chunk
+
+            if depth != 0:
+                return
+
+            for tc in tool_calls_seen:
+                if tc.function.name != "handoff_to_agent":
+                    continue
+                try:
+                    target_role = json.loads(tc.function.arguments).get("target_role")
+                    new_agent_id = self.get_agent_id(target_role) if target_role else None
+                    if new_agent_id:
+                        yield StreamEvent.chunk(
+                            f"\n\n*[Transferring you to the "
+                            f"{target_role} specialist...]*\n\n"
+                        )
+
+                        handoff_message = (
+                            f"[System: User transferred to {target_role}. "
+                            "Introduce yourself and continue.]"
+                        )
+                        handoff_plan = self._plan_handoff(
+                            target_role, STREAM_HANDOFF_INSTRUCTIONS, handoff_message
+                        )
+                        await self.agent_ops.create_message(
+                            thread_id=thread_id,
+                            role="user",
+                            content=handoff_message,
+                        )
+                        async with await self.agent_ops.create_stream(
+                            thread_id=thread_id,
+                            agent_id=new_agent_id,
+                            additional_instructions=STREAM_HANDOFF_INSTRUCTIONS,
+                            max_completion_tokens=handoff_plan.max_completion_tokens,
+                            truncation_strategy=handoff_plan.truncation_strategy,
+                        ) as handoff_stream:
+                            async for chunk in process_stream(handoff_stream, depth=depth + 1):
+                                yield chunk
+                except (json.JSONDecodeError, KeyError) as exc:
+                    logger.warning("Handoff parse error: %s", exc)
+                break  # Only handle the first handoff per run
+
+        try:
+            async with await self.agent_ops.create_stream(
+                thread_id=thread_id,
+                agent_id=agent_id,
+                additional_instructions=additional_instructions,
+                max_completion_tokens=plan.max_completion_tokens,
+                truncation_strategy=plan.truncation_strategy,
+            ) as initial_stream:
+                try:
+                    async for chunk in process_stream(initial_stream, depth=0):
+                        yield chunk
+                except (asyncio.CancelledError, GeneratorExit):
+                    # Abandoned (the run coordinator gave up waiting for a
+                    # client): cancel the run before its stream is closed.
+                    await self._cancel_abandoned_run(thread_id, active_run_id)
+                    raise
+
+            if not ''.join(streamed_text_parts).strip():
+                logger.warning(
+                    "Stream completed without text deltas. Falling back to last agent message. thread=%s",
+                    thread_id,
+                )
+                fallback_text = ""
+                try:
+                    page = await self.agent_ops.list_messages(
+                        thread_id=thread_id,
+                        limit=LATEST_MESSAGE_FALLBACK_WINDOW,
+                        order=ListSortOrder.DESCENDING,
+                    )
+                    fallback_text = _newest_agent_text(page) or ""
+                except Exception:
+                    logger.exception("Failed to fetch fallback agent text for thread %s", thread_id)
+
+                final_fallback = fallback_text.strip() or (
+                    "I apologize, but I was unable to generate a response. Please try again."
+                )
+                streamed_text_parts.append(final_fallback)
+                yield StreamEvent.chunk(final_fallback)
+
+            active_run_id = None
+            yield StreamEvent.done("completed")
+
+        except SuspiciousOperation as exc:
+            logger.error("Disallowed host in stream: %s", exc)
+            yield StreamEvent.error("Request blocked: disallowed host.")
+        except Exception as exc:
+            logger.exception("Failed to execute async stream for thread %s", thread_id)
+            yield StreamEvent.error(exc)
+
+    async def _cancel_abandoned_run(self, thread_id: str, run_id: str | None) -> None:
+        """Best-effort cancel_run for a run nobody is reading any more."""
+        if not run_id:
+            return
+        try:
+            await asyncio.wait_for(
+                self.agent_ops.cancel_run(thread_id=thread_id, run_id=run_id),
+                timeout=ABANDONED_RUN_CANCEL_TIMEOUT,
+            )
+            logger.info("Cancelled abandoned run %s on thread %s", run_id, thread_id)
+        except Exception as exc:
+            # Usually the run already finished between the last event and now.
+            logger.debug("cancel_run(%s) on thread %s failed: %s", run_id, thread_id, exc)
+
 
 # ---------------------------------------------------------------------------
 # Module-level API (thread-safe singleton)
@@ -760,6 +1494,11 @@ def create_thread() -> str:
         raise
 
 
+def delete_thread(thread_id: str) -> None:
+    """Delete an agent thread that will never be used."""
+    get_project_client().delete_thread(thread_id)
+
+
 def send_message(
     thread_id: str,
     message: str,
@@ -779,4 +1518,35 @@ def send_message_stream(
     """Send a message via the streaming API and return a generator of SSE chunks."""
     return get_project_client().send_message_stream(
         thread_id, message, role=role, user_data=user_data
-    )
\ No newline at end of file
+    )
+
+
+def get_async_project_client() -> AsyncAzureAgentClient:
+    """Return the aio client bound to the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = AsyncAzureAgentClient()
+        _async_clients[loop] = client
+    return client
+
+
+async def async_create_thread() -> str:
+    """Create a new agent thread without leaving the event loop."""
+    try:
+        return await get_async_project_client().async_create_thread()
+    except Exception:
+        logger.exception("Failed to create Azure AI thread")
+        raise
+
+
+async def async_send_message_stream(
+    thread_id: str,
+    message: str,
+    role: str = "intake",
+    user_data: dict | None = None,
+) -> AsyncGenerator:
+    """Post a message and return an async generator of SSE chunks."""
+    return await get_async_project_client().async_send_message_stream(
+        thread_id, message, role=role, user_data=user_data
+    )
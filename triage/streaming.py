@@ -0,0 +1,377 @@
+import asyncio
+import json
+import logging
+import re
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from typing import AsyncGenerator, Iterable
+
+from django.conf import settings
+
+try:
+    import orjson
+except ImportError:  # optional: the stdlib encoder is used instead
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+
+# ---------------------------------------------------------------------------
+# Sync -> async generator bridge
+# ---------------------------------------------------------------------------
+
+_ITEM = 0
+_ERROR = 1
+_DONE = 2
+
+# How often a producer blocked on backpressure re-checks for cancellation.
+_BACKPRESSURE_POLL_SECONDS = 0.25
+
+
+async def iterate_in_thread(
+    sync_iterable: Iterable,
+    *,
+    max_pending: int | None = None,
+    executor=None,
+) -> AsyncGenerator:
+    """
+    Drive a blocking iterator on a worker thread and yield its items on the loop.
+
+    The producer hands each item to the loop with ``call_soon_threadsafe`` into
+    an ``asyncio.Queue``, so the consumer is only woken when there is actually
+    something to read — an idle stream costs nothing while the model thinks.
+
+    At most ``max_pending`` items may sit unread; after that the producer
+    blocks until the consumer catches up. Closing or cancelling the consumer
+    stops the producer at its next item and closes the source generator on
+    its own thread, without waiting for it here.
+    """
+    if max_pending is None:
+        max_pending = getattr(settings, 'STREAM_BRIDGE_MAX_PENDING', 64)
+
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    slots = threading.Semaphore(max_pending)
+    stopped = threading.Event()
+
+    def _publish(kind, payload=None):
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, (kind, payload))
+        except RuntimeError:
+            # Loop already closed: the consumer is gone, nothing to notify.
+            pass
+
+    def _produce():
+        iterator = iter(sync_iterable)
+        try:
+            for item in iterator:
+                while not slots.acquire(timeout=_BACKPRESSURE_POLL_SECONDS):
+                    if stopped.is_set():
+                        return
+                if stopped.is_set():
+                    return
+                _publish(_ITEM, item)
+        except BaseException as exc:
+            if not stopped.is_set():
+                _publish(_ERROR, exc)
+        finally:
+            close = getattr(iterator, 'close', None)
+            if close is not None:
+                try:
+                    close()
+                except Exception:
+                    logger.exception("Error closing bridged generator")
+            if not stopped.is_set():
+                _publish(_DONE)
+
+    producer = loop.run_in_executor(executor, _produce)
+
+    try:
+        while True:
+            kind, payload = await queue.get()
+            if kind == _DONE:
+                break
+            if kind == _ERROR:
+                raise payload
+            slots.release()
+            yield payload
+    finally:
+        stopped.set()
+        # Wake a producer parked on backpressure so it notices the stop flag.
+        slots.release()
+        if producer.done() and not producer.cancelled():
+            producer.exception()  # mark retrieved; errors were already relayed
+
+
+# ---------------------------------------------------------------------------
+# Typed stream events
+# ---------------------------------------------------------------------------
+
+_SSE_FRAME_END = b"\n\n"
+
+
+def _dumps(payload: dict) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload).encode('utf-8')
+
+
+@dataclass(slots=True)
+class StreamEvent:
+    """
+    One event of a chat stream, kept as data until it reaches the client.
+
+    Agent streams yield these instead of JSON strings, so consumers read
+    ``type`` and ``content`` directly and each event is serialized exactly
+    once, by encode_sse(). ``fields`` holds any other payload keys, such as
+    ``run_status`` on done events. ``id`` is the event's sequence number in
+    a resumable run stream (see run_coordinator.RunBroadcast).
+    """
+    type: str
+    content: str | None = None
+    fields: dict | None = None
+    id: int | None = None
+
+    @classmethod
+    def chunk(cls, text: str) -> "StreamEvent":
+        return cls("chunk", text)
+
+    @classmethod
+    def done(cls, run_status: str = "completed") -> "StreamEvent":
+        return cls("done", fields={"run_status": run_status})
+
+    @classmethod
+    def error(cls, message) -> "StreamEvent":
+        return cls("error", str(message))
+
+    def to_dict(self) -> dict:
+        payload = {"type": self.type}
+        if self.content is not None:
+            payload["content"] = self.content
+        if self.fields:
+            payload.update(self.fields)
+        if self.id is not None:
+            payload["id"] = self.id
+        return payload
+
+    def to_sse(self) -> bytes:
+        """Encode as one frame of the chat stream: a JSON object and a blank line."""
+        return _dumps(self.to_dict()) + _SSE_FRAME_END
+
+
+async def encode_sse(events: AsyncGenerator) -> AsyncGenerator:
+    """
+    Serialize a stream of StreamEvents for a StreamingHttpResponse.
+
+    This is the single place events become bytes; frames and bytes written
+    are recorded in get_frame_stats() when the stream ends.
+    """
+    frames = size = 0
+    try:
+        async for event in events:
+            frame = event.to_sse()
+            frames += 1
+            size += len(frame)
+            yield frame
+    finally:
+        _frame_stats.record_frames(frames, size)
+
+
+# ---------------------------------------------------------------------------
+# SSE delta coalescing
+# ---------------------------------------------------------------------------
+
+# A buffered delta ending like this closes a sentence (or line) and is worth
+# showing now rather than waiting out the window.
+_SENTENCE_END = re.compile(r'[.!?:;\n][\'")\]*_]*\s*$')
+
+
+@dataclass(frozen=True)
+class CoalescePolicy:
+    """
+    How long and how much text a stream may buffer before writing a frame.
+
+    ``window_ms`` is the longest a delta waits for company; 0 disables
+    coalescing. A buffer is flushed early once it holds ``max_bytes`` of
+    UTF-8 text or, with ``sentence_flush``, ends a sentence. The first delta
+    of a stream is never held back.
+    """
+    window_ms: int = 50
+    max_bytes: int = 512
+    sentence_flush: bool = True
+
+    @property
+    def enabled(self) -> bool:
+        return self.window_ms > 0 and self.max_bytes > 1
+
+    @classmethod
+    def from_settings(cls) -> "CoalescePolicy":
+        return cls(
+            window_ms=getattr(settings, 'SSE_COALESCE_WINDOW_MS', 50),
+            max_bytes=getattr(settings, 'SSE_COALESCE_MAX_BYTES', 512),
+            sentence_flush=getattr(settings, 'SSE_COALESCE_SENTENCE_FLUSH', True),
+        )
+
+    @classmethod
+    def for_client(cls, options) -> "CoalescePolicy":
+        """
+        Overlay the ``coalesce`` options a client sent on the server defaults.
+
+        Values are clamped to SSE_COALESCE_WINDOW_MS_LIMIT and
+        SSE_COALESCE_MAX_BYTES_LIMIT; malformed ones are ignored.
+        """
+        policy = cls.from_settings()
+        if not isinstance(options, dict):
+            return policy
+
+        window_limit = getattr(settings, 'SSE_COALESCE_WINDOW_MS_LIMIT', 1000)
+        bytes_limit = getattr(settings, 'SSE_COALESCE_MAX_BYTES_LIMIT', 8192)
+        window_ms, max_bytes = policy.window_ms, policy.max_bytes
+        try:
+            if 'window_ms' in options:
+                window_ms = min(max(int(options['window_ms']), 0), window_limit)
+            if 'max_bytes' in options:
+                max_bytes = min(max(int(options['max_bytes']), 1), bytes_limit)
+        except (TypeError, ValueError):
+            return policy
+        sentence_flush = options.get('sentence_flush', policy.sentence_flush)
+        if not isinstance(sentence_flush, bool):
+            sentence_flush = policy.sentence_flush
+        return cls(window_ms=window_ms, max_bytes=max_bytes, sentence_flush=sentence_flush)
+
+
+class SSEFrameStats:
+    """Process-wide counters for frames and bytes written to SSE clients."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._streams = 0
+        self._frames_out = 0
+        self._bytes_out = 0
+        self._deltas_in = 0
+        self._chunk_frames_out = 0
+        self._flushes: Counter = Counter()
+
+    def record_frames(self, frames_out: int, bytes_out: int) -> None:
+        with self._lock:
+            self._streams += 1
+            self._frames_out += frames_out
+            self._bytes_out += bytes_out
+
+    def record_coalescing(self, deltas_in: int, chunk_frames_out: int, flushes: Counter) -> None:
+        with self._lock:
+            self._deltas_in += deltas_in
+            self._chunk_frames_out += chunk_frames_out
+            self._flushes.update(flushes)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "streams": self._streams,
+                "frames_out": self._frames_out,
+                "bytes_out": self._bytes_out,
+                "deltas_in": self._deltas_in,
+                "chunk_frames_out": self._chunk_frames_out,
+                "deltas_per_chunk_frame": (
+                    round(self._deltas_in / self._chunk_frames_out, 2)
+                    if self._chunk_frames_out else None
+                ),
+                "flushes": dict(self._flushes),
+            }
+
+
+_frame_stats = SSEFrameStats()
+
+
+def get_frame_stats() -> SSEFrameStats:
+    return _frame_stats
+
+
+async def coalesce_frames(events: AsyncGenerator, policy: CoalescePolicy | None = None) -> AsyncGenerator:
+    """
+    Merge consecutive ``chunk`` StreamEvents according to *policy*.
+
+    Any other event (done, error, ...) first flushes the buffered text so
+    ordering is preserved. A merged chunk carries the ``id`` of the last
+    delta in it, so resuming after it skips exactly what it contained.
+    Deltas in, chunk events out and flush reasons are recorded in
+    get_frame_stats() once the stream ends.
+    """
+    if policy is None:
+        policy = CoalescePolicy.from_settings()
+
+    loop = asyncio.get_running_loop()
+    iterator = events.__aiter__()
+    window = policy.window_ms / 1000.0
+
+    buffer: list = []
+    buffered_bytes = 0
+    buffered_id = None
+    deadline = 0.0
+    pending = None  # __anext__ task left running across a window flush
+    deltas_in = chunks_out = 0
+    flushes: Counter = Counter()
+
+    def _flush(reason: str) -> StreamEvent:
+        nonlocal buffered_bytes, chunks_out
+        text = "".join(buffer)
+        buffer.clear()
+        buffered_bytes = 0
+        chunks_out += 1
+        flushes[reason] += 1
+        return StreamEvent("chunk", text, id=buffered_id)
+
+    try:
+        while True:
+            if buffer:
+                if pending is None:
+                    pending = asyncio.ensure_future(iterator.__anext__())
+                timeout = deadline - loop.time()
+                if timeout > 0:
+                    await asyncio.wait((pending,), timeout=timeout)
+                if not pending.done():
+                    yield _flush("window")
+                    continue
+
+            try:
+                if pending is not None:
+                    task, pending = pending, None
+                    event = await task
+                else:
+                    event = await iterator.__anext__()
+            except StopAsyncIteration:
+                break
+
+            if event.type != "chunk":
+                if buffer:
+                    yield _flush("boundary")
+                yield event
+                continue
+
+            text = event.content or ""
+            deltas_in += 1
+            if not policy.enabled:
+                chunks_out += 1
+                yield event
+                continue
+
+            if not buffer:
+                deadline = loop.time() + window
+            buffer.append(text)
+            buffered_bytes += len(text.encode('utf-8'))
+            buffered_id = event.id
+
+            if not chunks_out:
+                yield _flush("first")
+            elif buffered_bytes >= policy.max_bytes:
+                yield _flush("bytes")
+            elif policy.sentence_flush and _SENTENCE_END.search(text):
+                yield _flush("sentence")
+
+        if buffer:
+            yield _flush("end")
+    finally:
+        if pending is not None and not pending.done():
+            pending.cancel()
+        _frame_stats.record_coalescing(deltas_in, chunks_out, flushes)
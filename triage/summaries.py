@@ -0,0 +1,192 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .models import ChatMessage, TriageSession
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_INSTRUCTIONS = (
+    "You maintain a rolling clinical summary of a triage conversation. "
+    "Update the previous summary with the new messages below. Keep it concise, "
+    "focus on symptoms, history and current state, and ignore pleasantries. "
+    "Reply with the updated summary only."
+)
+
+
+def build_summary_prompt(previous_summary: str, messages) -> str:
+    """Compose the delta prompt: prior summary plus only the unsummarized messages."""
+    lines = [SUMMARY_INSTRUCTIONS, "", "PREVIOUS SUMMARY:", previous_summary or "(none yet)", "", "NEW MESSAGES:"]
+    for _, role, content in messages:
+        lines.append(f"{'Patient' if role == 'patient' else 'Agent'}: {content}")
+    return "\n".join(lines)
+
+
+def _summarize_on_side_thread(prompt: str) -> str | None:
+    from .services import send_message
+    from .thread_pool import checkout_thread
+
+    # A throwaway thread keeps summary prompts out of the patient's
+    # conversation and clear of any run active on it.
+    response = send_message(checkout_thread(), prompt, role="analysis")
+    if response.get("run_status") != "completed":
+        return None
+    return response.get("content") or None
+
+
+# ---------------------------------------------------------------------------
+# Incremental rolling summarizer
+# ---------------------------------------------------------------------------
+
+class RollingSummarizer:
+    """
+    Fold new chat messages into TriageSession.ai_summary incrementally.
+
+    Each session keeps a watermark of the last ChatMessage summarized, so a
+    pass only sends the previous summary and the messages after it. At most
+    one job per session is in flight: requests that arrive while a job runs
+    mark it dirty and it makes one more pass when it finishes.
+    """
+
+    def __init__(
+        self,
+        summarize: Callable[[str], str | None] | None = None,
+        min_new_messages: int | None = None,
+        max_messages_per_pass: int | None = None,
+        max_workers: int | None = None,
+    ) -> None:
+        self._summarize = summarize or _summarize_on_side_thread
+        self.min_new_messages = (
+            min_new_messages if min_new_messages is not None
+            else getattr(settings, 'SUMMARY_MIN_NEW_MESSAGES', 5)
+        )
+        self.max_messages_per_pass = (
+            max_messages_per_pass if max_messages_per_pass is not None
+            else getattr(settings, 'SUMMARY_MAX_MESSAGES_PER_PASS', 40)
+        )
+        self._max_workers = (
+            max_workers if max_workers is not None
+            else getattr(settings, 'SUMMARY_MAX_WORKERS', 2)
+        )
+        self._executor: ThreadPoolExecutor | None = None
+        self._lock = threading.Lock()
+        self._running: set = set()
+        self._dirty: set = set()
+        self._stats = {"requested": 0, "coalesced": 0, "runs": 0, "skipped": 0, "errors": 0, "messages_summarized": 0}
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self._max_workers, thread_name_prefix="rolling-summary"
+                )
+            return self._executor
+
+    # ------------------------------------------------------------------
+    # Scheduling
+    # ------------------------------------------------------------------
+
+    def request(self, session_id: int) -> bool:
+        """
+        Ask for *session_id* to be brought up to date.
+
+        Returns True if a new job was started, False if it was folded into
+        the job already in flight.
+        """
+        with self._lock:
+            self._stats["requested"] += 1
+            if session_id in self._running:
+                self._dirty.add(session_id)
+                self._stats["coalesced"] += 1
+                return False
+            self._running.add(session_id)
+        self._get_executor().submit(self._job, session_id)
+        return True
+
+    def _job(self, session_id: int) -> None:
+        try:
+            while True:
+                try:
+                    more = self.run_once(session_id)
+                except Exception:
+                    logger.exception("Rolling summary failed for session %s", session_id)
+                    with self._lock:
+                        self._stats["errors"] += 1
+                    more = False
+                with self._lock:
+                    if not more and session_id not in self._dirty:
+                        self._running.discard(session_id)
+                        return
+                    self._dirty.discard(session_id)
+        finally:
+            close_old_connections()
+
+    # ------------------------------------------------------------------
+    # One summarization pass
+    # ------------------------------------------------------------------
+
+    def run_once(self, session_id: int) -> bool:
+        """
+        Summarize messages past the watermark. Returns True when a full batch
+        was consumed and more messages may be waiting.
+        """
+        session = TriageSession.objects.only(
+            'id', 'ai_summary', 'summary_watermark', 'summary_version'
+        ).get(id=session_id)
+        new_messages = list(
+            ChatMessage.objects.filter(session_id=session_id, id__gt=session.summary_watermark)
+            .order_by('id')
+            .values_list('id', 'role', 'content')[: self.max_messages_per_pass]
+        )
+        if len(new_messages) < max(1, self.min_new_messages):
+            with self._lock:
+                self._stats["skipped"] += 1
+            return False
+
+        summary = self._summarize(build_summary_prompt(session.ai_summary, new_messages))
+        if not summary:
+            with self._lock:
+                self._stats["errors"] += 1
+            return False
+
+        session.ai_summary = summary
+        session.summary_watermark = new_messages[-1][0]
+        session.summary_version += 1
+        session.summary_updated_at = timezone.now()
+        session.save(update_fields=['ai_summary', 'summary_watermark', 'summary_version', 'summary_updated_at'])
+
+        with self._lock:
+            self._stats["runs"] += 1
+            self._stats["messages_summarized"] += len(new_messages)
+        return len(new_messages) >= self.max_messages_per_pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "in_flight": len(self._running), "pending_reruns": len(self._dirty)}
+
+
+# ---------------------------------------------------------------------------
+# Module-level API
+# ---------------------------------------------------------------------------
+
+_summarizer: RollingSummarizer | None = None
+_summarizer_lock = threading.Lock()
+
+
+def get_summarizer() -> RollingSummarizer:
+    global _summarizer
+    if _summarizer is None:
+        with _summarizer_lock:
+            if _summarizer is None:
+                _summarizer = RollingSummarizer()
+    return _summarizer
+
+
+def schedule_summary(session_id: int) -> bool:
+    """Queue an incremental summary refresh for a session (never blocks)."""
+    return get_summarizer().request(session_id)
@@ -1,8 +1,61 @@
+import asyncio
+import json
 import os
+import tempfile
+import threading
+import time
 import unittest
+from io import StringIO
+from types import SimpleNamespace
 
 from django.db import connection
-from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+
+from azure.core.credentials import AccessToken
+from azure.ai.projects.models import (
+    AgentStreamEvent,
+    ListSortOrder,
+    MessageDelta,
+    MessageDeltaChunk,
+    MessageDeltaTextContent,
+    MessageDeltaTextContentObject,
+    ThreadRun,
+)
+
+from . import availability, events, views
+from .availability import DoctorAvailabilityCache, get_availability_cache
+from .consultations import ConsultationCache, normalize_query
+from .context_budget import LEGACY_LAST_MESSAGES, RoleBudget, plan_run, trim_summary
+from .events import QueueChange, QueueEventBus
+from .fake_agents import FakeAgentConfig, get_fake_core
+from .models import Doctor, TriageSession
+from .services import (
+    EVENT_MESSAGE_DELTA,
+    EVENT_REQUIRES_ACTION,
+    EVENT_RUN_CREATED,
+    AsyncAzureAgentClient,
+    AzureAgentClient,
+    CachedCredential,
+    _delta_texts,
+    _event_kind,
+    _poll_delays,
+)
+from .resilience import (
+    BreakerRegistry,
+    CircuitBreaker,
+    CircuitOpenError,
+    HedgePolicy,
+    ResilientAgentOperations,
+    is_service_failure,
+)
+from .queue_cache import get_queue_fragment_cache
+from .run_coordinator import STREAM_GAP_MESSAGE, RunBroadcast, ThreadRunCoordinator, get_run_coordinator
+from .streaming import CoalescePolicy, StreamEvent, coalesce_frames, encode_sse, iterate_in_thread
+from .summaries import RollingSummarizer
+from .thread_pool import AgentThreadPool
+from .tool_runtime import ToolRuntime
 
 
 @unittest.skipUnless(
@@ -17,3 +70,1368 @@ class DatabaseConnectivityTest(TestCase):
             cursor.execute('SELECT 1')
             result = cursor.fetchone()
         self.assertEqual(result[0], 1)
+
+
+class IndexUsageTest(TestCase):
+    def test_hot_lookups_use_their_indexes(self):
+        out = StringIO()
+        call_command('benchmark_indexes', sessions=400, messages=2, repeat=1, stdout=out)
+        self.assertIn("All lookups use their indexes.", out.getvalue())
+        self.assertFalse(TriageSession.objects.exists())
+
+
+def _text_delta(text):
+    return MessageDeltaChunk(
+        id="msg_1",
+        delta=MessageDelta(
+            role="assistant",
+            content=[MessageDeltaTextContent(index=0, text=MessageDeltaTextContentObject(value=text))],
+        ),
+    )
+
+
+class _RecordedAsyncStream:
+    """Minimal stand-in for the SDK's AsyncAgentRunStream / event handler."""
+
+    def __init__(self, events):
+        self.events = events
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return None
+
+    async def __aiter__(self):
+        for event in self.events:
+            yield event
+
+
+class _RecordedAsyncAgents:
+    def __init__(self, events):
+        self.events = events
+        self.messages = []
+
+    async def create_message(self, thread_id, role, content):
+        self.messages.append(content)
+
+    async def create_stream(self, **kwargs):
+        return _RecordedAsyncStream(self.events)
+
+
+class AsyncAgentStreamTest(SimpleTestCase):
+    def _client(self, events):
+        client = AsyncAzureAgentClient.__new__(AsyncAzureAgentClient)
+        client.agents = {"intake": "asst_test", "default": "asst_test"}
+        client.client = type("Client", (), {})()
+        client.client.agents = _RecordedAsyncAgents(events)
+        return client
+
+    def test_stream_yields_deltas_then_done(self):
+        client = self._client([
+            ("thread.run.created", ThreadRun({"id": "run_1"}), None),
+            ("thread.message.delta", _text_delta("Habari "), None),
+            ("thread.message.delta", _text_delta("yako"), None),
+        ])
+
+        async def collect():
+            stream = await client.async_send_message_stream("thread_1", "hi")
+            return [chunk.to_dict() async for chunk in stream]
+
+        events = asyncio.run(collect())
+        self.assertEqual(
+            [e.get("content") for e in events if e["type"] == "chunk"],
+            ["Habari ", "yako"],
+        )
+        self.assertEqual(events[-1]["type"], "done")
+        self.assertIn("thread_id=thread_1", client.client.agents.messages[0])
+
+    def test_context_planning_releases_its_db_connection(self):
+        from unittest import mock
+
+        client = self._client([("thread.run.created", ThreadRun({"id": "run_1"}), None)])
+        plan_threads = []
+        plan_context = client._plan_context
+
+        def tracked_plan(*args):
+            plan_threads.append(threading.get_ident())
+            return plan_context(*args)
+
+        client._plan_context = tracked_plan
+
+        async def collect():
+            stream = await client.async_send_message_stream("thread_1", "hi")
+            return [event async for event in stream]
+
+        with mock.patch("triage.db.close_old_connections") as close:
+            close.side_effect = lambda: plan_threads.append(("closed", threading.get_ident()))
+            asyncio.run(collect())
+        self.assertEqual(plan_threads[1], ("closed", plan_threads[0]))
+
+    @override_settings(AZURE_AGENT_CIRCUIT_BREAKER_ENABLED=False)
+    def test_failed_create_message_cancels_context_planning(self):
+        client = self._client([])
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def slow_plan(*args):
+            release.wait(5)
+
+        async def timed_out(**kwargs):
+            raise TimeoutError("Connection timed out")
+
+        client._plan_context = slow_plan
+        client.client.agents.create_message = timed_out
+
+        async def send():
+            stream = await client.async_send_message_stream("thread_1", "hi")
+            await asyncio.sleep(0)
+            pending = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+            return [event.to_dict() async for event in stream], pending
+
+        events, pending = asyncio.run(send())
+        self.assertEqual([e["type"] for e in events], ["error"])
+        self.assertEqual(pending, [])
+
+
+class StreamEventDispatchTest(SimpleTestCase):
+    def test_event_kind_matches_strings_enums_and_payload_names(self):
+        self.assertIs(_event_kind("thread.message.delta", None), EVENT_MESSAGE_DELTA)
+        self.assertIs(_event_kind(AgentStreamEvent.THREAD_RUN_CREATED, None), EVENT_RUN_CREATED)
+        self.assertIs(
+            _event_kind(SimpleNamespace(value="thread.run.requires_action"), None),
+            EVENT_REQUIRES_ACTION,
+        )
+        # Older builds report the payload class name instead of the wire event.
+        self.assertIs(_event_kind("MessageDeltaChunk", _text_delta("x")), EVENT_MESSAGE_DELTA)
+        self.assertIsNone(_event_kind("thread.run.in_progress", ThreadRun({"id": "run_1"})))
+        self.assertIsNone(_event_kind("done", "[DONE]"))
+
+    def test_delta_texts_fast_path_and_fallback_shapes(self):
+        self.assertEqual(_delta_texts(_text_delta("Habari")), ["Habari"])
+        self.assertEqual(
+            _delta_texts(MessageDeltaChunk({"id": "m", "delta": {"content": [{"index": 0, "type": "text"}]}})),
+            [],
+        )
+        legacy = SimpleNamespace(delta=SimpleNamespace(content=[
+            {"type": "text", "text": {"value": "a"}},
+            SimpleNamespace(type="text", text=SimpleNamespace(value="b")),
+            {"type": "image_file"},
+        ]))
+        self.assertEqual(_delta_texts(legacy), ["a", "b"])
+        self.assertEqual(_delta_texts(SimpleNamespace(delta=SimpleNamespace(content=None))), [])
+
+
+class ContextBudgetTest(SimpleTestCase):
+    def test_window_shrinks_to_fit_prompt_budget(self):
+        budget = RoleBudget(prompt_tokens=300, completion_tokens=500, max_messages=10)
+        # Newest first: two short turns fit, the long one behind them does not.
+        plan = plan_run("triage", message="x" * 40, history_lengths=[200, 200, 4000, 100], budget=budget)
+        self.assertEqual(plan.last_messages, 3)
+        self.assertEqual(plan.max_completion_tokens, 500)
+        self.assertGreater(plan.saved_prompt_tokens, 900)
+
+        unknown = plan_run("triage", message="hi", history_lengths=None, budget=budget)
+        self.assertEqual(unknown.last_messages, 10)
+
+    def test_first_turn_cap_and_min_messages(self):
+        budget = RoleBudget(prompt_tokens=10, completion_tokens=900, first_turn_completion_tokens=300, min_messages=2)
+        first = plan_run("intake", message="hello", history_lengths=[], budget=budget)
+        self.assertEqual((first.last_messages, first.max_completion_tokens), (1, 300))
+        later = plan_run("intake", message="hello", history_lengths=[4000, 4000], budget=budget)
+        self.assertEqual((later.last_messages, later.max_completion_tokens), (2, 900))
+
+    def test_summary_is_compressed_and_cut_at_a_sentence(self):
+        summary = "Fever   for three days.\n\n\nNo rash. " + "Reports fatigue and poor appetite. " * 20
+        trimmed = trim_summary(summary, 20)
+        self.assertTrue(trimmed.startswith("Fever for three days.\nNo rash."))
+        self.assertTrue(trimmed.endswith(". …"))
+        self.assertLessEqual(len(trimmed), 20 * 4 + 2)
+        plan = plan_run("triage", message="ok", summary=summary, budget=RoleBudget(summary_tokens=20))
+        self.assertTrue(plan.summary_trimmed)
+        self.assertEqual(plan.summary, trimmed)
+
+    @override_settings(AGENT_CONTEXT_BUDGET_ENABLED=False)
+    def test_disabled_keeps_legacy_run_parameters(self):
+        plan = plan_run("intake", message="hi", summary="s " * 2000, history_lengths=[])
+        self.assertEqual(plan.truncation_strategy, {"type": "last_messages", "last_messages": LEGACY_LAST_MESSAGES})
+        self.assertEqual(plan.max_completion_tokens, 10000)
+        self.assertEqual(plan.summary, "s " * 2000)
+        self.assertEqual(plan.saved_prompt_tokens, 0)
+
+
+class StreamBridgeTest(SimpleTestCase):
+    def test_relays_items_in_order(self):
+        async def collect():
+            return [item async for item in iterate_in_thread(iter(range(200)), max_pending=4)]
+
+        self.assertEqual(asyncio.run(collect()), list(range(200)))
+
+    def test_producer_errors_reach_consumer(self):
+        def failing():
+            yield "first"
+            raise ValueError("boom")
+
+        async def collect(seen):
+            async for item in iterate_in_thread(failing()):
+                seen.append(item)
+
+        seen = []
+        with self.assertRaises(ValueError):
+            asyncio.run(collect(seen))
+        self.assertEqual(seen, ["first"])
+
+    def test_closing_consumer_closes_source_generator(self):
+        closed = threading.Event()
+
+        def endless():
+            try:
+                while True:
+                    yield "tick"
+            finally:
+                closed.set()
+
+        async def take_one():
+            stream = iterate_in_thread(endless(), max_pending=2)
+            first = await stream.__anext__()
+            await stream.aclose()
+            return first
+
+        self.assertEqual(asyncio.run(take_one()), "tick")
+        self.assertTrue(closed.wait(timeout=2))
+
+
+def _tool_call(name, call_id="call_1", arguments="{}"):
+    return SimpleNamespace(id=call_id, function=SimpleNamespace(name=name, arguments=arguments))
+
+
+def _frame(kind, content=None):
+    return StreamEvent(kind, content)
+
+
+class CoalesceFramesTest(SimpleTestCase):
+    def _run(self, steps, policy):
+        async def source():
+            for step in steps:
+                if isinstance(step, float):
+                    await asyncio.sleep(step)
+                else:
+                    yield step
+
+        async def collect():
+            return [event.to_dict() async for event in coalesce_frames(source(), policy)]
+
+        return asyncio.run(collect())
+
+    def test_merges_deltas_and_flushes_on_sentence_and_boundary(self):
+        frames = self._run(
+            [_frame("chunk", "Hi"), _frame("chunk", " there"), _frame("chunk", " friend."),
+             _frame("chunk", " How"), _frame("chunk", " are"), _frame("done")],
+            CoalescePolicy(window_ms=1000, max_bytes=512),
+        )
+        self.assertEqual(
+            [f.get("content") for f in frames],
+            ["Hi", " there friend.", " How are", None],
+        )
+        self.assertEqual(frames[-1]["type"], "done")
+
+    def test_window_and_byte_limits(self):
+        frames = self._run(
+            [_frame("chunk", "a"), _frame("chunk", "b"), 0.05, _frame("chunk", "c"),
+             _frame("chunk", "dddd"), _frame("chunk", "e")],
+            CoalescePolicy(window_ms=10, max_bytes=4, sentence_flush=False),
+        )
+        self.assertEqual([f["content"] for f in frames], ["a", "b", "cdddd", "e"])
+
+        passthrough = self._run(
+            [_frame("chunk", "a"), _frame("chunk", "b")], CoalescePolicy(window_ms=0),
+        )
+        self.assertEqual(len(passthrough), 2)
+
+    def test_events_are_encoded_once_at_the_edge(self):
+        async def source():
+            yield StreamEvent.chunk("Karibu ")
+            yield StreamEvent.done("completed")
+
+        async def collect():
+            return [frame async for frame in encode_sse(source())]
+
+        frames = asyncio.run(collect())
+        self.assertTrue(all(isinstance(frame, bytes) and frame.endswith(b"\n\n") for frame in frames))
+        self.assertEqual(
+            [json.loads(frame) for frame in frames],
+            [{"type": "chunk", "content": "Karibu "}, {"type": "done", "run_status": "completed"}],
+        )
+
+    @override_settings(SSE_COALESCE_WINDOW_MS_LIMIT=500, SSE_COALESCE_MAX_BYTES_LIMIT=4096)
+    def test_client_policy_is_clamped(self):
+        policy = CoalescePolicy.for_client({"window_ms": 5000, "max_bytes": 0, "sentence_flush": False})
+        self.assertEqual((policy.window_ms, policy.max_bytes, policy.sentence_flush), (500, 1, False))
+        self.assertEqual(CoalescePolicy.for_client({"window_ms": "slow"}), CoalescePolicy.from_settings())
+        self.assertEqual(CoalescePolicy.for_client(None), CoalescePolicy.from_settings())
+
+
+class CoalescedFrameIdTest(SimpleTestCase):
+    def test_merged_chunk_keeps_the_last_delta_id(self):
+        async def run():
+            async def events():
+                for i, text in enumerate(["a", "b", "c."], start=1):
+                    yield StreamEvent("chunk", text, id=i)
+                yield StreamEvent("done", fields={"run_status": "completed"}, id=4)
+            return [e.to_dict() async for e in coalesce_frames(events(), CoalescePolicy(window_ms=1000))]
+
+        self.assertEqual(asyncio.run(run()), [
+            {"type": "chunk", "content": "a", "id": 1},
+            {"type": "chunk", "content": "bc.", "id": 3},
+            {"type": "done", "run_status": "completed", "id": 4},
+        ])
+
+
+class ToolRuntimeTest(SimpleTestCase):
+    def setUp(self):
+        self.runtime = ToolRuntime(
+            timeouts={"slow": 0.05},
+            default_timeout=5,
+            concurrency={"capped": 1},
+            default_concurrency=8,
+        )
+        self.addCleanup(self.runtime.shutdown)
+
+    def test_loop_thread_is_reused_across_batches(self):
+        async def echo(tool_call):
+            return {"tool_call_id": tool_call.id, "output": json.dumps(threading.get_ident())}
+
+        first = self.runtime.run_tool_calls([_tool_call("fast")], echo)
+        second = self.runtime.run_tool_calls([_tool_call("fast")], echo)
+        self.assertEqual(first[0]["output"], second[0]["output"])
+
+    def test_per_tool_timeout_returns_error_output(self):
+        async def sleepy(tool_call):
+            await asyncio.sleep(1)
+            return {"tool_call_id": tool_call.id, "output": "{}"}
+
+        [result] = self.runtime.run_tool_calls([_tool_call("slow", "call_9")], sleepy)
+        self.assertEqual(result["tool_call_id"], "call_9")
+        self.assertIn("timed out", json.loads(result["output"])["error"])
+        self.assertEqual(self.runtime.metrics()["tools"]["slow"]["timeouts"], 1)
+
+    def test_errors_are_counted_from_raised_exceptions_only(self):
+        async def executor(tool_call):
+            if tool_call.function.name == "broken":
+                raise ValueError("boom")
+            return {"tool_call_id": tool_call.id, "output": json.dumps({"status": "ok", "error": None})}
+
+        ok, broken = self.runtime.run_tool_calls([_tool_call("fast"), _tool_call("broken", "call_2")], executor)
+        self.assertEqual(json.loads(ok["output"]), {"status": "ok", "error": None})
+        self.assertEqual(broken, {"tool_call_id": "call_2", "output": json.dumps({"error": "boom"})})
+        tools = self.runtime.metrics()["tools"]
+        self.assertEqual(tools["fast"]["errors"], 0)
+        self.assertEqual(tools["broken"]["errors"], 1)
+
+    def test_sync_wait_is_bounded_when_the_loop_stops_responding(self):
+        from unittest import mock
+
+        async def echo(tool_call):
+            return {"tool_call_id": tool_call.id, "output": "{}"}
+
+        self.runtime.run_tool_calls([_tool_call("fast")], echo)
+        gate = threading.Event()
+        self.runtime._loop.call_soon_threadsafe(gate.wait)  # wedge the loop thread
+        self.addCleanup(gate.set)
+
+        with mock.patch("triage.tool_runtime.BATCH_GRACE_SECONDS", 0.05):
+            [result] = self.runtime.run_tool_calls([_tool_call("slow", "call_3")], echo)
+        self.assertEqual(result["tool_call_id"], "call_3")
+        self.assertIn("did not respond", json.loads(result["output"])["error"])
+        gate.set()
+        self.runtime.run_tool_calls([_tool_call("fast")], echo)
+        self.assertEqual(self.runtime.metrics()["queue_depth"], 0)
+
+    def test_concurrency_cap_serializes_calls(self):
+        active = []
+        peak = []
+
+        async def tracked(tool_call):
+            active.append(tool_call.id)
+            peak.append(len(active))
+            await asyncio.sleep(0.01)
+            active.remove(tool_call.id)
+            return {"tool_call_id": tool_call.id, "output": "{}"}
+
+        calls = [_tool_call("capped", f"call_{i}") for i in range(4)]
+        results = self.runtime.run_tool_calls(calls, tracked)
+        self.assertEqual(len(results), 4)
+        self.assertEqual(max(peak), 1)
+        metrics = self.runtime.metrics()
+        self.assertEqual(metrics["queue_depth"], 0)
+        self.assertEqual(metrics["tools"]["capped"]["calls"], 4)
+
+    def test_dead_loop_is_restarted(self):
+        async def echo(tool_call):
+            return {"tool_call_id": tool_call.id, "output": "{}"}
+
+        self.runtime.run_tool_calls([_tool_call("fast")], echo)
+        self.runtime._loop.call_soon_threadsafe(self.runtime._loop.stop)
+        self.runtime._thread.join(2)
+        for _ in range(50):
+            if not self.runtime._thread.is_alive():
+                break
+            time.sleep(0.01)
+
+        self.assertEqual(len(self.runtime.run_tool_calls([_tool_call("fast")], echo)), 1)
+        self.assertEqual(self.runtime.metrics()["restarts"], 1)
+
+
+class _PollingAgents:
+    """Sync agents stub whose run completes after a couple of polls."""
+
+    def __init__(self):
+        self.list_calls = []
+        self.statuses = ["in_progress", "completed"]
+
+    def create_message(self, **kwargs):
+        return None
+
+    def create_run(self, **kwargs):
+        return SimpleNamespace(id="run_1", status="queued")
+
+    def get_run(self, thread_id, run_id):
+        return SimpleNamespace(id=run_id, status=self.statuses.pop(0))
+
+    def list_messages(self, **kwargs):
+        self.list_calls.append(kwargs)
+        message = SimpleNamespace(
+            role="assistant",
+            content=[SimpleNamespace(text=SimpleNamespace(value="Pole sana."))],
+        )
+        return SimpleNamespace(data=[message])
+
+
+class SendMessagePollingTest(SimpleTestCase):
+    def test_poll_delays_back_off_to_cap(self):
+        delays = _poll_delays()
+        first = [next(delays) for _ in range(12)]
+        self.assertLess(first[0], 0.5)
+        self.assertEqual(first, sorted(first))
+        self.assertEqual(first[-1], 1.0)
+
+    def test_fetches_only_newest_run_message(self):
+        client = AzureAgentClient.__new__(AzureAgentClient)
+        client.agents = {"intake": "asst_test", "default": "asst_test"}
+        client.client = SimpleNamespace(agents=_PollingAgents())
+
+        started = time.perf_counter()
+        result = client.send_message("thread_1", "hello")
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual(result["content"], "Pole sana.")
+        self.assertEqual(result["run_status"], "completed")
+        self.assertLess(elapsed, 0.5)
+        [call] = client.client.agents.list_calls
+        self.assertEqual(call["run_id"], "run_1")
+        self.assertEqual(call["limit"], 1)
+        self.assertEqual(call["order"], ListSortOrder.DESCENDING)
+
+
+class AgentThreadPoolTest(SimpleTestCase):
+    def _pool(self, **kwargs):
+        self.counter = 0
+        self.deleted = []
+
+        def create():
+            self.counter += 1
+            return f"thread_{self.counter}"
+
+        return AgentThreadPool(create=create, delete=self.deleted.append, **kwargs)
+
+    def _wait_for_refill(self, pool):
+        for _ in range(200):
+            if not pool.stats()["refilling"]:
+                return
+            time.sleep(0.005)
+
+    def test_empty_pool_creates_inline_and_refills_to_high_watermark(self):
+        pool = self._pool(low_watermark=2, high_watermark=4, max_idle_seconds=60)
+        first = pool.acquire()
+        self._wait_for_refill(pool)
+        self.assertEqual(len(pool), 4)
+        self.assertEqual(self.counter, 5)
+        second = pool.checkout()
+        self.assertNotEqual(first, second)
+        self.assertEqual(pool.stats()["hits"], 1)
+        self.assertEqual(pool.stats()["misses"], 1)
+
+    def test_idle_threads_expire(self):
+        pool = self._pool(low_watermark=0, high_watermark=2, max_idle_seconds=0)
+        pool.refill_async()
+        self._wait_for_refill(pool)
+        time.sleep(0.01)
+        self.assertIsNone(pool.checkout())
+        self.assertEqual(self.counter, 2)
+        self.assertGreaterEqual(pool.stats()["expired"], 2)
+        # Expired threads are deleted on the service in the background.
+        for _ in range(200):
+            if len(self.deleted) >= 2:
+                break
+            time.sleep(0.005)
+        self.assertEqual(sorted(self.deleted), ["thread_1", "thread_2"])
+        self.assertEqual(pool.stats()["deleted"], 2)
+
+
+class _CountingCredential:
+    def __init__(self, lifetime=3600):
+        self.calls = 0
+        self.lifetime = lifetime
+
+    def get_token(self, *scopes, **kwargs):
+        self.calls += 1
+        return AccessToken(f"token-{self.calls}", int(time.time()) + self.lifetime)
+
+
+class CachedCredentialTest(SimpleTestCase):
+    SCOPE = "https://ml.azure.com/.default"
+
+    def test_tokens_are_cached_per_scope(self):
+        inner = _CountingCredential()
+        cred = CachedCredential(inner, cache_path="")
+        self.addCleanup(cred.close)
+
+        self.assertEqual(cred.get_token(self.SCOPE).token, "token-1")
+        self.assertEqual(cred.get_token(self.SCOPE).token, "token-1")
+        self.assertEqual(cred.get_token("https://management.azure.com/.default").token, "token-2")
+        self.assertEqual(inner.calls, 2)
+
+    def test_refreshes_in_background_before_expiry(self):
+        inner = _CountingCredential(lifetime=3600)
+        cred = CachedCredential(inner, refresh_margin=3599, cache_path="")
+        self.addCleanup(cred.close)
+
+        cred.get_token(self.SCOPE)
+        for _ in range(300):
+            if inner.calls > 1:
+                break
+            time.sleep(0.01)
+        self.assertGreater(inner.calls, 1)
+        self.assertNotEqual(cred.get_token(self.SCOPE).token, "token-1")
+
+    def test_tokens_survive_restart_via_disk_cache(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "tokens.json")
+            first = CachedCredential(_CountingCredential(), cache_path=path)
+            first.get_token(self.SCOPE)
+            first.close()
+
+            inner = _CountingCredential()
+            second = CachedCredential(inner, cache_path=path)
+            self.addCleanup(second.close)
+            self.assertEqual(second.get_token(self.SCOPE).token, "token-1")
+            self.assertEqual(inner.calls, 0)
+            self.assertEqual(os.stat(path).st_mode & 0o777, 0o600)
+
+    def test_rejects_unknown_chain_entries(self):
+        with self.assertRaises(ValueError):
+            CachedCredential(chain=["carrier_pigeon"], cache_path="")
+
+
+class ConsultationCacheTest(SimpleTestCase):
+    def _counting_compute(self, delay=0.0, status="completed"):
+        calls = {"n": 0}
+
+        async def compute():
+            calls["n"] += 1
+            await asyncio.sleep(delay)
+            return {"content": f"answer-{calls['n']}", "run_status": status}
+
+        return compute, calls
+
+    def test_normalized_queries_share_an_entry(self):
+        self.assertEqual(normalize_query("  Is chest PAIN urgent?  "), normalize_query("is chest pain\nurgent"))
+        cache = ConsultationCache(max_entries=8, ttl_seconds=60)
+        compute, calls = self._counting_compute()
+
+        async def run():
+            first = await cache.get_or_compute(cache.make_key("analysis", "Chest pain urgent?"), compute)
+            second = await cache.get_or_compute(cache.make_key("analysis", "chest  pain urgent"), compute)
+            return first, second
+
+        (_, first_source), (response, second_source) = asyncio.run(run())
+        self.assertEqual((first_source, second_source), ("miss", "hit"))
+        self.assertEqual(response["content"], "answer-1")
+        self.assertEqual(calls["n"], 1)
+        self.assertEqual(cache.stats()["hit_rate"], 0.5)
+
+    def test_concurrent_identical_queries_run_once(self):
+        cache = ConsultationCache(max_entries=8, ttl_seconds=60)
+        compute, calls = self._counting_compute(delay=0.05)
+        key = cache.make_key("analysis", "fever and rash")
+
+        async def run():
+            return await asyncio.gather(*[cache.get_or_compute(key, compute) for _ in range(5)])
+
+        results = asyncio.run(run())
+        self.assertEqual(calls["n"], 1)
+        self.assertEqual(sorted(source for _, source in results), ["coalesced"] * 4 + ["miss"])
+        self.assertEqual(cache.stats()["llm_runs_saved"], 4)
+
+    def test_cancelled_owner_does_not_cancel_coalesced_waiters(self):
+        cache = ConsultationCache(max_entries=8, ttl_seconds=60)
+        compute, calls = self._counting_compute(delay=0.05)
+        key = cache.make_key("guardian", "is this safe")
+
+        async def run():
+            owner = asyncio.ensure_future(cache.get_or_compute(key, compute))
+            await asyncio.sleep(0)
+            waiter = asyncio.ensure_future(cache.get_or_compute(key, compute))
+            await asyncio.sleep(0.01)
+            owner.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await owner
+            return await waiter
+
+        response, source = asyncio.run(run())
+        self.assertEqual((response["content"], source), ("answer-2", "miss"))
+        self.assertEqual(calls["n"], 2)
+        self.assertEqual(cache.stats()["inflight"], 0)
+
+    def test_opt_out_failures_ttl_and_lru(self):
+        cache = ConsultationCache(max_entries=1, ttl_seconds=60)
+        compute, calls = self._counting_compute()
+        failed, _ = self._counting_compute(status="failed")
+
+        async def run():
+            await cache.get_or_compute(("analysis", "a"), compute)
+            _, bypass = await cache.get_or_compute(("analysis", "a"), compute, use_cache=False)
+            await cache.get_or_compute(("analysis", "b"), failed)
+            _, after_failure = await cache.get_or_compute(("analysis", "b"), compute)
+            _, evicted = await cache.get_or_compute(("analysis", "a"), compute)
+            return bypass, after_failure, evicted
+
+        self.assertEqual(asyncio.run(run()), ("bypass", "miss", "miss"))
+        self.assertEqual(cache.stats()["evictions"], 2)
+
+        cache.ttl_seconds = -1
+        cache.put(("analysis", "c"), {"run_status": "completed"})
+        self.assertIsNone(cache.get(("analysis", "c")))
+
+    def test_consult_many_runs_roles_concurrently_under_one_deadline(self):
+        from unittest import mock
+
+        from . import consultations
+
+        delays = {"guardian": 0.05, "analysis": 0.05, "scheduler": 1.0}
+
+        async def fake_run(target_role, query):
+            if target_role == "orchestrator":
+                raise RuntimeError("agent unavailable")
+            await asyncio.sleep(delays[target_role])
+            return {"content": f"{target_role}: {query}", "run_status": "completed"}
+
+        async def run():
+            started = time.monotonic()
+            outcome = await consultations.consult_many(
+                ["guardian", "analysis", "scheduler", "orchestrator", "guardian"], "chest pain", deadline_seconds=0.3,
+            )
+            return outcome, time.monotonic() - started
+
+        with mock.patch.object(consultations, "_cache", ConsultationCache()), \
+                mock.patch.object(consultations, "_run_consultation", fake_run):
+            outcome, elapsed = asyncio.run(run())
+
+        results = outcome["results"]
+        self.assertEqual(list(results), ["guardian", "analysis", "scheduler", "orchestrator"])
+        self.assertEqual(results["guardian"]["consultation_response"], "guardian: chest pain")
+        self.assertLess(results["analysis"]["latency_seconds"], 0.3)
+        self.assertEqual(results["scheduler"], {"status": "timeout", "latency_seconds": 0.3})
+        self.assertEqual(results["orchestrator"]["status"], "error")
+        # Concurrent: bounded by the deadline, not the sum of the role latencies.
+        self.assertLess(elapsed, 0.6)
+
+    def test_consult_many_survives_cancelled_roles_and_its_own_cancellation(self):
+        from unittest import mock
+
+        from . import consultations
+
+        async def fake_run(target_role, query):
+            if target_role == "scheduler":
+                raise asyncio.CancelledError()
+            await asyncio.sleep(0.05)
+            return {"content": f"{target_role}: {query}", "run_status": "completed"}
+
+        async def run():
+            outcome = await consultations.consult_many(["analysis", "scheduler"], "fever", deadline_seconds=1)
+            call = asyncio.ensure_future(consultations.consult_many(["guardian"], "rash", deadline_seconds=1))
+            await asyncio.sleep(0.01)
+            call.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await call
+            late = set(consultations._late_consultations)
+            await asyncio.gather(*late)
+            return outcome, late
+
+        with mock.patch.object(consultations, "_cache", ConsultationCache()), \
+                mock.patch.object(consultations, "_run_consultation", fake_run):
+            outcome, late = asyncio.run(run())
+
+        self.assertEqual(outcome["results"]["analysis"]["status"], "success")
+        self.assertEqual(outcome["results"]["scheduler"]["status"], "error")
+        # The cancelled call's guardian run was kept, not orphaned.
+        self.assertEqual(len(late), 1)
+        self.assertEqual(next(iter(late)).result()["status"], "success")
+
+class RollingSummarizerTest(TestCase):
+    def setUp(self):
+        from .models import ChatMessage, Patient, TriageSession
+
+        user = User.objects.create_user("summary-patient")
+        patient = Patient.objects.create(user=user, first_name="Amina", last_name="Otieno")
+        self.session = TriageSession.objects.create(patient=patient, ai_summary="Headache for 2 days.")
+        self.messages = [
+            ChatMessage.objects.create(session=self.session, role="patient" if i % 2 == 0 else "agent", content=f"msg {i}")
+            for i in range(6)
+        ]
+        self.prompts = []
+
+    def _summarize(self, prompt):
+        self.prompts.append(prompt)
+        return f"summary v{len(self.prompts)}"
+
+    def test_only_messages_past_the_watermark_are_sent(self):
+        from .models import ChatMessage
+
+        summarizer = RollingSummarizer(summarize=self._summarize, min_new_messages=2)
+        self.assertFalse(summarizer.run_once(self.session.id))
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.summary_watermark, self.messages[-1].id)
+        self.assertEqual(self.session.summary_version, 1)
+        self.assertIsNotNone(self.session.summary_updated_at)
+        self.assertIn("Headache for 2 days.", self.prompts[0])
+
+        ChatMessage.objects.create(session=self.session, role="patient", content="now also fever")
+        summarizer.run_once(self.session.id)  # one new message: below threshold
+        self.assertEqual(len(self.prompts), 1)
+
+        ChatMessage.objects.create(session=self.session, role="agent", content="noted")
+        summarizer.run_once(self.session.id)
+        self.assertIn("summary v1", self.prompts[1])
+        self.assertIn("now also fever", self.prompts[1])
+        self.assertNotIn("msg 0", self.prompts[1])
+        self.session.refresh_from_db()
+        self.assertEqual((self.session.summary_version, self.session.ai_summary), (2, "summary v2"))
+
+
+class SummaryCoalescingTest(SimpleTestCase):
+    def test_requests_during_a_running_job_coalesce_into_one_rerun(self):
+        release = threading.Event()
+        passes = []
+
+        class _Summarizer(RollingSummarizer):
+            def run_once(self, session_id):
+                passes.append(session_id)
+                release.wait(2)
+                return False
+
+        summarizer = _Summarizer(summarize=lambda prompt: None, max_workers=1)
+        self.assertTrue(summarizer.request(7))
+        self.assertFalse(summarizer.request(7))
+        self.assertFalse(summarizer.request(7))
+        release.set()
+        for _ in range(200):
+            if summarizer.stats()["in_flight"] == 0:
+                break
+            time.sleep(0.01)
+
+        self.assertEqual(passes, [7, 7])
+        self.assertEqual(summarizer.stats()["coalesced"], 2)
+
+
+class ThreadRunCoordinatorTest(SimpleTestCase):
+    def test_messages_during_an_active_run_share_one_follow_up_run(self):
+        started = []
+
+        async def run():
+            release_first = asyncio.Event()
+
+            async def start_run(thread_id, message, role="intake", user_data=None):
+                started.append(message)
+                first = len(started) == 1
+
+                async def _gen():
+                    if first:
+                        await release_first.wait()
+                    yield StreamEvent.chunk(f"re:{message}")
+                    yield StreamEvent.done("completed")
+                return _gen()
+
+            coordinator = ThreadRunCoordinator()
+            first = await coordinator.submit("thread_1", "hello", start_run=start_run)
+            second = await coordinator.submit("thread_1", "also", start_run=start_run)
+            third = await coordinator.submit("thread_1", "and this", start_run=start_run)
+
+            async def collect(subscription):
+                return [chunk.to_dict() async for chunk in subscription.chunks]
+
+            release_first.set()
+            outputs = await asyncio.gather(collect(first), collect(second), collect(third))
+            await asyncio.sleep(0)
+            return coordinator, (first, second, third), outputs
+
+        coordinator, subs, outputs = asyncio.run(run())
+        self.assertEqual(started, ["hello", "also\n\nand this"])
+        self.assertEqual([sub.is_owner for sub in subs], [True, True, False])
+        self.assertEqual(outputs[0][0]["content"], "re:hello")
+        self.assertEqual(outputs[1], outputs[2])
+        self.assertEqual(outputs[1][0]["content"], "re:also\n\nand this")
+        stats = coordinator.stats()
+        self.assertEqual(
+            {key: stats[key] for key in ("runs", "follow_up_runs", "coalesced_messages", "active_threads")},
+            {"runs": 2, "follow_up_runs": 1, "coalesced_messages": 2, "active_threads": 0},
+        )
+
+    def test_ring_buffer_replays_after_an_event_id(self):
+        async def run():
+            broadcast = RunBroadcast("thread_1", capacity=3)
+            for i in range(5):
+                broadcast.publish(StreamEvent.chunk(str(i)))
+            broadcast.close()
+            replay = [(e.id, e.content) async for e in broadcast.subscribe(after=2)]
+            evicted = [e.to_dict() async for e in broadcast.subscribe()]
+            return broadcast, replay, evicted
+
+        broadcast, replay, evicted = asyncio.run(run())
+        self.assertEqual(replay, [(3, "2"), (4, "3"), (5, "4")])
+        self.assertEqual(evicted, [{"type": "error", "content": STREAM_GAP_MESSAGE}])
+        self.assertTrue(broadcast.can_resume_after(2))
+        self.assertTrue(broadcast.can_resume_after(5))
+        self.assertFalse(broadcast.can_resume_after(1))
+        self.assertFalse(broadcast.can_resume_after(6))
+
+    def test_resume_endpoint_replays_missed_frames_then_live_tail(self):
+        async def run():
+            release = asyncio.Event()
+
+            async def start_run(thread_id, message, role="intake", user_data=None):
+                async def _gen():
+                    yield StreamEvent.chunk("Pole sana. ")
+                    yield StreamEvent.chunk("Rest ")
+                    await release.wait()
+                    yield StreamEvent.chunk("and drink water.")
+                    yield StreamEvent.done("completed")
+                return _gen()
+
+            subscription = await get_run_coordinator().submit("thread_r", "hi", start_run=start_run)
+            # The client saw the first event, then its connection dropped.
+            first = await subscription.chunks.__anext__()
+            await subscription.chunks.aclose()
+
+            url = f"/api/chat/stream/{subscription.stream_id}/?thread_id=thread_r&window_ms=0"
+            self.assertEqual((await self.async_client.get(url.replace("thread_r", "other"))).status_code, 404)
+            response = await self.async_client.get(url, headers={"Last-Event-ID": str(first.id)})
+            release.set()
+            body = b"".join([chunk async for chunk in response.streaming_content])
+            frames = [json.loads(frame) for frame in body.split(b"\n\n") if frame]
+            return subscription.stream_id, response, frames
+
+        stream_id, response, frames = asyncio.run(run())
+        self.assertEqual(response["X-Stream-Id"], stream_id)
+        self.assertEqual([f.get("content") for f in frames], ["Rest ", "and drink water.", None])
+        self.assertEqual([f["id"] for f in frames], [2, 3, 4])
+        self.assertEqual(frames[-1]["type"], "done")
+
+    def test_run_without_listeners_is_cancelled_after_grace(self):
+        cancelled = []
+
+        async def run():
+            never = asyncio.Event()
+
+            async def start_run(thread_id, message, role="intake", user_data=None):
+                async def _gen():
+                    try:
+                        yield StreamEvent.chunk(f"re:{message}")
+                        if message == "first":
+                            await never.wait()
+                        yield StreamEvent.done("completed")
+                    except asyncio.CancelledError:
+                        cancelled.append(message)
+                        raise
+                return _gen()
+
+            coordinator = ThreadRunCoordinator(abandon_grace=0.05)
+            first = await coordinator.submit("thread_a", "first", start_run=start_run)
+            await first.chunks.__anext__()
+            queued = await coordinator.submit("thread_a", "queued", start_run=start_run)
+            # Every client of the first run goes away; the queued one keeps listening.
+            await first.chunks.aclose()
+            tail = [event.to_dict() async for event in first.stream.subscribe(after=1, listener=False)]
+            follow_up = [event.to_dict() async for event in queued.chunks]
+            return coordinator.stats(), tail, follow_up
+
+        stats, tail, follow_up = asyncio.run(run())
+        self.assertEqual(cancelled, ["first"])
+        self.assertEqual(tail, [{"type": "done", "run_status": "cancelled", "id": 2}])
+        self.assertEqual([e["type"] for e in follow_up], ["chunk", "done"])
+        self.assertEqual(stats["abandoned_runs"], 1)
+
+    def test_start_errors_propagate_and_release_the_thread(self):
+        async def failing(thread_id, message, role="intake", user_data=None):
+            raise RuntimeError("Thread not found")
+
+        async def run():
+            coordinator = ThreadRunCoordinator()
+            with self.assertRaises(RuntimeError):
+                await coordinator.submit("thread_1", "hi", start_run=failing)
+            return coordinator.is_active("thread_1")
+
+        self.assertFalse(asyncio.run(run()))
+
+
+class CircuitBreakerTest(SimpleTestCase):
+    def test_opens_on_error_rate_and_recovers_through_half_open_trial(self):
+        breaker = CircuitBreaker("get_run", failure_rate=0.5, min_calls=4, window_seconds=60,
+                                 open_seconds=0.05, slow_call_seconds=10)
+        for failed in (False, True, False, True):
+            breaker.before_call()
+            breaker.record(0.01, RuntimeError("503") if failed else None)
+        self.assertEqual(breaker.state, "open")
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+
+        time.sleep(0.06)
+        breaker.before_call()  # the single half-open trial
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+        breaker.record(0.01)
+        self.assertEqual(breaker.state, "closed")
+
+    def test_slow_calls_count_as_failures_but_client_errors_do_not(self):
+        from azure.core.exceptions import ResourceNotFoundError
+
+        breaker = CircuitBreaker("create_message", failure_rate=0.5, min_calls=2, slow_call_seconds=1)
+        not_found = ResourceNotFoundError("missing")
+        not_found.status_code = 404
+        breaker.record(0.01, not_found)
+        breaker.record(0.01, not_found)
+        self.assertEqual(breaker.state, "closed")
+        breaker.record(5.0)
+        breaker.record(5.0)
+        self.assertEqual(breaker.state, "open")
+
+    def test_cancelled_calls_do_not_trip_the_breaker(self):
+        registry = BreakerRegistry(failure_rate=0.5, min_calls=2, open_seconds=0.05, slow_call_seconds=10)
+        breaker = registry.get("create_message")
+
+        class _Hanging:
+            async def create_message(self, **kwargs):
+                await asyncio.sleep(10)
+
+        ops = ResilientAgentOperations(_Hanging(), registry=registry, hedging=HedgePolicy(operations=()), is_async=True)
+
+        async def cancel_calls(count):
+            for _ in range(count):
+                task = asyncio.ensure_future(ops.create_message(thread_id="t"))
+                await asyncio.sleep(0)
+                task.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await task
+
+        asyncio.run(cancel_calls(4))
+        self.assertEqual(breaker.state, "closed")
+        self.assertFalse(is_service_failure(asyncio.CancelledError()))
+
+        # A cancelled half-open trial hands its slot to the next caller.
+        breaker.record(0.01, RuntimeError("503"))
+        breaker.record(0.01, RuntimeError("503"))
+        time.sleep(0.06)
+        asyncio.run(cancel_calls(1))
+        self.assertEqual(breaker.state, "half_open")
+        breaker.before_call()
+        self.assertEqual(breaker.snapshot()["abandoned"], 5)
+
+
+class HedgedRequestTest(SimpleTestCase):
+    def _ops(self, agents, is_async=False):
+        registry = BreakerRegistry(slow_call_seconds=10)
+        policy = HedgePolicy(operations={"get_run"}, percentile=0.5, min_delay=0.02, min_samples=1)
+        registry.get("get_run").record(0.01)
+        return registry, ResilientAgentOperations(agents, registry, policy, is_async=is_async)
+
+    def test_sync_hedge_returns_the_faster_duplicate(self):
+        calls = []
+
+        class _Agents:
+            def get_run(self, **kwargs):
+                calls.append(kwargs)
+                time.sleep(0.5 if len(calls) == 1 else 0)
+                return f"run-{len(calls)}"
+
+        registry, ops = self._ops(_Agents())
+        self.assertEqual(ops.get_run(thread_id="t", run_id="r"), "run-2")
+        self.assertEqual((registry.hedges, registry.hedge_wins), (1, 1))
+
+    def test_async_hedge_cancels_the_loser(self):
+        cancelled = []
+
+        class _Agents:
+            def __init__(self):
+                self.calls = 0
+
+            async def get_run(self, **kwargs):
+                self.calls += 1
+                try:
+                    await asyncio.sleep(1 if self.calls == 1 else 0)
+                except asyncio.CancelledError:
+                    cancelled.append(True)
+                    raise
+                return f"run-{self.calls}"
+
+        registry, ops = self._ops(_Agents(), is_async=True)
+        self.assertEqual(asyncio.run(ops.get_run(thread_id="t", run_id="r")), "run-2")
+        self.assertEqual(cancelled, [True])
+
+
+@override_settings(AZURE_AI_AGENT_BACKEND="fake", AZURE_AGENT_CIRCUIT_BREAKER_ENABLED=False)
+class FakeAgentBackendTest(SimpleTestCase):
+    def _core(self, **overrides):
+        config = dict(tokens_per_second=1000, time_to_first_token=0, reply_tokens=5, operation_latency=0, seed=7)
+        config.update(overrides)
+        return get_fake_core(FakeAgentConfig(**config))
+
+    def test_async_stream_runs_tool_and_handoff_paths(self):
+        core = self._core(handoff_rate=1.0, tool_call_rate=1.0,
+                          tool_calls=[{"name": "no_such_tool", "arguments": {"thread": "{thread_id}"}}])
+
+        async def run():
+            client = AsyncAzureAgentClient()
+            thread_id = await client.async_create_thread()
+            generator = await client.async_send_message_stream(thread_id, "[Context: session_id=42]\nchest pain")
+            return [chunk.to_dict() async for chunk in generator]
+
+        frames = asyncio.run(run())
+        text = "".join(frame.get("content", "") for frame in frames)
+        self.assertEqual(frames[-1]["type"], "done")
+        self.assertIn("Transferring you to the analysis specialist", text)
+        self.assertEqual(text.count("Thank you for sharing that."), 2)
+        self.assertEqual(core.calls["submit_tool_outputs_to_stream"], 1)
+
+    def test_abandoned_async_stream_cancels_the_azure_run(self):
+        core = self._core(tokens_per_second=20, reply_tokens=200)
+
+        async def run():
+            client = AsyncAzureAgentClient()
+            thread_id = await client.async_create_thread()
+            generator = await client.async_send_message_stream(thread_id, "headache")
+
+            async def consume():
+                async for _ in generator:
+                    pass
+
+            task = asyncio.ensure_future(consume())
+            await asyncio.sleep(0.2)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(run())
+        # The fake settles an unread run itself, so only the request is checked.
+        self.assertEqual(core.calls["cancel_run"], 1)
+
+    def test_sync_send_message_polls_to_completion(self):
+        self._core()
+        client = AzureAgentClient()
+        response = client.send_message(client.create_thread(), "hello")
+        self.assertEqual(response["run_status"], "completed")
+        self.assertEqual(response["content"], "Thank you for sharing that.")
+
+    def test_fault_injection_and_active_run_conflicts(self):
+        from azure.core.exceptions import HttpResponseError
+
+        core = self._core(error_rate=1.0, fault_operations=["create_thread"], tool_call_rate=1.0,
+                          tool_calls=[{"name": "get_doctor_availability", "arguments": {}}])
+        client = AzureAgentClient()
+        with self.assertRaises(HttpResponseError) as raised:
+            client.create_thread()
+        self.assertEqual(raised.exception.status_code, 503)
+
+        thread_id = core.create_thread()
+        run = core.start_run(thread_id, None)
+        time.sleep(0.001)
+        self.assertEqual(core.get_run(thread_id, run["id"])["status"], "requires_action")
+        with self.assertRaisesMessage(HttpResponseError, "while a run"):
+            client.agent_ops.create_message(thread_id=thread_id, role="user", content="again")
+
+
+@override_settings(AZURE_AI_AGENT_BACKEND="fake", AZURE_AGENT_CIRCUIT_BREAKER_ENABLED=False)
+class ChatStreamPipelineTest(TransactionTestCase):
+    """Lookups and the patient-message write run on worker threads, so rows must be committed."""
+
+    def test_patient_message_saved_before_agent_reply(self):
+        from unittest import mock
+
+        from .models import ChatMessage, Patient, TriageSession
+
+        thread_id = get_fake_core(FakeAgentConfig(
+            tokens_per_second=1000, time_to_first_token=0, reply_tokens=5, operation_latency=0, seed=7,
+        )).create_thread()
+        patient = Patient.objects.create(user=User.objects.create_user("stream-patient"), first_name="Amina")
+        session = TriageSession.objects.create(patient=patient, thread_id=thread_id)
+
+        async def post():
+            response = await self.async_client.post(
+                "/api/chat/stream/",
+                data=json.dumps({"message": "I feel dizzy", "thread_id": thread_id}),
+                content_type="application/json",
+            )
+            body = b"".join([chunk async for chunk in response.streaming_content])
+            # The reply is saved by a background subscriber to the run.
+            await asyncio.gather(*views._reply_tasks)
+            return body
+
+        with mock.patch("triage.views.schedule_summary"):
+            body = asyncio.run(post())
+
+        self.assertIn(b'"type":"done"', body.replace(b" ", b""))
+        transcript = list(ChatMessage.objects.filter(session=session).order_by("id").values_list("role", "content"))
+        self.assertEqual([role for role, _ in transcript], ["patient", "agent"])
+        self.assertEqual(transcript[0][1], "I feel dizzy")
+        self.assertEqual(transcript[1][1].strip(), "Thank you for sharing that.")
+
+    def test_stale_thread_retry_reports_the_new_thread_for_resume(self):
+        from unittest import mock
+
+        async def start_run(thread_id, message, role="intake", user_data=None):
+            if thread_id == "thread_stale":
+                raise RuntimeError("No thread found with id 'thread_stale'")
+
+            async def _gen():
+                yield StreamEvent.chunk("Karibu.")
+                yield StreamEvent.done("completed")
+            return _gen()
+
+        async def create_thread():
+            return "thread_fresh"
+
+        async def post_then_resume():
+            response = await self.async_client.post(
+                "/api/chat/stream/",
+                data=json.dumps({"message": "hello", "thread_id": "thread_stale"}),
+                content_type="application/json",
+            )
+            b"".join([chunk async for chunk in response.streaming_content])
+            # Streams stay resumable for a grace period after their run ends.
+            resume_url = f"/api/chat/stream/{response['X-Stream-Id']}/?thread_id={response['X-Thread-Id']}"
+            resumed = await self.async_client.get(resume_url, headers={"Last-Event-ID": "1"})
+            return response, resumed, b"".join([chunk async for chunk in resumed.streaming_content])
+
+        with mock.patch("triage.views.async_send_message_stream", start_run), \
+                mock.patch("triage.views.async_create_thread", create_thread):
+            response, resumed, replay = asyncio.run(post_then_resume())
+
+        self.assertEqual(response["X-Thread-Id"], "thread_fresh")
+        self.assertEqual(resumed.status_code, 200)
+        self.assertIn(b'"type":"done"', replay.replace(b" ", b""))
+
+
+class DoctorAvailabilityCacheTest(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+
+        cache.delete(availability.VERSION_CACHE_KEY)
+        availability._availability = DoctorAvailabilityCache(check_interval=0)
+        self.cardio = Doctor.objects.create(
+            user=User.objects.create_user("amina", last_name="Otieno"), specialty="Cardiology",
+        )
+        Doctor.objects.create(user=User.objects.create_user("baraka", last_name="Mwangi"), specialty="Pediatric Cardiology")
+        Doctor.objects.create(
+            user=User.objects.create_user("chege", last_name="Kamau"), specialty="General", is_available=False,
+        )
+
+    def tearDown(self):
+        availability._availability = None
+
+    def test_specialty_filter_served_from_snapshot(self):
+        cache = get_availability_cache()
+        self.assertEqual([d["name"] for d in cache.find("cardio")], ["Dr. Otieno", "Dr. Mwangi"])
+        with self.assertNumQueries(0):
+            self.assertEqual([d["specialty"] for d in cache.find("PEDIATRIC")], ["Pediatric Cardiology"])
+            self.assertEqual(len(cache.find()), 2)
+            self.assertEqual(cache.find("general"), [])
+        self.assertEqual(cache.stats()["rebuilds"], 1)
+
+    def test_doctor_and_user_changes_invalidate(self):
+        cache = get_availability_cache()
+        cache.find()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cardio.is_available = False
+            self.cardio.save()
+        self.assertEqual([d["name"] for d in cache.find()], ["Dr. Mwangi"])
+
+        user = User.objects.get(username="baraka")
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save(update_fields=["last_login"])
+        self.assertEqual(cache.stats()["rebuilds"], 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            user.last_name = "Njoroge"
+            user.save()
+        self.assertEqual([d["name"] for d in cache.find()], ["Dr. Njoroge"])
+        self.assertEqual(cache.stats()["rebuilds"], 3)
+
+    def test_version_bump_from_another_worker_is_detected(self):
+        worker = DoctorAvailabilityCache(check_interval=0)
+        worker.find()
+        Doctor.objects.filter(pk=self.cardio.pk).update(specialty="Neurology")
+        self.assertEqual(worker.find("neuro"), [])
+
+        availability._bump_version()
+        self.assertEqual([d["name"] for d in worker.find("neuro")], ["Dr. Otieno"])
+
+
+class DoctorStatsTest(TestCase):
+    def setUp(self):
+        from datetime import timedelta
+
+        from django.utils import timezone
+
+        from .models import Patient
+
+        patient = Patient.objects.create(first_name="Wanjiru")
+        now = timezone.now()
+        for status, urgency, waited in [
+            ('PENDING', 5, 10), ('PENDING', 2, 30), ('IN_PROGRESS', 4, 60),
+            ('IN_PROGRESS', 1, 5), ('COMPLETED', 5, 90),
+        ]:
+            session = TriageSession.objects.create(patient=patient, status=status, urgency_score=urgency)
+            TriageSession.objects.filter(pk=session.pk).update(created_at=now - timedelta(minutes=waited))
+
+    def test_doctor_stats_in_one_query(self):
+        with self.assertNumQueries(1):
+            stats = views.get_doctor_stats()
+        self.assertEqual(stats, {
+            'active_sessions': 2,
+            'critical_cases': 2,
+            'pending_cases': 2,
+            'avg_wait_time': 20,
+        })
+
+    def test_avg_wait_is_zero_without_pending_cases(self):
+        TriageSession.objects.filter(status='PENDING').update(status='COMPLETED')
+        self.assertEqual(views.get_doctor_stats()['avg_wait_time'], 0)
+
+
+# No time buckets, so a window boundary cannot change the ETag mid-test.
+@override_settings(DOCTOR_QUEUE_MAX_AGE_SECONDS=0)
+class DoctorQueueCacheTest(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+
+        from .models import Patient
+
+        cache.clear()
+        self.session = TriageSession.objects.create(
+            patient=Patient.objects.create(first_name="Akinyi"), urgency_score=4, ai_summary="Chest pain.",
+        )
+
+    def test_unchanged_queue_is_shared_and_not_modified(self):
+        first = self.client.get('/doctor/queue/')
+        self.assertEqual(first.status_code, 200)
+        self.assertIn(b"Akinyi", first.content)
+        self.assertNotIn(b"csrfmiddlewaretoken", first.content)
+        etag = first['ETag']
+
+        with self.assertNumQueries(0):
+            again = self.client.get('/doctor/queue/')
+            unchanged = self.client.get('/doctor/queue/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(again.content, first.content)
+        self.assertEqual(unchanged.status_code, 304)
+        self.assertEqual(unchanged.content, b"")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.session.agent_logs += "\n[Agent] note"
+            self.session.save(update_fields=['agent_logs'])
+        self.assertEqual(self.client.get('/doctor/queue/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        stats = get_queue_fragment_cache().stats()
+        self.assertGreaterEqual(stats["not_modified"], 2)
+
+    def test_session_change_bumps_the_version(self):
+        etag = self.client.get('/doctor/queue/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.session.status = 'IN_PROGRESS'
+            self.session.save()
+        changed = self.client.get('/doctor/queue/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], etag)
+        self.assertIn(b"In\n            Progress", changed.content)
+
+
+class QueueEventBusTest(SimpleTestCase):
+    def test_burst_is_debounced_and_rendered_once(self):
+        bus = QueueEventBus(debounce=0.05)
+        builds = []
+
+        async def build(change):
+            builds.append(change)
+            return sorted(change.session_ids)
+
+        async def run():
+            first, second = bus.subscribe(), bus.subscribe()
+            # on_commit callbacks publish from whichever thread saved.
+            await asyncio.to_thread(bus.publish, {"session_id": 1})
+            bus.publish({"session_id": 2})
+            bus.publish({"patient_id": 9})
+            changes = [await first.get(timeout=1), await second.get(timeout=1)]
+            self.assertIs(changes[0], changes[1])
+            self.assertEqual(changes[0].patient_ids, {9})
+            rendered = [await change.render(build) for change in changes]
+            self.assertIsNone(await first.get(timeout=0.1))
+            first.close()
+            second.close()
+            return rendered
+
+        self.assertEqual(asyncio.run(run()), [[1, 2], [1, 2]])
+        self.assertEqual(len(builds), 1)
+
+    def test_stalled_subscriber_is_told_to_resync(self):
+        async def run():
+            subscription = QueueEventBus(debounce=0).subscribe()
+            for session_id in range(200):
+                subscription.deliver(QueueChange(session_ids=frozenset({session_id})))
+            change = await subscription.get(timeout=1)
+            return change, await subscription.get(timeout=0.05)
+
+        change, after = asyncio.run(run())
+        self.assertTrue(change.resync)
+        self.assertIsNone(after)
+
+
+@override_settings(QUEUE_EVENTS_DEBOUNCE_SECONDS=0.01)
+class DoctorQueueEventsTest(TransactionTestCase):
+    def setUp(self):
+        events._bus = None
+
+    def tearDown(self):
+        events._bus = None
+
+    def test_session_change_is_pushed_as_its_row(self):
+        from .models import Patient
+
+        patient = Patient.objects.create(first_name="Njeri")
+        waiting = TriageSession.objects.create(patient=patient, urgency_score=2)
+
+        async def run():
+            response = await self.async_client.get("/doctor/queue/events/")
+            frames = aiter(response.streaming_content)
+            self.assertEqual(await anext(frames), b"retry: 3000\n\n")
+            pushed = asyncio.ensure_future(anext(frames))
+            await asyncio.sleep(0.05)  # let the view subscribe
+            critical = await TriageSession.objects.acreate(patient=patient, urgency_score=5)
+            frame = await asyncio.wait_for(pushed, 5)
+            await frames.aclose()
+            return critical.id, frame.decode()
+
+        critical_id, frame = asyncio.run(run())
+        self.assertTrue(frame.startswith("event: queue\ndata: "))
+        update = json.loads(frame.split("data: ", 1)[1])
+        self.assertEqual(update["order"], [critical_id, waiting.id])
+        self.assertEqual(list(update["rows"]), [str(critical_id)])
+        self.assertIn(f'id="session-row-{critical_id}"', update["rows"][str(critical_id)])
+        self.assertEqual(update["badge"], 2)
@@ -0,0 +1,194 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+# ---------------------------------------------------------------------------
+# Pre-warmed agent thread pool
+# ---------------------------------------------------------------------------
+
+class AgentThreadPool:
+    """
+    Keep a stock of empty Azure agent threads ready for new conversations.
+
+    Checkout pops from a deque in O(1). Whenever the stock drops below the
+    low watermark a single background thread tops it back up to the high
+    watermark, so intake pages and consultations never wait on Foundry's
+    create_thread (and its retry/backoff) in the request path. Threads that
+    sit unused longer than ``max_idle_seconds`` are discarded and deleted on
+    the service from a background thread, best effort.
+    """
+
+    def __init__(
+        self,
+        create: Callable[[], str] | None = None,
+        delete: Callable[[str], None] | None = None,
+        low_watermark: int | None = None,
+        high_watermark: int | None = None,
+        max_idle_seconds: float | None = None,
+    ) -> None:
+        self._create = create
+        self._delete = delete
+        self.low_watermark = (
+            low_watermark if low_watermark is not None
+            else getattr(settings, 'AGENT_THREAD_POOL_LOW_WATERMARK', 2)
+        )
+        self.high_watermark = max(
+            self.low_watermark,
+            high_watermark if high_watermark is not None
+            else getattr(settings, 'AGENT_THREAD_POOL_HIGH_WATERMARK', 8),
+        )
+        self.max_idle_seconds = (
+            max_idle_seconds if max_idle_seconds is not None
+            else getattr(settings, 'AGENT_THREAD_POOL_MAX_IDLE_SECONDS', 30 * 60)
+        )
+
+        self._threads: deque = deque()
+        self._lock = threading.Lock()
+        self._refilling = False
+        self._stats = {"hits": 0, "misses": 0, "created": 0, "expired": 0, "deleted": 0, "errors": 0}
+
+    def _create_thread(self) -> str:
+        if self._create is None:
+            from .services import create_thread
+            self._create = create_thread
+        return self._create()
+
+    def _delete_thread(self, thread_id: str) -> None:
+        if self._delete is None:
+            from .services import delete_thread
+            self._delete = delete_thread
+        self._delete(thread_id)
+
+    def _expire_locked(self, now: float) -> list:
+        """Drop idle threads from the stock and return their IDs for deletion."""
+        expired = []
+        # Oldest threads sit at the left, so expiry stops at the first fresh one.
+        while self._threads and now - self._threads[0][1] > self.max_idle_seconds:
+            expired.append(self._threads.popleft()[0])
+            self._stats["expired"] += 1
+        return expired
+
+    def _delete_async(self, thread_ids: list) -> None:
+        """Delete expired threads on the service without holding up the caller."""
+        if thread_ids:
+            threading.Thread(
+                target=self._delete_expired, args=(thread_ids,),
+                name="agent-thread-pool-cleanup", daemon=True,
+            ).start()
+
+    def _delete_expired(self, thread_ids: list) -> None:
+        for thread_id in thread_ids:
+            try:
+                self._delete_thread(thread_id)
+            except Exception as exc:
+                # Left behind on the service; nothing here will use it again.
+                logger.warning("Could not delete expired agent thread %s: %s", thread_id, exc)
+                with self._lock:
+                    self._stats["errors"] += 1
+                continue
+            with self._lock:
+                self._stats["deleted"] += 1
+
+    def __len__(self) -> int:
+        return len(self._threads)
+
+    # ------------------------------------------------------------------
+    # Checkout
+    # ------------------------------------------------------------------
+
+    def checkout(self) -> str | None:
+        """Return a pre-created thread ID, or None if the pool is empty."""
+        with self._lock:
+            expired = self._expire_locked(time.monotonic())
+            thread_id = self._threads.popleft()[0] if self._threads else None
+            self._stats["hits" if thread_id else "misses"] += 1
+            needs_refill = len(self._threads) < self.low_watermark
+        self._delete_async(expired)
+        if needs_refill:
+            self.refill_async()
+        return thread_id
+
+    def acquire(self) -> str:
+        """Return a pooled thread ID, creating one inline only if the pool is dry."""
+        thread_id = self.checkout()
+        if thread_id is None:
+            thread_id = self._create_thread()
+        return thread_id
+
+    # ------------------------------------------------------------------
+    # Refill
+    # ------------------------------------------------------------------
+
+    def refill_async(self) -> None:
+        """Start a background refill unless one is already running."""
+        with self._lock:
+            if self._refilling:
+                return
+            self._refilling = True
+        threading.Thread(target=self._refill, name="agent-thread-pool-refill", daemon=True).start()
+
+    def _refill(self) -> None:
+        try:
+            # Bounded so a very short idle TTL can never turn this into a spin.
+            for _ in range(self.high_watermark):
+                with self._lock:
+                    expired = self._expire_locked(time.monotonic())
+                    full = len(self._threads) >= self.high_watermark
+                self._delete_async(expired)
+                if full:
+                    return
+                try:
+                    thread_id = self._create_thread()
+                except Exception:
+                    logger.exception("Agent thread pool refill failed")
+                    with self._lock:
+                        self._stats["errors"] += 1
+                    return
+                with self._lock:
+                    self._threads.append((thread_id, time.monotonic()))
+                    self._stats["created"] += 1
+        finally:
+            with self._lock:
+                self._refilling = False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._stats,
+                "available": len(self._threads),
+                "low_watermark": self.low_watermark,
+                "high_watermark": self.high_watermark,
+                "refilling": self._refilling,
+            }
+
+
+# ---------------------------------------------------------------------------
+# Module-level API
+# ---------------------------------------------------------------------------
+
+_pool: AgentThreadPool | None = None
+_pool_lock = threading.Lock()
+
+
+def get_thread_pool() -> AgentThreadPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = AgentThreadPool()
+    return _pool
+
+
+def checkout_thread() -> str:
+    """Take a fresh agent thread ID, from the pool when it is enabled."""
+    if not getattr(settings, 'AGENT_THREAD_POOL_ENABLED', True):
+        from .services import create_thread
+        return create_thread()
+    return get_thread_pool().acquire()
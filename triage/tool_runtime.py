@@ -0,0 +1,283 @@
+import asyncio
+import concurrent.futures
+import json
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+ToolExecutor = Callable[[Any], Awaitable[dict]]
+
+# Number of recent latencies kept per tool for percentile metrics.
+_LATENCY_WINDOW = 256
+
+# Slack on top of the slowest tool's timeout before a waiting caller gives up on a batch.
+BATCH_GRACE_SECONDS = 5.0
+
+
+def _error_output(tool_call, message: str) -> dict:
+    return {"tool_call_id": tool_call.id, "output": json.dumps({"error": message})}
+
+
+# ---------------------------------------------------------------------------
+# Per-tool statistics
+# ---------------------------------------------------------------------------
+
+class _ToolStats:
+    __slots__ = ("calls", "errors", "timeouts", "latencies")
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.latencies: deque = deque(maxlen=_LATENCY_WINDOW)
+
+    def snapshot(self) -> dict:
+        ordered = sorted(self.latencies)
+
+        def pct(p: float) -> float | None:
+            if not ordered:
+                return None
+            return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 4)
+
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "latency_p50": pct(0.50),
+            "latency_p95": pct(0.95),
+            "latency_max": round(ordered[-1], 4) if ordered else None,
+        }
+
+
+# ---------------------------------------------------------------------------
+# Tool runtime
+# ---------------------------------------------------------------------------
+
+class ToolRuntime:
+    """
+    One long-lived event loop thread that executes agent tool calls.
+
+    Callers submit batches with run_coroutine_threadsafe instead of building
+    a fresh executor, loop and thread for every requires_action round trip.
+    Each tool gets its own timeout (MCP_TOOL_TIMEOUTS) and concurrency cap
+    (MCP_TOOL_CONCURRENCY). An executor signals failure by raising; the
+    runtime reports it to the agent as an ``{"error": ...}`` output. If the
+    loop thread ever dies it is restarted on the next submission.
+    """
+
+    def __init__(
+        self,
+        timeouts: Dict[str, float] | None = None,
+        default_timeout: float | None = None,
+        concurrency: Dict[str, int] | None = None,
+        default_concurrency: int | None = None,
+    ) -> None:
+        self.timeouts = dict(
+            timeouts if timeouts is not None else getattr(settings, 'MCP_TOOL_TIMEOUTS', {})
+        )
+        self.default_timeout = (
+            default_timeout if default_timeout is not None
+            else getattr(settings, 'MCP_TOOL_DEFAULT_TIMEOUT_SECONDS', 60)
+        )
+        self.concurrency = dict(
+            concurrency if concurrency is not None else getattr(settings, 'MCP_TOOL_CONCURRENCY', {})
+        )
+        self.default_concurrency = (
+            default_concurrency if default_concurrency is not None
+            else getattr(settings, 'MCP_TOOL_DEFAULT_CONCURRENCY', 16)
+        )
+
+        self._lock = threading.Lock()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._stats: Dict[str, _ToolStats] = {}
+        self._queued = 0
+        self._running = 0
+        self._restarts = 0
+
+    # ------------------------------------------------------------------
+    # Loop lifecycle
+    # ------------------------------------------------------------------
+
+    def _run_loop(self, loop: asyncio.AbstractEventLoop) -> None:
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_forever()
+        except Exception:
+            logger.exception("Tool runtime loop crashed")
+        finally:
+            loop.close()
+
+    def _ensure_running(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._loop is not None:
+                return self._loop
+            if self._thread is not None:
+                self._restarts += 1
+                logger.warning("Tool runtime loop thread is not running; restarting it")
+
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(
+                target=self._run_loop, args=(loop,), name="tool-runtime", daemon=True
+            )
+            # Semaphores belong to the loop that created them.
+            self._semaphores = {}
+            self._loop, self._thread = loop, thread
+            thread.start()
+            return loop
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+        if loop is not None and thread is not None and thread.is_alive():
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(timeout)
+
+    # ------------------------------------------------------------------
+    # Execution
+    # ------------------------------------------------------------------
+
+    def timeout_for(self, tool_name: str) -> float:
+        return self.timeouts.get(tool_name, self.default_timeout)
+
+    def _semaphore_for(self, tool_name: str) -> asyncio.Semaphore:
+        # Only touched from the runtime loop thread.
+        semaphore = self._semaphores.get(tool_name)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.concurrency.get(tool_name, self.default_concurrency))
+            self._semaphores[tool_name] = semaphore
+        return semaphore
+
+    def _stats_for(self, tool_name: str) -> _ToolStats:
+        stats = self._stats.get(tool_name)
+        if stats is None:
+            stats = self._stats.setdefault(tool_name, _ToolStats())
+        return stats
+
+    async def _execute_one(self, tool_call, executor: ToolExecutor) -> dict:
+        tool_name = tool_call.function.name
+        timeout = self.timeout_for(tool_name)
+        started = time.perf_counter()
+        dequeued = False
+        # Counted here rather than in submit(): a call cancelled before it
+        # starts (an abandoned batch) must not stay queued forever.
+        with self._lock:
+            self._queued += 1
+
+        async def _guarded():
+            nonlocal dequeued, started
+            async with self._semaphore_for(tool_name):
+                with self._lock:
+                    self._queued -= 1
+                    self._running += 1
+                dequeued = True
+                started = time.perf_counter()
+                try:
+                    return await executor(tool_call)
+                finally:
+                    with self._lock:
+                        self._running -= 1
+
+        failed = timed_out = False
+        try:
+            result = await asyncio.wait_for(_guarded(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Tool %s timed out after %ss", tool_name, timeout)
+            result = _error_output(tool_call, f"Tool {tool_name} timed out after {timeout}s")
+            failed = timed_out = True
+        except Exception as exc:
+            logger.exception("Tool %s raised an exception", tool_name)
+            result = _error_output(tool_call, str(exc))
+            failed = True
+        finally:
+            if not dequeued:
+                with self._lock:
+                    self._queued -= 1
+
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            stats = self._stats_for(tool_name)
+            stats.calls += 1
+            stats.errors += int(failed)
+            stats.timeouts += int(timed_out)
+            stats.latencies.append(elapsed)
+        return result
+
+    async def _execute_batch(self, tool_calls, executor: ToolExecutor) -> list:
+        return list(await asyncio.gather(*[self._execute_one(tc, executor) for tc in tool_calls]))
+
+    def submit(self, tool_calls, executor: ToolExecutor):
+        """Schedule a batch on the runtime loop and return a concurrent Future."""
+        tool_calls = list(tool_calls)
+        loop = self._ensure_running()
+        return asyncio.run_coroutine_threadsafe(self._execute_batch(tool_calls, executor), loop)
+
+    def batch_timeout(self, tool_calls) -> float:
+        """
+        Longest a batch can legitimately take: every call is bounded by its
+        own timeout, queueing for its semaphore included, so the slowest
+        tool plus a grace period for scheduling.
+        """
+        return max((self.timeout_for(tc.function.name) for tc in tool_calls), default=0) + BATCH_GRACE_SECONDS
+
+    def _abandon(self, future, tool_calls) -> list:
+        future.cancel()
+        logger.error("Tool batch did not finish within its timeout; is the runtime loop stuck?")
+        return [_error_output(tc, "Tool runtime did not respond") for tc in tool_calls]
+
+    def run_tool_calls(self, tool_calls, executor: ToolExecutor) -> list:
+        """Blocking entry point for sync code paths."""
+        tool_calls = list(tool_calls)
+        future = self.submit(tool_calls, executor)
+        try:
+            return future.result(timeout=self.batch_timeout(tool_calls))
+        except concurrent.futures.TimeoutError:
+            return self._abandon(future, tool_calls)
+
+    async def arun_tool_calls(self, tool_calls, executor: ToolExecutor) -> list:
+        """Await a batch from any other event loop."""
+        tool_calls = list(tool_calls)
+        future = self.submit(tool_calls, executor)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.batch_timeout(tool_calls))
+        except asyncio.TimeoutError:
+            return self._abandon(future, tool_calls)
+
+    # ------------------------------------------------------------------
+    # Metrics
+    # ------------------------------------------------------------------
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                "queue_depth": self._queued,
+                "in_flight": self._running,
+                "loop_alive": bool(self._thread and self._thread.is_alive()),
+                "restarts": self._restarts,
+                "tools": {name: stats.snapshot() for name, stats in self._stats.items()},
+            }
+
+
+# ---------------------------------------------------------------------------
+# Process-wide runtime
+# ---------------------------------------------------------------------------
+
+_runtime: ToolRuntime | None = None
+_runtime_lock = threading.Lock()
+
+
+def get_tool_runtime() -> ToolRuntime:
+    global _runtime
+    if _runtime is None:
+        with _runtime_lock:
+            if _runtime is None:
+                _runtime = ToolRuntime()
+    return _runtime
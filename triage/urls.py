@@ -22,11 +22,13 @@ urlpatterns = [
     path('intake/', views.patient_intake, name='patient_intake'),
     path('api/chat/', views.api_chat, name='api_chat'),
     path('api/chat/stream/', views.api_chat_stream, name='api_chat_stream'),
+    path('api/chat/stream/<str:stream_id>/', views.api_chat_stream_resume, name='api_chat_stream_resume'),
     path('api/chat/history/<str:thread_id>/', views.api_chat_history, name='api_chat_history'),
 
     # Doctor Command Center
     path('doctor/', views.doctor_dashboard, name='doctor_dashboard'),
     path('doctor/queue/', views.doctor_queue_updates, name='doctor_queue_updates'),
+    path('doctor/queue/events/', views.doctor_queue_events, name='doctor_queue_events'),
     path('doctor/action/<int:session_id>/', views.doctor_action, name='doctor_action'),
     path('doctor/toggle-availability/', views.toggle_availability, name='toggle_availability'),
     path('doctor/reassign/<int:session_id>/', views.reassign_session, name='reassign_session'),
@@ -37,6 +39,7 @@ urlpatterns = [
     # Admin Dashboard
     path('admin-dashboard/', views.admin_dashboard, name='admin_dashboard'),
     path('admin-dashboard/mcp-info/', views.mcp_server_info, name='mcp_server_info'),
+    path('admin-dashboard/metrics/', views.runtime_metrics, name='runtime_metrics'),
 
     # HTMX partials
     path('api/triage/updates/', views.triage_updates, name='triage_updates'),
@@ -1,12 +1,31 @@
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import HttpResponse, JsonResponse
-from django.views.decorators.http import require_POST
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET, require_POST
 from django.views.decorators.csrf import csrf_exempt
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.template.loader import render_to_string
+from django.utils.cache import get_conditional_response, patch_cache_control
 from asgiref.sync import sync_to_async
 from rest_framework import viewsets, permissions
 from .models import Patient, Doctor, TriageSession, ChatMessage
 from .serializers import PatientSerializer, DoctorSerializer, TriageSessionSerializer
+from .availability import get_availability_cache, invalidate_doctor_availability
+from .db import run_db
+from .events import format_sse, get_queue_event_bus
+from .queue_cache import current_queue_state, get_queue_fragment_cache
+from .run_coordinator import coordinator_stats, get_run_coordinator
+from .streaming import (
+    CoalescePolicy,
+    StreamEvent,
+    coalesce_frames,
+    encode_sse,
+    get_frame_stats,
+    iterate_in_thread,
+)
+from .summaries import schedule_summary
+from .thread_pool import checkout_thread, get_thread_pool
+import asyncio
 import json
 
 
@@ -72,13 +91,7 @@ def admin_dashboard(request):
     if not request.user.is_superuser:
         return redirect('dashboard')
         
-    stats = {
-        'total_patients': Patient.objects.count(),
-        'active_doctors': Doctor.objects.filter(is_available=True).count(),
-        'total_sessions': TriageSession.objects.count(),
-        'pending_triage': TriageSession.objects.filter(status='PENDING').count(),
-    }
-    
+    stats = get_admin_stats()
     recent_sessions = TriageSession.objects.select_related('patient', 'doctor').all()[:15]
     
     return render(request, 'triage/admin_dashboard.html', {
@@ -96,6 +109,33 @@ def mcp_server_info(request):
     return render(request, 'triage/mcp_info.html')
 
 
+@login_required
+def runtime_metrics(request):
+    """Expose in-process runtime counters as JSON (Admin only)."""
+    if not request.user.is_superuser:
+        return JsonResponse({'error': 'Forbidden'}, status=403)
+
+    from .consultations import get_consultation_cache
+    from .context_budget import get_context_budget_stats
+    from .resilience import get_breaker_registry
+    from .summaries import get_summarizer
+    from .tool_runtime import get_tool_runtime
+
+    return JsonResponse({
+        'tool_runtime': get_tool_runtime().metrics(),
+        'thread_pool': get_thread_pool().stats(),
+        'consultation_cache': get_consultation_cache().stats(),
+        'summarizer': get_summarizer().stats(),
+        'run_coordinator': coordinator_stats(),
+        'circuit_breakers': get_breaker_registry().snapshot(),
+        'sse_frames': get_frame_stats().stats(),
+        'doctor_availability': get_availability_cache().stats(),
+        'context_budget': get_context_budget_stats().stats(),
+        'doctor_queue': get_queue_fragment_cache().stats(),
+        'queue_events': get_queue_event_bus().stats(),
+    })
+
+
 def triage_updates(request):
     sessions = TriageSession.objects.select_related(
         'patient', 'doctor'
@@ -106,18 +146,26 @@ def triage_updates(request):
 
 
 import logging
-import threading
 
 try:
-    from .services import create_thread, send_message, send_message_stream, get_project_client
+    from .services import (
+        create_thread, send_message, send_message_stream, get_project_client,
+        async_create_thread, async_send_message_stream,
+    )
 except ImportError:
     # Fallback/mock if azure-ai-projects isn't ready
     def create_thread(): return "mock_thread_id"
     def send_message(tid, msg, role="intake"): return {"content": "Azure AI SDK not fully loaded. I am a mock agent.", "run_status": "completed"}
     def send_message_stream(tid, msg, role="intake"):
-        yield '{"type": "chunk", "content": "Azure AI SDK not fully loaded."}\n\n'
-        yield '{"type": "done", "run_status": "completed"}\n\n'
+        yield StreamEvent.chunk("Azure AI SDK not fully loaded.")
+        yield StreamEvent.done("completed")
     def get_project_client(): return None
+    async def async_create_thread(): return "mock_thread_id"
+    async def async_send_message_stream(tid, msg, role="intake", user_data=None):
+        async def _mock_gen():
+            for chunk in send_message_stream(tid, msg, role=role):
+                yield chunk
+        return _mock_gen()
 
 logger = logging.getLogger(__name__)
 
@@ -137,28 +185,6 @@ def _is_stale_thread_error(error_text: str) -> bool:
     return any(marker in lowered for marker in stale_markers)
 
 
-def _update_rolling_summary(session_id, thread_id):
-    """Fetch a concise AI summary and persist it on the TriageSession.
-
-    Intended to be called from a background daemon thread so it never blocks
-    the request/response cycle.
-    """
-    try:
-        sess = TriageSession.objects.get(id=session_id)
-        client = get_project_client()
-        if client is None:
-            return
-        summary_prompt = (
-            "Please provide a concise medical summary of the patient's symptoms "
-            "and state so far, ignoring pleasantries."
-        )
-        resp = client.send_message(thread_id, summary_prompt, role="analysis")
-        if resp and resp.get("content"):
-            sess.ai_summary = resp["content"]
-            sess.save()
-    except Exception:
-        logger.exception("Failed to auto-update rolling summary")
-
 # ──────────────────────────────────────────────
 # Patient Intake — Conversational UI
 # ──────────────────────────────────────────────
@@ -185,7 +211,7 @@ def patient_intake(request):
                 else:
                     # Update existing session with new thread_id
                     try:
-                        thread_id = create_thread()
+                        thread_id = checkout_thread()
                         latest_session.thread_id = thread_id
                         latest_session.save()
                         request.session['triage_thread_id'] = thread_id
@@ -210,7 +236,7 @@ def patient_intake(request):
     # 3. Create fresh thread and session if still not found
     if not thread_id:
         try:
-            thread_id = create_thread()
+            thread_id = checkout_thread()
         except Exception as e:
             logger.exception("Failed to create thread during patient intake")
             thread_id = None
@@ -297,18 +323,14 @@ def api_chat(request):
                 role = new_role
                 
         if session:
-            msg_count = ChatMessage.objects.filter(session=session).count()
-            if msg_count > 0 and msg_count % 5 == 0:
-                threading.Thread(
-                    target=_update_rolling_summary, args=(session.id, thread_id), daemon=True
-                ).start()
+            schedule_summary(session.id)
                 
     except Exception as e:
         error_str = str(e)
         if _is_stale_thread_error(error_str):
             try:
                 logger.warning("Stale or locked thread detected. Creating a new thread session...")
-                new_thread_id = create_thread()
+                new_thread_id = checkout_thread()
                 request.session['triage_thread_id'] = new_thread_id
                 
                 response_data = send_message(new_thread_id, context_msg, role="intake", user_data=user_data)
@@ -369,13 +391,100 @@ def _set_session_key(django_session, key, value):
     django_session[key] = value
 
 
+async def _load_user_data(request):
+    user = await request.auser()
+    return await run_db(_get_user_data, user)
+
+
+def _log_persist_failure(task):
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Failed to persist patient message", exc_info=task.exception())
+
+
+# Reply-persistence tasks, kept referenced until they finish.
+_reply_tasks: set = set()
+
+
+async def _relay_events(gen, policy):
+    """
+    Relay agent events to the client, merging text deltas per *policy*.
+
+    Async generators from the aio client are iterated directly on the
+    event loop; plain sync generators go through the thread bridge.
+    """
+    chunks = gen if hasattr(gen, '__aiter__') else iterate_in_thread(gen)
+    try:
+        async for event in coalesce_frames(chunks, policy):
+            yield event
+    except Exception as exc:
+        logger.exception("Error reading stream chunk: %s", exc)
+        yield StreamEvent.error(exc)
+
+
+async def _error_events(message):
+    yield StreamEvent.error(message)
+
+
+def _sse_response(events, stream_id=None, thread_id=None):
+    # Events are serialized exactly once, here at the edge.
+    response = StreamingHttpResponse(encode_sse(events), content_type='text/event-stream')
+    response['X-Accel-Buffering'] = 'no'
+    response['Cache-Control'] = 'no-cache'
+    if stream_id:
+        # Lets a client that loses the connection resume via api_chat_stream_resume.
+        response['X-Stream-Id'] = stream_id
+    if thread_id:
+        # The thread the stream runs on; differs from the request's after a stale-thread retry.
+        response['X-Thread-Id'] = thread_id
+    return response
+
+
+async def _persist_reply(events, session, patient_saved=None):
+    """
+    Save the agent's full reply once its run ends.
+
+    Reads its own subscription to the run, so the reply is stored even if
+    the client disconnected mid-stream. The patient message is awaited
+    first, keeping the transcript in order.
+    """
+    content_parts = []
+    async for event in events:
+        if event.type == 'chunk':
+            content_parts.append(event.content)
+        elif event.type == 'done' and (event.fields or {}).get('run_status') == 'cancelled':
+            # Abandoned by every client and cancelled mid-reply; nothing to keep.
+            return
+    full_content = "".join(content_parts)
+    if not full_content:
+        return
+    if patient_saved is not None:
+        await asyncio.wait([patient_saved])
+    try:
+        # Not thread-sensitive: this task outlives the request whose sync
+        # thread a thread-sensitive call would be bound to.
+        await run_db(ChatMessage.objects.create, session=session, role='agent', content=full_content)
+        schedule_summary(session.id)
+    except Exception:
+        logger.exception("Failed to persist agent stream response")
+
+
+def _schedule_reply_persistence(subscription, session, patient_saved=None):
+    task = asyncio.ensure_future(
+        _persist_reply(subscription.stream.subscribe(listener=False), session, patient_saved)
+    )
+    _reply_tasks.add(task)
+    task.add_done_callback(_reply_tasks.discard)
+
+
 @csrf_exempt
 @require_POST
 async def api_chat_stream(request):
-    """Receive a chat message and return a StreamingHttpResponse with SSE chunked data."""
-    import asyncio
-    from django.http import StreamingHttpResponse
+    """
+    Receive a chat message and return a StreamingHttpResponse with SSE chunked data.
 
+    The user and session lookups run concurrently, and the patient message is
+    saved while the agent run is being started rather than before it.
+    """
     try:
         data = json.loads(request.body)
     except json.JSONDecodeError:
@@ -383,13 +492,15 @@ async def api_chat_stream(request):
 
     user_message = data.get('message', '').strip()
     thread_id = data.get('thread_id')
+    coalesce_policy = CoalescePolicy.for_client(data.get('coalesce'))
 
     if not user_message or not thread_id:
         return JsonResponse({'error': 'Missing message or thread_id'}, status=400)
 
-    user = await request.auser()
-    is_authenticated, user_data = await sync_to_async(_get_user_data)(user)
-    session = await sync_to_async(_get_session_by_thread)(thread_id)
+    (is_authenticated, user_data), session = await asyncio.gather(
+        _load_user_data(request),
+        run_db(_get_session_by_thread, thread_id),
+    )
 
     role = "intake"
     session_id = None
@@ -401,94 +512,29 @@ async def api_chat_stream(request):
 
     context_msg = f"[Context: session_id={session_id}]\n{user_message}" if session_id else user_message
 
-    async def _async_stream(sync_gen, sess):
-        """
-        Consume a sync generator on one worker thread and yield SSE chunks
-        without blocking the event loop.
-        """
-        import queue as queue_module
-
-        chunk_queue = queue_module.Queue()
-        done_marker = object()
-        error_marker = object()
-
-        def _drain_generator():
-            try:
-                for chunk in sync_gen:
-                    chunk_queue.put(chunk)
-            except Exception as exc:
-                chunk_queue.put((error_marker, exc))
-            finally:
-                chunk_queue.put(done_marker)
-
-        loop = asyncio.get_running_loop()
-        drain_future = loop.run_in_executor(None, _drain_generator)
-
-        full_content = ""
+    patient_saved = None
 
-        while True:
-            try:
-                item = chunk_queue.get_nowait()
-            except queue_module.Empty:
-                await asyncio.sleep(0.01)
-                continue
-
-            if item is done_marker:
-                break
-
-            if isinstance(item, tuple) and len(item) == 2 and item[0] is error_marker:
-                _, exc = item
-                logger.exception("Error reading stream chunk: %s", exc)
-                yield json.dumps({"type": "error", "content": str(exc)}) + "\n\n"
-                break
-
-            chunk = item
-            try:
-                parsed = json.loads(chunk.strip())
-                if parsed.get('type') == 'chunk':
-                    full_content += parsed.get('content', '')
-            except Exception:
-                pass
-
-            yield chunk
-
-        await drain_future
-
-        if sess and full_content:
-            try:
-                await sync_to_async(ChatMessage.objects.create)(
-                    session=sess, role='agent', content=full_content
-                )
-                msg_count = await sync_to_async(
-                    lambda: ChatMessage.objects.filter(session=sess).count()
-                )()
-                if msg_count > 0 and msg_count % 5 == 0:
-                    threading.Thread(
-                        target=_update_rolling_summary, args=(sess.id, thread_id), daemon=True
-                    ).start()
-            except Exception:
-                logger.exception("Failed to persist agent stream response")
-
-    def _make_sse_response(gen, sess=None):
-        response = StreamingHttpResponse(
-            _async_stream(gen, sess),
-            content_type='text/event-stream',
+    def _respond(subscription, sess, run_thread_id):
+        if sess is not None and subscription.is_owner:
+            _schedule_reply_persistence(subscription, sess, patient_saved)
+        return _sse_response(
+            _relay_events(subscription.chunks, coalesce_policy), subscription.stream_id, run_thread_id
         )
-        response['X-Accel-Buffering'] = 'no'
-        response['Cache-Control'] = 'no-cache'
-        return response
 
-    def _single_error_event(message):
-        yield json.dumps({"type": "error", "content": message}) + "\n\n"
+    if session:
+        patient_saved = asyncio.create_task(run_db(
+            ChatMessage.objects.create, session=session, role='patient', content=user_message,
+        ))
+        patient_saved.add_done_callback(_log_persist_failure)
 
     try:
-        if session:
-            await sync_to_async(ChatMessage.objects.create)(
-                session=session, role='patient', content=user_message
-            )
-
-        generator = send_message_stream(thread_id, context_msg, role=role, user_data=user_data)
-        return _make_sse_response(generator, session)
+        # Messages sent while this thread has a run in flight are queued and
+        # answered together by one follow-up run instead of colliding with it.
+        subscription = await get_run_coordinator().submit(
+            thread_id, context_msg,
+            start_run=async_send_message_stream, role=role, user_data=user_data,
+        )
+        return _respond(subscription, session, thread_id)
 
     except Exception as e:
         error_str = str(e)
@@ -496,31 +542,62 @@ async def api_chat_stream(request):
         if stale_thread:
             try:
                 logger.warning("Stale/locked thread detected. Creating a new thread.")
-                new_thread_id = await asyncio.to_thread(create_thread)
+                new_thread_id = await async_create_thread()
                 await sync_to_async(_set_session_key)(
                     request.session, 'triage_thread_id', new_thread_id
                 )
-                generator = send_message_stream(
-                    new_thread_id, context_msg, role="intake", user_data=user_data
+                subscription = await get_run_coordinator().submit(
+                    new_thread_id, context_msg,
+                    start_run=async_send_message_stream, role="intake", user_data=user_data,
                 )
-                return _make_sse_response(generator, session)
+                return _respond(subscription, session, new_thread_id)
             except Exception as retry_e:
                 logger.exception("Failed to retry sending message stream to Azure Agent")
-                return _make_sse_response(
-                    _single_error_event(f"Retry failed: {str(retry_e)}"), session
-                )
+                return _sse_response(_error_events(f"Retry failed: {str(retry_e)}"))
 
         logger.exception("Error occurred connecting stream to the AI Agent")
-        return _make_sse_response(
-            _single_error_event(f"Error: {error_str}"), session
-        )
+        return _sse_response(_error_events(f"Error: {error_str}"))
+
+
+@require_GET
+async def api_chat_stream_resume(request, stream_id):
+    """
+    Reattach to an agent stream after a dropped connection.
+
+    Replays the events after ``Last-Event-ID`` (the header, or a
+    ``last_event_id`` query parameter) from the stream's buffer, then
+    follows the live tail. ``thread_id`` must name the stream's thread.
+    Streams stay resumable until STREAM_RESUME_GRACE_SECONDS after their
+    run ends; the run itself keeps going while no client is attached.
+    """
+    thread_id = request.GET.get('thread_id')
+    raw_last_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id') or '0'
+    try:
+        last_event_id = int(raw_last_id)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid Last-Event-ID'}, status=400)
+
+    stream = get_run_coordinator().resume(stream_id, thread_id) if thread_id else None
+    if stream is None:
+        return JsonResponse({'error': 'Unknown or expired stream'}, status=404)
+    if not stream.can_resume_after(last_event_id):
+        return JsonResponse({'error': 'Stream events are no longer available'}, status=410)
+
+    policy = CoalescePolicy.for_client(request.GET.dict())
+    return _sse_response(
+        _relay_events(stream.subscribe(after=last_event_id), policy), stream.stream_id
+    )
 
 
 # ──────────────────────────────────────────────
 # Doctor Command Center
 # ──────────────────────────────────────────────
 
-from django.db.models import Case, When, Value, IntegerField
+from django.db.models import Avg, Case, Count, DurationField, ExpressionWrapper, F, IntegerField, Q, Value, When
+from django.db.models.functions import Now
+
+# Cases still waiting on, or with, a doctor.
+OPEN_STATUSES = ('PENDING', 'IN_PROGRESS')
 
 def get_ordered_doctor_queue():
     """Helper to return ordered triage sessions."""
@@ -535,20 +612,36 @@ def get_ordered_doctor_queue():
     ).order_by('status_order', '-urgency_score', '-created_at')[:20]
 
 def get_doctor_stats():
-    """Helper to return doctor dashboard statistics."""
-    return {
-        'active_sessions': TriageSession.objects.filter(
-            status='IN_PROGRESS'
-        ).count(),
-        'critical_cases': TriageSession.objects.filter(
-            urgency_score__gte=4,
-            status__in=['PENDING', 'IN_PROGRESS'],
-        ).count(),
-        'pending_cases': TriageSession.objects.filter(
-            status='PENDING'
-        ).count(),
-        'avg_wait_time': 15,
-    }
+    """
+    Doctor dashboard statistics in a single conditional-aggregate query.
+
+    ``avg_wait_time`` is how long, in whole minutes, PENDING cases have been
+    waiting on average since they were created (0 with an empty queue).
+    """
+    stats = TriageSession.objects.aggregate(
+        active_sessions=Count('id', filter=Q(status='IN_PROGRESS')),
+        critical_cases=Count('id', filter=Q(urgency_score__gte=4, status__in=OPEN_STATUSES)),
+        pending_cases=Count('id', filter=Q(status='PENDING')),
+        pending_wait=Avg(
+            ExpressionWrapper(Now() - F('created_at'), output_field=DurationField()),
+            filter=Q(status='PENDING'),
+        ),
+    )
+    wait = stats.pop('pending_wait')
+    stats['avg_wait_time'] = round(wait.total_seconds() / 60) if wait else 0
+    return stats
+
+
+def get_admin_stats():
+    """System-wide counts for the admin dashboard: one session aggregate plus a patient count."""
+    stats = TriageSession.objects.aggregate(
+        total_sessions=Count('id'),
+        pending_triage=Count('id', filter=Q(status='PENDING')),
+    )
+    stats['total_patients'] = Patient.objects.count()
+    # Served from the in-process availability snapshot, usually without a query.
+    stats['active_doctors'] = len(get_availability_cache().snapshot().doctors)
+    return stats
 
 
 def doctor_dashboard(request):
@@ -563,14 +656,90 @@ def doctor_dashboard(request):
     })
 
 
+def _render_doctor_queue() -> str:
+    return render_to_string('triage/partials/doctor_queue_rows.html', {
+        'sessions': get_ordered_doctor_queue(),
+        'stats': get_doctor_stats(),
+    })
+
+
 def doctor_queue_updates(request):
-    """HTMX partial: refresh the priority-sorted queue."""
-    sessions = get_ordered_doctor_queue()
+    """
+    HTMX partial: refresh the priority-sorted queue.
+
+    The fragment is rendered once per queue version and shared by every
+    dashboard; a poll whose If-None-Match still matches gets an empty 304.
+    """
+    state = current_queue_state()
+    fragments = get_queue_fragment_cache()
+    response = get_conditional_response(request, etag=state.etag)
+    if response is not None:
+        fragments.record_not_modified()
+    else:
+        response = HttpResponse(fragments.get(state, _render_doctor_queue))
+    response['ETag'] = state.etag
+    # Make the browser revalidate each poll instead of reusing its copy.
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def _queue_update(change) -> dict:
+    """
+    Pushed counterpart of doctor_queue_updates for one QueueChange.
+
+    Carries the queue order and stats, plus the rendered rows of the
+    sessions that changed; rows missing from ``order`` have left the queue.
+    """
+    sessions = list(get_ordered_doctor_queue())
     stats = get_doctor_stats()
-    return render(request, 'triage/partials/doctor_queue_rows.html', {
-        'sessions': sessions,
+    update = {
+        'order': [session.id for session in sessions],
         'stats': stats,
-    })
+        'badge': stats['pending_cases'],
+    }
+    if change.resync:
+        update['resync'] = True
+        return update
+    update['rows'] = {
+        str(session.id): render_to_string('triage/partials/doctor_queue_row.html', {'session': session})
+        for session in sessions
+        if session.id in change.session_ids or session.patient_id in change.patient_ids
+    }
+    return update
+
+
+async def _build_queue_update(change) -> dict:
+    return await run_db(_queue_update, change)
+
+
+@require_GET
+async def doctor_queue_events(request):
+    """
+    Server-sent doctor queue updates, replacing the dashboard's polling.
+
+    Each TriageSession change is pushed as a ``queue`` event, built once per
+    debounce window for all connected dashboards on this worker; comment
+    frames keep idle connections alive.
+    """
+    subscription = get_queue_event_bus().subscribe()
+    heartbeat = getattr(settings, 'QUEUE_EVENTS_HEARTBEAT_SECONDS', 15)
+
+    async def frames():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                change = await subscription.get(timeout=heartbeat)
+                if change is None:
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_sse("queue", await change.render(_build_queue_update))
+        finally:
+            subscription.close()
+
+    response = StreamingHttpResponse(frames(), content_type='text/event-stream')
+    response['X-Accel-Buffering'] = 'no'
+    response['Cache-Control'] = 'no-cache'
+    return response
 
 
 @require_POST
@@ -615,7 +784,9 @@ def doctor_action(request, session_id):
 def toggle_availability(request):
     doctor = request.user.doctor_profile
     doctor.is_available = not doctor.is_available
-    doctor.save()
+    Doctor.objects.filter(pk=doctor.pk).update(is_available=doctor.is_available)
+    # update() skips post_save, so invalidate the availability snapshot here.
+    invalidate_doctor_availability()
     return render(
         request,
         "triage/partials/doctor_availability.html",
@@ -11,6 +11,19 @@ django_asgi_app = get_asgi_application()
 # initialized, but BEFORE mount_mcp_server so tools are registered on mcp_app.
 import mcp_server.server  # noqa: F401, E402 — registers MCP tools (side-effect import)
 
+# Warm the Azure token cache and start filling the agent thread pool in the
+# background so the first chat after a deploy does not wait on either.
+# Concurrent fetches for the same scope are de-duplicated by the credential.
+from triage.services import get_credential  # noqa: E402
+
+if getattr(settings, 'AZURE_AI_AGENT_BACKEND', 'azure') != 'fake':
+    for _scope in getattr(settings, 'AZURE_TOKEN_PREFETCH_SCOPES', []):
+        get_credential().prefetch(_scope)
+
+if getattr(settings, 'AGENT_THREAD_POOL_ENABLED', True) and getattr(settings, 'AGENT_THREAD_POOL_PREWARM', True):
+    from triage.thread_pool import get_thread_pool
+    get_thread_pool().refill_async()
+
 try:
     from django_mcp import asgi as django_mcp_asgi
     import django_mcp.asgi_patch_fastmcp as patch_module
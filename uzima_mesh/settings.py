@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import json
 import os
 from pathlib import Path
 from dotenv import load_dotenv
@@ -111,6 +112,32 @@ CORS_ALLOWED_ORIGIN_REGEXES = [
 # Keep SSE traffic active for connectors that enforce short idle timeouts.
 MCP_SSE_PING_INTERVAL_SECONDS = int(os.getenv('MCP_SSE_PING_INTERVAL_SECONDS', '5'))
 
+# Max chunks a sync agent stream may buffer ahead of a slow SSE client before
+# its producer thread blocks (see triage.streaming.iterate_in_thread).
+STREAM_BRIDGE_MAX_PENDING = int(os.getenv('STREAM_BRIDGE_MAX_PENDING', '64'))
+
+# Chat SSE delta coalescing (triage.streaming.coalesce_frames). Deltas are
+# merged for up to WINDOW_MS, flushing early at MAX_BYTES of text or at a
+# sentence end. Clients may ask for other values in a chat request's
+# "coalesce" field, clamped to the *_LIMIT settings. WINDOW_MS=0 disables it.
+SSE_COALESCE_WINDOW_MS = int(os.getenv('SSE_COALESCE_WINDOW_MS', '50'))
+SSE_COALESCE_MAX_BYTES = int(os.getenv('SSE_COALESCE_MAX_BYTES', '512'))
+SSE_COALESCE_SENTENCE_FLUSH = os.getenv('SSE_COALESCE_SENTENCE_FLUSH', 'True') == 'True'
+SSE_COALESCE_WINDOW_MS_LIMIT = int(os.getenv('SSE_COALESCE_WINDOW_MS_LIMIT', '1000'))
+SSE_COALESCE_MAX_BYTES_LIMIT = int(os.getenv('SSE_COALESCE_MAX_BYTES_LIMIT', '8192'))
+
+# Resumable chat streams (triage.run_coordinator): each run keeps its last
+# STREAM_BUFFER_EVENTS events so a client that lost its connection can
+# reconnect with Last-Event-ID, for up to STREAM_RESUME_GRACE_SECONDS after
+# the run ends. Streams live in the worker's memory, so resumes must reach
+# the same worker (the default single-worker setup, or sticky sessions).
+STREAM_BUFFER_EVENTS = int(os.getenv('STREAM_BUFFER_EVENTS', '2048'))
+STREAM_RESUME_GRACE_SECONDS = float(os.getenv('STREAM_RESUME_GRACE_SECONDS', '60'))
+# A run with no client attached for this long is treated as abandoned and
+# cancelled (cancel_run) instead of generating a reply nobody reads; it
+# should comfortably cover a client's reconnect attempts. 0 disables.
+STREAM_ABANDON_GRACE_SECONDS = float(os.getenv('STREAM_ABANDON_GRACE_SECONDS', '20'))
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -146,6 +173,24 @@ else:
         }
     }
 
+# Cache
+# Shared state between workers (e.g. the doctor availability version in
+# triage.availability) needs Redis; the local-memory cache is per process.
+
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 # Azure Managed Identity Helper for Postgres (Placeholder logic for implementation)
 # In production, we would use DefaultAzureCredential to get a token and refresh it.
 # For now, we rely on environment variables which can be populated by Azure Service Connector.
@@ -233,6 +278,98 @@ AZURE_AI_AGENT_ID = os.getenv("AZURE_AI_AGENT_ID")
 AZURE_AI_PROJECT_CONNECTION_STRING = os.getenv("AZURE_AI_PROJECT_CONNECTION_STRING", "")
 AZURE_AI_MANAGED_IDENTITY_CLIENT_ID = os.getenv("AZURE_AI_MANAGED_IDENTITY_CLIENT_ID", "")
 
+# Credential used by triage.services.CachedCredential. Comma-separated, tried in
+# order: managed_identity, workload_identity, environment, cli, default.
+# "managed_identity" alone skips DefaultAzureCredential's probe chain on App Service.
+AZURE_CREDENTIAL_CHAIN = [
+    name.strip() for name in os.getenv("AZURE_CREDENTIAL_CHAIN", "default").split(",") if name.strip()
+]
+AZURE_TOKEN_REFRESH_MARGIN_SECONDS = int(os.getenv("AZURE_TOKEN_REFRESH_MARGIN_SECONDS", "300"))
+# Optional file to persist tokens across worker restarts (e.g. /home/site/token_cache.json).
+AZURE_TOKEN_CACHE_PATH = os.getenv("AZURE_TOKEN_CACHE_PATH", "")
+AZURE_TOKEN_PREFETCH_SCOPES = [
+    scope.strip()
+    for scope in os.getenv(
+        "AZURE_TOKEN_PREFETCH_SCOPES",
+        "https://management.azure.com/.default,https://ml.azure.com/.default",
+    ).split(",")
+    if scope.strip()
+]
+
+# Pre-created agent threads (triage.thread_pool) so intake and consultations
+# never block on create_thread. Refill starts below LOW and stops at HIGH.
+AGENT_THREAD_POOL_ENABLED = os.getenv('AGENT_THREAD_POOL_ENABLED', 'True') == 'True'
+AGENT_THREAD_POOL_PREWARM = os.getenv('AGENT_THREAD_POOL_PREWARM', 'True') == 'True'
+AGENT_THREAD_POOL_LOW_WATERMARK = int(os.getenv('AGENT_THREAD_POOL_LOW_WATERMARK', '2'))
+AGENT_THREAD_POOL_HIGH_WATERMARK = int(os.getenv('AGENT_THREAD_POOL_HIGH_WATERMARK', '8'))
+AGENT_THREAD_POOL_MAX_IDLE_SECONDS = int(os.getenv('AGENT_THREAD_POOL_MAX_IDLE_SECONDS', str(30 * 60)))
+
+# consult_agent response cache (triage.consultations), keyed on role + normalized query.
+CONSULT_CACHE_ENABLED = os.getenv('CONSULT_CACHE_ENABLED', 'True') == 'True'
+CONSULT_CACHE_TTL_SECONDS = int(os.getenv('CONSULT_CACHE_TTL_SECONDS', '600'))
+CONSULT_CACHE_MAX_ENTRIES = int(os.getenv('CONSULT_CACHE_MAX_ENTRIES', '256'))
+# Shared deadline for consult_agents fan-outs (callers may ask for up to MAX).
+CONSULT_MANY_DEADLINE_SECONDS = float(os.getenv('CONSULT_MANY_DEADLINE_SECONDS', '45'))
+CONSULT_MANY_MAX_DEADLINE_SECONDS = float(os.getenv('CONSULT_MANY_MAX_DEADLINE_SECONDS', '90'))
+
+# Incremental rolling summaries (triage.summaries). A pass runs once at least
+# MIN_NEW_MESSAGES have arrived since the session's summary watermark.
+SUMMARY_MIN_NEW_MESSAGES = int(os.getenv('SUMMARY_MIN_NEW_MESSAGES', '5'))
+SUMMARY_MAX_MESSAGES_PER_PASS = int(os.getenv('SUMMARY_MAX_MESSAGES_PER_PASS', '40'))
+SUMMARY_MAX_WORKERS = int(os.getenv('SUMMARY_MAX_WORKERS', '2'))
+
+# Circuit breakers around client.agents (triage.resilience). A circuit opens
+# when FAILURE_RATE of the calls in the rolling window fail or run slower than
+# SLOW_CALL_SECONDS, fails fast for OPEN_SECONDS, then admits a trial call.
+AZURE_AGENT_CIRCUIT_BREAKER_ENABLED = os.getenv('AZURE_AGENT_CIRCUIT_BREAKER_ENABLED', 'True') == 'True'
+AZURE_AGENT_CIRCUIT_FAILURE_RATE = float(os.getenv('AZURE_AGENT_CIRCUIT_FAILURE_RATE', '0.5'))
+AZURE_AGENT_CIRCUIT_MIN_CALLS = int(os.getenv('AZURE_AGENT_CIRCUIT_MIN_CALLS', '5'))
+AZURE_AGENT_CIRCUIT_WINDOW_SECONDS = int(os.getenv('AZURE_AGENT_CIRCUIT_WINDOW_SECONDS', '60'))
+AZURE_AGENT_CIRCUIT_OPEN_SECONDS = int(os.getenv('AZURE_AGENT_CIRCUIT_OPEN_SECONDS', '30'))
+AZURE_AGENT_CIRCUIT_SLOW_CALL_SECONDS = float(os.getenv('AZURE_AGENT_CIRCUIT_SLOW_CALL_SECONDS', '30'))
+
+# Hedged duplicates for idempotent agent calls, fired once the primary is
+# slower than the operation's HEDGE_PERCENTILE latency. Only reads are safe
+# to hedge: adding 'create_thread' leaves one orphaned Azure thread per hedge
+# (the losing call is abandoned, not undone, and may already have created
+# its thread on the service).
+AZURE_AGENT_HEDGING_ENABLED = os.getenv('AZURE_AGENT_HEDGING_ENABLED', 'False') == 'True'
+AZURE_AGENT_HEDGED_OPERATIONS = ('get_run',)
+AZURE_AGENT_HEDGE_PERCENTILE = float(os.getenv('AZURE_AGENT_HEDGE_PERCENTILE', '0.95'))
+AZURE_AGENT_HEDGE_MIN_DELAY_SECONDS = float(os.getenv('AZURE_AGENT_HEDGE_MIN_DELAY_SECONDS', '0.5'))
+
+# Agent backend: 'azure' (Foundry) or 'fake' for the in-process stand-in in
+# triage.fake_agents, used for offline load testing. The fake is tuned with a
+# JSON object of FakeAgentConfig fields, e.g.
+# {"tokens_per_second": 40, "time_to_first_token": 0.4, "handoff_rate": 0.1}
+AZURE_AI_AGENT_BACKEND = os.getenv('AZURE_AI_AGENT_BACKEND', 'azure')
+AZURE_AI_FAKE_AGENT_CONFIG = json.loads(os.getenv('AZURE_AI_FAKE_AGENT_CONFIG', '{}'))
+
+# How often each worker checks the shared availability version before trusting
+# its in-memory doctor snapshot (triage.availability).
+DOCTOR_AVAILABILITY_VERSION_CHECK_SECONDS = float(os.getenv('DOCTOR_AVAILABILITY_VERSION_CHECK_SECONDS', '1.0'))
+
+# The rendered doctor queue partial is cached per queue version and shared by
+# all dashboards (triage.queue_cache); it is also re-rendered at least this
+# often so relative times and the average wait keep moving.
+DOCTOR_QUEUE_MAX_AGE_SECONDS = int(os.getenv('DOCTOR_QUEUE_MAX_AGE_SECONDS', '60'))
+
+# Pushed queue updates (triage.events). 'local' delivers within one worker,
+# 'redis' shares events between workers over REDIS_URL pub/sub; any other
+# value is the dotted path of a backend class.
+QUEUE_EVENT_BACKEND = os.getenv('QUEUE_EVENT_BACKEND', 'redis' if os.getenv('REDIS_URL') else 'local')
+QUEUE_EVENT_REDIS_URL = os.getenv('REDIS_URL')
+QUEUE_EVENT_CHANNEL = os.getenv('QUEUE_EVENT_CHANNEL', 'triage:queue_events')
+QUEUE_EVENT_REDIS_TIMEOUT_SECONDS = float(os.getenv('QUEUE_EVENT_REDIS_TIMEOUT_SECONDS', '2'))
+QUEUE_EVENTS_DEBOUNCE_SECONDS = float(os.getenv('QUEUE_EVENTS_DEBOUNCE_SECONDS', '0.25'))
+QUEUE_EVENTS_HEARTBEAT_SECONDS = float(os.getenv('QUEUE_EVENTS_HEARTBEAT_SECONDS', '15'))
+
+# Per-role prompt/completion budgets for agent runs (triage.context_budget).
+# AGENT_CONTEXT_BUDGETS is a JSON object of RoleBudget overrides keyed by role
+# (or "default"), e.g. {"intake": {"completion_tokens": 800}}.
+AGENT_CONTEXT_BUDGET_ENABLED = os.getenv('AGENT_CONTEXT_BUDGET_ENABLED', 'True') == 'True'
+AGENT_CONTEXT_BUDGETS = json.loads(os.getenv('AGENT_CONTEXT_BUDGETS', '{}'))
+
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
@@ -280,4 +417,21 @@ LOGGING = {
 # MCP Server Settings
 MCP_SERVER_TITLE = "UzimaMesh MCP Server"
 MCP_SERVER_INSTRUCTIONS = "Use these tools to triage patients and check doctor availability."
-MCP_SERVER_VERSION = "1.0.0"
\ No newline at end of file
+MCP_SERVER_VERSION = "1.0.0"
+# Agent tool runtime (triage.tool_runtime). Timeouts cover queueing + execution
+# of a single tool call; concurrency caps how many calls of one tool may run at once.
+MCP_TOOL_DEFAULT_TIMEOUT_SECONDS = float(os.getenv('MCP_TOOL_DEFAULT_TIMEOUT_SECONDS', '60'))
+MCP_TOOL_TIMEOUTS = {
+    'get_doctor_availability': 10,
+    'create_triage_record': 20,
+    'handoff_to_agent': 10,
+    'consult_agent': 120,
+    'consult_agents': 120,
+}
+MCP_TOOL_DEFAULT_CONCURRENCY = int(os.getenv('MCP_TOOL_DEFAULT_CONCURRENCY', '16'))
+MCP_TOOL_CONCURRENCY = {
+    # Each consultation is a full agent run against Foundry.
+    'consult_agent': int(os.getenv('MCP_CONSULT_AGENT_CONCURRENCY', '4')),
+    # Each call fans out to several agent runs.
+    'consult_agents': int(os.getenv('MCP_CONSULT_AGENTS_CONCURRENCY', '2')),
+}